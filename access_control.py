@@ -1,7 +1,7 @@
 from sqlalchemy import distinct
-from sqlalchemy.sql import text as sql_text, exists
+from sqlalchemy.sql import text as sql_text
 
-from qwc_services_core.config_models import ConfigModels
+from config_cache import ConfigDBCache
 
 
 class AccessControl:
@@ -9,18 +9,27 @@ class AccessControl:
     # name of admin iam.role
     ADMIN_ROLE_NAME = 'admin'
 
+    # default time in seconds until cached admin role decisions expire
+    DEFAULT_ADMIN_ROLE_CACHE_TTL = 60
+    # default max number of cached admin role decisions per tenant
+    DEFAULT_ADMIN_ROLE_CACHE_SIZE = 1000
+
     def __init__(self, handler, logger):
         """Constructor
 
-        :param ConfigModels handler: Helper for ORM models
+        :param handler: Tenant config handler
         :param Logger logger: Application logger
         """
         self.handler = handler
         self.logger = logger
 
+        # admin role decisions as {<tenant>: {(<username>, <group>): <bool>}}
+        self.admin_role_cache = ConfigDBCache()
+
     def is_admin(self, identity):
-        db_engine = self.handler().db_engine()
-        self.config_models = ConfigModels(db_engine, self.handler().conn_str())
+        current_handler = self.handler()
+        config = current_handler.config()
+        self.config_models = current_handler.config_models()
 
         # Extract user infos from identity
         if isinstance(identity, dict):
@@ -29,12 +38,47 @@ class AccessControl:
         else:
             username = identity
             group = None
+
+        cache_ttl = config.get(
+            'admin_role_cache_ttl', self.DEFAULT_ADMIN_ROLE_CACHE_TTL
+        )
+        cache_size = config.get(
+            'admin_role_cache_size', self.DEFAULT_ADMIN_ROLE_CACHE_SIZE
+        )
+        use_cache = cache_ttl > 0 and cache_size > 0
+
         session = self.config_models.session()
-        admin_role = self.admin_role_query(username, group, session)
-        session.close()
+        try:
+            if use_cache:
+                # lookup cached decision, unless ConfigDB has changed
+                last_update = ConfigDBCache.last_update(
+                    self.config_models, session
+                )
+                cached = self.admin_role_cache.lookup(
+                    current_handler.tenant, last_update, (username, group)
+                )
+                if cached is not None:
+                    return cached['value']
+
+            admin_role = self.admin_role_query(username, group, session)
+
+            if use_cache:
+                self.admin_role_cache.set(
+                    current_handler.tenant, last_update, (username, group),
+                    admin_role, cache_ttl, cache_size
+                )
+        finally:
+            session.close()
 
         return admin_role
 
+    def clear_cache(self, tenant=None):
+        """Discard cached admin role decisions.
+
+        :param str tenant: Only clear decisions for this tenant (default: all)
+        """
+        self.admin_role_cache.clear(tenant)
+
     def admin_role_query(self, username, group, session):
         """Create base query for all permissions of a user and group.
 
@@ -0,0 +1,123 @@
+from collections import OrderedDict
+from threading import Lock
+import time
+
+from sqlalchemy import func
+
+
+class ConfigDBCache:
+    """Bounded cache for values derived from the ConfigDB
+
+    Entries are stored per tenant and expire after a TTL. All entries of a
+    tenant are discarded as soon as the ConfigDB timestamp in
+    'last_update.updated_at' changes.
+    """
+
+    def __init__(self):
+        """Constructor"""
+        # cache entries as
+        #   {<tenant>: {'last_update': <timestamp>, 'entries': OrderedDict}}
+        self.cache = {}
+        self.lock = Lock()
+
+    @staticmethod
+    def last_update(config_models, session):
+        """Return timestamp of last ConfigDB change.
+
+        :param ConfigModels config_models: Helper for ORM models
+        :param Session session: DB session
+        """
+        LastUpdate = config_models.model('last_update')
+        return session.query(func.max(LastUpdate.updated_at)).scalar()
+
+    def lookup(self, tenant, last_update, key):
+        """Return dict with value or None if not present or expired.
+
+        :param str tenant: Tenant ID
+        :param datetime last_update: Current ConfigDB timestamp
+        :param obj key: Hashable key for value
+
+        Returns {'value': <value>} or None
+        """
+        with self.lock:
+            entries = self.tenant_entries(tenant, last_update)
+            entry = entries.get(key) if entries is not None else None
+            if entry is None:
+                return None
+
+            if time.time() < entry['expires']:
+                # mark as recently used
+                entries.move_to_end(key)
+                return {'value': entry['value']}
+            else:
+                # remove expired value
+                del entries[key]
+                return None
+
+    def set(self, tenant, last_update, key, value, ttl=60, max_size=1000):
+        """Store value under key until expiry or next ConfigDB change.
+
+        :param str tenant: Tenant ID
+        :param datetime last_update: ConfigDB timestamp at time of query
+        :param obj key: Hashable key for value
+        :param obj value: Value to store
+        :param int ttl: Time in seconds until expiry (default: 60s)
+        :param int max_size: Max number of entries for tenant
+                             (default: 1000)
+        """
+        with self.lock:
+            entries = self.tenant_entries(tenant, last_update)
+            if entries is None:
+                # skip value queried before latest ConfigDB change
+                return
+
+            entries[key] = {
+                'value': value,
+                'expires': time.time() + ttl
+            }
+            entries.move_to_end(key)
+            while len(entries) > max_size:
+                # remove least recently used entry
+                entries.popitem(last=False)
+
+    def clear(self, tenant=None):
+        """Remove all cached entries.
+
+        :param str tenant: Only remove entries for this tenant (default: all)
+        """
+        with self.lock:
+            if tenant is None:
+                self.cache = {}
+            else:
+                self.cache.pop(tenant, None)
+
+    def tenant_entries(self, tenant, last_update):
+        """Return entries for tenant, reset if ConfigDB has changed.
+
+        Return None if last_update is older than the cached timestamp.
+
+        NOTE: call only while holding the lock
+
+        :param str tenant: Tenant ID
+        :param datetime last_update: Current ConfigDB timestamp
+        """
+        tenant_cache = self.cache.get(tenant)
+        if tenant_cache is not None and \
+                tenant_cache['last_update'] != last_update:
+            cached_update = tenant_cache['last_update']
+            if last_update is None or (
+                cached_update is not None and last_update < cached_update
+            ):
+                # stale timestamp
+                return None
+            # ConfigDB has changed
+            tenant_cache = None
+
+        if tenant_cache is None:
+            tenant_cache = {
+                'last_update': last_update,
+                'entries': OrderedDict()
+            }
+            self.cache[tenant] = tenant_cache
+
+        return tenant_cache['entries']
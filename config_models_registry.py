@@ -0,0 +1,68 @@
+from threading import Lock
+
+from qwc_services_core.config_models import ConfigModels
+
+
+class ConfigModelsRegistry:
+    """Process-wide registry of ConfigModels
+
+    Reflect the ConfigDB and setup the ORM models only once per tenant and
+    DB connection, instead of on every request.
+    """
+
+    def __init__(self, db_engine, logger):
+        """Constructor
+
+        :param DatabaseEngine db_engine: Database engine with DB connections
+        :param Logger logger: Application logger
+        """
+        self.db_engine = db_engine
+        self.logger = logger
+
+        # lookup for ConfigModels as
+        #   {(<tenant>, <conn_str>, (<extra tables>)): <ConfigModels>}
+        self.config_models_cache = {}
+        self.lock = Lock()
+
+    def config_models(self, tenant, conn_str, extra_tables=[]):
+        """Return ConfigModels for a tenant, created on first access.
+
+        :param str tenant: Tenant ID
+        :param str conn_str: DB connection string for ConfigDB
+        :param list[str] extra_tables: Additional tables to reflect
+        """
+        key = (tenant, conn_str, tuple(sorted(extra_tables)))
+        config_models = self.config_models_cache.get(key)
+        if config_models is None:
+            with self.lock:
+                # check again after acquiring lock
+                config_models = self.config_models_cache.get(key)
+                if config_models is None:
+                    self.logger.debug(
+                        "Setup ConfigModels for tenant '%s'" % tenant
+                    )
+                    config_models = ConfigModels(
+                        self.db_engine, conn_str, list(extra_tables)
+                    )
+                    self.config_models_cache[key] = config_models
+
+        return config_models
+
+    def invalidate(self, tenant=None):
+        """Remove cached ConfigModels, e.g. after a ConfigDB schema change.
+
+        :param str tenant: Only remove entries for this tenant (default: all)
+        """
+        with self.lock:
+            if tenant is None:
+                self.config_models_cache = {}
+            else:
+                self.config_models_cache = {
+                    key: config_models
+                    for key, config_models in self.config_models_cache.items()
+                    if key[0] != tenant
+                }
+        self.logger.info(
+            "Cleared ConfigModels for %s" %
+            ("tenant '%s'" % tenant if tenant is not None else "all tenants")
+        )
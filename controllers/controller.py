@@ -1,11 +1,20 @@
+from collections import OrderedDict
+import csv
 from datetime import datetime
+import io
+import json
 import math
 
-from flask import abort, flash, redirect, render_template, request, url_for, Markup
+from flask import abort, flash, jsonify, redirect, render_template, request, url_for, Markup, Response, stream_with_context
+from sqlalchemy import inspect
 from sqlalchemy.exc import IntegrityError, InternalError
+from sqlalchemy.orm import aliased, joinedload
 from wtforms import ValidationError
 
-from qwc_services_core.config_models import ConfigModels
+from count_provider import CountProvider
+from keyset_pagination import KeysetPagination
+from permission_resolver import PermissionResolver
+from search_backend import SearchBackend
 
 
 class Controller:
@@ -19,6 +28,33 @@ class Controller:
     # default number of resources shown per page
     DEFAULT_PER_PAGE = 10
 
+    # pagination with page numbers (LIMIT/OFFSET)
+    PAGINATION_PAGES = 'pages'
+    # keyset pagination with next/prev cursors on sort columns
+    PAGINATION_KEYSET = 'keyset'
+    # pagination mode for resources list
+    PAGINATION_MODE = PAGINATION_PAGES
+
+    # set to add JSON lookup of resources for multi-select fields
+    LOOKUP_ENABLED = False
+    # default and max number of results per page of lookup
+    LOOKUP_PER_PAGE = 20
+    LOOKUP_MAX_PER_PAGE = 100
+
+    # set to PermissionResolver subject type (e.g. 'user') to add view
+    # of effective permissions
+    EFFECTIVE_PERMISSIONS_SUBJECT = None
+
+    # export formats
+    EXPORT_CSV = 'csv'
+    EXPORT_JSONL = 'jsonl'
+    # number of rows fetched per round trip from server-side cursor
+    EXPORT_YIELD_PER = 1000
+    # min size in bytes of streamed export chunks
+    EXPORT_CHUNK_SIZE = 64 * 1024
+    # columns never included in exports
+    EXPORT_EXCLUDED_COLUMNS = ['password_hash', 'totp_secret']
+
     def __init__(self, resource_name, base_route, endpoint_suffix,
                  templates_dir, app, handler):
         """Constructor
@@ -38,6 +74,11 @@ class Controller:
         self.logger = app.logger
         self.handler = handler
 
+        # memoized row counts for resources list
+        self.count_provider = CountProvider(self.logger)
+        # search filters for resources list
+        self.search_backend = SearchBackend(self.logger)
+
         self.add_routes(app)
 
     def add_routes(self, app):
@@ -82,13 +123,36 @@ class Controller:
             '/%s/<int:id>' % base_route, 'modify_%s' % suffix, self.modify,
             methods=['POST']
         )
+        # export
+        app.add_url_rule(
+            '/%s/export' % base_route, 'export_%s' % suffix, self.export,
+            methods=['GET']
+        )
+        if self.EFFECTIVE_PERMISSIONS_SUBJECT is not None:
+            # effective permissions
+            app.add_url_rule(
+                '/%s/<int:id>/effective_permissions' % base_route,
+                'effective_permissions_%s' % suffix,
+                self.effective_permissions, methods=['GET']
+            )
+            app.add_url_rule(
+                '/%s/<int:id>/effective_permissions.json' % base_route,
+                'effective_permissions_json_%s' % suffix,
+                self.effective_permissions_json, methods=['GET']
+            )
+        if self.LOOKUP_ENABLED:
+            # lookup
+            app.add_url_rule(
+                '/%s/lookup' % base_route, 'lookup_%s' % suffix, self.lookup,
+                methods=['GET']
+            )
 
     def setup_models(self):
         config_handler = self.handler()
         self.config = config_handler.config()
 
-        db_engine = config_handler.db_engine()
-        self.config_models = ConfigModels(db_engine, config_handler.conn_str())
+        # get shared ConfigModels for tenant
+        self.config_models = config_handler.config_models()
 
         self.Group = self.config_models.model('groups')
         self.Permission = self.config_models.model('permissions')
@@ -118,6 +182,19 @@ class Controller:
         """
         raise NotImplementedError
 
+    def search_filter(self, column, search_text):
+        """Return filter for column matching search string,
+        using the configured search mode ('ilike' or 'trigram').
+
+        :param Column column: Column to search
+        :param str search_text: Search string for filtering
+        """
+        return self.search_backend.search_filter(
+            column, search_text,
+            self.config.get('search_backend', SearchBackend.SEARCH_ILIKE),
+            self.config_models.engine
+        )
+
     def order_by_criterion(self, sort, sort_asc):
         """Return order_by criterion for sorted resources list.
 
@@ -156,21 +233,16 @@ class Controller:
         # else use default order from index query
 
         # paginate
-        page, per_page = self.pagination_args()
-        num_pages = math.ceil(query.count() / per_page)
-        resources = query.limit(per_page).offset((page - 1) * per_page).all()
-
-        pagination = {
-            'page': page,
-            'num_pages': num_pages,
-            'per_page': per_page,
+        resources, pagination = self.paginate(query, (search_text,))
+
+        pagination.update({
             'per_page_options': self.PER_PAGE_OPTIONS,
             'per_page_default': self.DEFAULT_PER_PAGE,
             'params': {
                 'search': search_text,
                 'sort': sort_param
             }
-        }
+        })
 
         session.close()
 
@@ -182,6 +254,279 @@ class Controller:
             base_route=self.base_route
         )
 
+    def paginate(self, query, filters=(), session_params={}):
+        """Return resources of current page and pagination info
+        as (resources, pagination).
+
+        :param Query query: Sorted query for resources list
+        :param tuple filters: Active filter values, used as key for
+                              memoized row counts
+        :param obj session_params: Optional session params for pagination
+        """
+        page, per_page = self.pagination_args(session_params)
+
+        # memoized or estimated total count
+        count, count_estimated = self.count_provider.count(
+            query, (self.base_route,) + tuple(filters),
+            self.handler().tenant, self.config_models, self.config
+        )
+
+        if self.PAGINATION_MODE == self.PAGINATION_KEYSET:
+            # seek to page via cursor on sort columns
+            model = query.column_descriptions[0]['entity']
+            pkey_column = getattr(model, self.resource_pkey()).expression
+            keyset = KeysetPagination(query, pkey_column)
+            resources, next_cursor, prev_cursor = keyset.page(
+                self.cursor_arg(), per_page
+            )
+            pagination = {
+                'mode': self.PAGINATION_KEYSET,
+                'next_cursor': next_cursor,
+                'prev_cursor': prev_cursor,
+                'count': count,
+                'count_estimated': count_estimated,
+                'per_page': per_page
+            }
+        else:
+            num_pages = math.ceil(count / per_page)
+            resources = query.limit(per_page) \
+                .offset((page - 1) * per_page).all()
+            pagination = {
+                'mode': self.PAGINATION_PAGES,
+                'page': page,
+                'num_pages': num_pages,
+                'num_pages_estimated': count_estimated,
+                'per_page': per_page
+            }
+
+        return resources, pagination
+
+    # export
+
+    def export_query(self, session):
+        """Return query for resources export, filtered like the resources
+        list by the request args.
+
+        Override in subclass for additional filters.
+
+        :param Session session: DB session
+        """
+        return self.resources_for_index_query(self.search_text_arg(), session)
+
+    def export_columns(self, query):
+        """Return exported columns as {<name>: <column expression>}.
+
+        Default: all columns of the queried model, except for secrets
+
+        :param Query query: Query for resources export
+        """
+        model = query.column_descriptions[0]['entity']
+        columns = OrderedDict()
+        for attr in inspect(model).column_attrs:
+            if attr.key not in self.EXPORT_EXCLUDED_COLUMNS:
+                columns[attr.key] = getattr(model, attr.key)
+
+        return columns
+
+    def export(self):
+        """Stream all resources matching the filters of the resources list
+        as CSV or JSONL.
+
+        Query parameters:
+            format: 'csv' (default) or 'jsonl'
+            search, ...: Filters as in resources list
+        """
+        self.setup_models()
+
+        format = request.args.get('format', self.EXPORT_CSV)
+        if format not in [self.EXPORT_CSV, self.EXPORT_JSONL]:
+            abort(400, "Unsupported export format")
+
+        session = self.session()
+        try:
+            query = self.export_query(session)
+            columns = self.export_columns(query)
+            # fetch rows in batches via server-side cursor
+            query = query.with_entities(*columns.values()) \
+                .yield_per(self.EXPORT_YIELD_PER)
+        except Exception:
+            session.close()
+            raise
+
+        if format == self.EXPORT_CSV:
+            mimetype = 'text/csv'
+        else:
+            mimetype = 'application/x-ndjson'
+
+        return Response(
+            stream_with_context(
+                self.export_rows(query, list(columns.keys()), format, session)
+            ),
+            mimetype=mimetype,
+            headers={
+                'Content-Disposition':
+                    'attachment; filename="%s.%s"' % (self.base_route, format)
+            }
+        )
+
+    def export_rows(self, query, names, format, session):
+        """Yield chunks of exported rows and close DB session when done.
+
+        :param Query query: Query for exported columns
+        :param list(str) names: Column names
+        :param str format: Export format ('csv' or 'jsonl')
+        :param Session session: DB session
+        """
+        try:
+            buffer = io.StringIO()
+            if format == self.EXPORT_CSV:
+                writer = csv.writer(buffer)
+                writer.writerow(names)
+                write_row = writer.writerow
+            else:
+                def write_row(row):
+                    buffer.write(json.dumps(
+                        dict(zip(names, row)), default=self.export_value
+                    ))
+                    buffer.write('\n')
+
+            for row in query:
+                write_row(row)
+                if buffer.tell() >= self.EXPORT_CHUNK_SIZE:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+
+            yield buffer.getvalue()
+        finally:
+            session.close()
+
+    def export_value(self, value):
+        """Return JSON serializable value for JSONL export.
+
+        :param obj value: Column value
+        """
+        if isinstance(value, datetime):
+            return value.isoformat()
+        return str(value)
+
+    # effective permissions
+
+    def effective_permissions(self, id):
+        """Show tree of resources with effective permissions.
+
+        :param int id: Resource ID
+        """
+        resource, result = self.resolve_effective_permissions(id)
+
+        # query resource types
+        session = self.session()
+        resource_types = OrderedDict()
+        query = session.query(self.ResourceType) \
+            .order_by(self.ResourceType.list_order, self.ResourceType.name)
+        for resource_type in query.all():
+            resource_types[resource_type.name] = resource_type.description
+        session.close()
+
+        return render_template(
+            'templates/effective_permissions.html',
+            title="Effective permissions of %s %s" % (
+                self.resource_name.lower(), resource['name']
+            ),
+            roles=result['roles'], items=result['resources'],
+            resource_types=resource_types,
+            json_url=url_for(
+                'effective_permissions_json_%s' % self.endpoint_suffix, id=id
+            )
+        )
+
+    def effective_permissions_json(self, id):
+        """Return effective permissions as JSON.
+
+        Query parameters:
+            type: Optional resource type filter (repeatable)
+            effective: Set to 'true' to return only effective permissions
+
+        :param int id: Resource ID
+        """
+        resource, result = self.resolve_effective_permissions(id)
+
+        items = result['resources']
+        resource_types = [t for t in request.args.getlist('type') if t]
+        if resource_types:
+            items = [item for item in items if item['type'] in resource_types]
+        if request.args.get('effective', '').lower() == 'true':
+            items = [item for item in items if item['effective']]
+
+        return jsonify({
+            self.EFFECTIVE_PERMISSIONS_SUBJECT: resource,
+            'roles': result['roles'],
+            'resources': items
+        })
+
+    def resolve_effective_permissions(self, id):
+        """Return resource and its effective permissions as
+        ({'id': <ID>, 'name': <name>}, <PermissionResolver result>).
+
+        :param int id: Resource ID
+        """
+        self.setup_models()
+
+        session = self.session()
+        try:
+            resource = self.find_resource(id, session)
+            if resource is None:
+                abort(404)
+
+            resolver = PermissionResolver(self.config_models)
+            result = resolver.resolve(
+                self.EFFECTIVE_PERMISSIONS_SUBJECT, resource.id, session
+            )
+            return {'id': resource.id, 'name': resource.name}, result
+        finally:
+            session.close()
+
+    # lookup
+
+    def lookup(self):
+        """Return page of resources for multi-select fields as JSON.
+
+        Query parameters:
+            q: Optional search string
+            page: Page number (default: 1)
+            per_page: Number of resources per page (default: 20, max: 100)
+
+        Returns JSON as
+            {
+                'results': [{'id': <resource ID>, 'name': '<name>'}],
+                'more': <True if there are further pages>
+            }
+        """
+        self.setup_models()
+
+        search_text = request.args.get('q', '').strip() or None
+        page = self.to_int(request.args.get('page'), 1, 1)
+        per_page = min(
+            self.to_int(request.args.get('per_page'), self.LOOKUP_PER_PAGE, 1),
+            self.LOOKUP_MAX_PER_PAGE
+        )
+
+        session = self.session()
+        query = self.resources_for_index_query(search_text, session)
+
+        # query one additional row to detect further pages
+        rows = query.offset((page - 1) * per_page).limit(per_page + 1).all()
+        results = [
+            {'id': row.id, 'name': row.name} for row in rows[:per_page]
+        ]
+
+        session.close()
+
+        return jsonify({
+            'results': results,
+            'more': len(rows) > per_page
+        })
+
     # new
 
     def new(self):
@@ -429,6 +774,65 @@ class Controller:
         last_update.updated_at = datetime.utcnow()
         session.commit()
 
+    def subtree_ids_query(self, ids, session):
+        """Return query for IDs of resources and all their descendants.
+
+        :param list ids: Resource IDs
+        :param Session session: DB session
+        """
+        subtree = session.query(self.Resource.id) \
+            .filter(self.Resource.id.in_(ids)).cte('subtree', recursive=True)
+        child = aliased(self.Resource)
+        # NOTE: UNION stops on cyclic parents
+        subtree = subtree.union(
+            session.query(child.id).filter(child.parent_id == subtree.c.id)
+        )
+
+        return session.query(subtree.c.id)
+
+    def resource_select_choices(self, select_field, session):
+        """Set choices of a select field for ConfigDB resources to only the
+        selected resource, and return them grouped by resource type as
+            [
+                {
+                    'resource_type': '<resource type>',
+                    'group_label': '<resource type description>',
+                    'options': [
+                        (<resource ID>, '<resource name>', <parent resource>)
+                    ]
+                }
+            ]
+
+        Further options are loaded on demand from the resources lookup.
+        Submitted IDs of missing resources fail the choice validation.
+
+        :param SelectField select_field: Select field for resource ID
+        :param Session session: DB session
+        """
+        select_field.choices = [(0, "")]
+        if not select_field.data:
+            return []
+
+        # query selected resource
+        query = session.query(self.Resource) \
+            .filter(self.Resource.id == select_field.data) \
+            .options(
+                joinedload(self.Resource.resource_type),
+                joinedload(self.Resource.parent)
+            )
+        resource = query.first()
+        if resource is None:
+            return []
+
+        select_field.choices.append(
+            (resource.id, "%s: %s" % (resource.type, resource.name))
+        )
+        return [{
+            'resource_type': resource.type,
+            'group_label': resource.resource_type.description,
+            'options': [(resource.id, resource.name, resource.parent)]
+        }]
+
     def update_form_collection(
         self, resource, edit_form, multi_select, relation_model,
         collection_attr, id_attr, name_attr, session
@@ -452,53 +856,113 @@ class Controller:
             multi_select.data = [
                 getattr(i, id_attr) for i in items
             ]
+        elif multi_select.data:
+            # load selected related resources from DB,
+            # so that only existing IDs pass the choices validation
+            query = session.query(relation_model) \
+                .filter(getattr(relation_model, id_attr).in_(
+                    multi_select.data
+                )) \
+                .order_by(getattr(relation_model, name_attr))
+            items = query.all()
+        else:
+            items = []
 
-        # load related resources from DB
-        query = session.query(relation_model). \
-            order_by(getattr(relation_model, name_attr))
-        items = query.all()
-
-        # set choices for collection select field
+        # set choices for collection select field to selected items,
+        # further choices are loaded on demand from the lookup
         multi_select.choices = [
             (getattr(i, id_attr), getattr(i, name_attr)) for i in items
         ]
 
-    def update_collection(self, collection, multi_select, relation_model,
-                          id_attr, session):
+    def update_collection(self, resource, multi_select, relation_model,
+                          collection_attr, id_attr, session):
         """Helper to add or remove relations from a resource collection.
 
-        :param object collection: Collection of resource relations
-                                  (e.g. Group.user_collection)
+        NOTE: the collection is not loaded if it has a simple association
+              table
+
+        :param object resource: Resource object (e.g. group)
         :param SelectMultipleField multi_select: MultiSelect for relations
                                                  (e.g. form.users)
         :param object relation_model: ConfigModel for relation (e.g. User)
+        :param str collection_attr: Collection attribute for resource
+                                    (e.g. 'users_collection')
         :param str id_attr: ID attribute of relation model (e.g. 'id')
         :param Session session: DB session
         """
-        # lookup for relation of resource
-        resource_relations = {}
-        for relation in collection:
-            resource_relations[relation.id] = relation
-
-        # update relations
-        relation_ids = []
-        for relation_id in multi_select.data:
-            # get relation from ConfigDB
-            filter = {id_attr: relation_id}
-            query = session.query(relation_model).filter_by(**filter)
-            relation = query.first()
-
-            if relation is not None:
-                relation_ids.append(relation_id)
-                if relation_id not in resource_relations:
+        # get relationship property of collection from resource class
+        mapper = inspect(type(resource))
+        prop = mapper.get_property(collection_attr)
+
+        # query existing relations for submitted IDs
+        relation_ids = multi_select.data or []
+        if prop.secondary is None or \
+                len(prop.secondary_synchronize_pairs) != 1:
+            # no simple association table, update ORM collection
+            collection = getattr(resource, collection_attr)
+            relations = []
+            if relation_ids:
+                query = session.query(relation_model).filter(
+                    getattr(relation_model, id_attr).in_(relation_ids)
+                )
+                relations = query.all()
+            collection_ids = set(
+                getattr(relation, id_attr) for relation in collection
+            )
+            for relation in relations:
+                if getattr(relation, id_attr) not in collection_ids:
                     # add relation to resource
                     collection.append(relation)
+            keep_ids = set(
+                getattr(relation, id_attr) for relation in relations
+            )
+            for relation in list(collection):
+                if getattr(relation, id_attr) not in keep_ids:
+                    # remove relation from resource
+                    collection.remove(relation)
+            return
+
+        # association table columns for resource and relations
+        (owner_column, owner_fk), = prop.synchronize_pairs
+        (relation_column, relation_fk), = prop.secondary_synchronize_pairs
+        relation_key = prop.mapper.get_property_by_column(relation_column).key
+
+        new_keys = set()
+        if relation_ids:
+            query = session.query(getattr(relation_model, relation_key)) \
+                .filter(getattr(relation_model, id_attr).in_(relation_ids))
+            new_keys = set(key for key, in query.all())
+
+        # flush resource to get its key for new resources
+        session.flush()
+        owner_key = getattr(
+            resource, mapper.get_property_by_column(owner_column).key
+        )
 
-        # remove removed relations
-        for relation in resource_relations.values():
-            if relation.id not in relation_ids:
-                # remove relation from resource
-                collection.remove(relation)
+        # query current relations of resource
+        query = session.query(relation_fk).filter(owner_fk == owner_key)
+        current_keys = set(key for key, in query.all())
+
+        secondary = prop.secondary
+        removed_keys = current_keys - new_keys
+        if removed_keys:
+            # remove removed relations
+            session.execute(
+                secondary.delete()
+                .where(owner_fk == owner_key)
+                .where(relation_fk.in_(removed_keys))
+            )
+
+        added_keys = new_keys - current_keys
+        if added_keys:
+            # add new relations
+            session.execute(secondary.insert(), [
+                {owner_fk.key: owner_key, relation_fk.key: key}
+                for key in sorted(added_keys)
+            ])
+
+        # reload collection on next access
+        session.expire(resource, [collection_attr])
 
     def search_text_arg(self):
         """Return request arg for search string."""
@@ -533,6 +997,10 @@ class Controller:
         )
         return page, per_page
 
+    def cursor_arg(self):
+        """Return request arg for keyset pagination cursor."""
+        return request.args.get('cursor') or None
+
     def to_int(self, value, default, min_value=None):
         """Convert string value to int.
 
@@ -1,10 +1,17 @@
 from .controller import Controller
 from forms import GroupForm
+from permission_resolver import PermissionResolver
 
 
 class GroupsController(Controller):
     """Controller for group model"""
 
+    # JSON lookup for multi-select fields
+    LOOKUP_ENABLED = True
+
+    # view of effective permissions
+    EFFECTIVE_PERMISSIONS_SUBJECT = PermissionResolver.SUBJECT_GROUP
+
     def __init__(self, app, handler):
         """Constructor
 
@@ -23,7 +30,9 @@ class GroupsController(Controller):
         """
         query = session.query(self.Group).order_by(self.Group.name)
         if search_text:
-            query = query.filter(self.Group.name.ilike("%%%s%%" % search_text))
+            query = query.filter(
+                self.search_filter(self.Group.name, search_text)
+            )
 
         return query
 
@@ -97,9 +106,9 @@ class GroupsController(Controller):
 
         # update users
         self.update_collection(
-            group.users_collection, form.users, self.User, 'id', session
+            group, form.users, self.User, 'users_collection', 'id', session
         )
         # update roles
         self.update_collection(
-            group.roles_collection, form.roles, self.Role, 'id', session
+            group, form.roles, self.Role, 'roles_collection', 'id', session
         )
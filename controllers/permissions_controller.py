@@ -1,16 +1,48 @@
 from collections import OrderedDict
-import math
 
-from flask import flash, Markup, render_template, request, session as flask_session
-from sqlalchemy.orm import joinedload
+from flask import flash, jsonify, Markup, render_template, request, url_for, session as flask_session
+from sqlalchemy import case, func, or_, tuple_
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import aliased, joinedload
 
 from .controller import Controller
+from config_cache import ConfigDBCache
 from forms import PermissionForm
+from keyset_pagination import KeysetPagination
+from permission_resolver import PermissionResolver
 
 
 class PermissionsController(Controller):
     """Controller for permission model"""
 
+    # use keyset pagination for large tables
+    PAGINATION_MODE = Controller.PAGINATION_KEYSET
+
+    # resource types which are public by default if there are no
+    # permissions on their parent resource
+    PUBLIC_DEFAULT_ALLOW_RESOURCES = \
+        PermissionResolver.PUBLIC_DEFAULT_ALLOW_RESOURCES
+
+    # check warnings only for permissions on current page
+    WARNINGS_SCOPE_PAGE = 'page'
+    # check warnings for all permissions of tenant
+    WARNINGS_SCOPE_ALL = 'all'
+    # default time in seconds until cached warnings for all permissions
+    # expire
+    DEFAULT_WARNINGS_CACHE_TTL = 3600
+
+    # access levels of permission matrix cells
+    MATRIX_ACCESS_NONE = 'none'
+    MATRIX_ACCESS_READ = 'read'
+    MATRIX_ACCESS_WRITE = 'write'
+    # default and max number of resources per page of permission matrix rows
+    MATRIX_DEFAULT_PER_PAGE = 200
+    MATRIX_MAX_PER_PAGE = 1000
+    # max number of changed cells per permission matrix update
+    MATRIX_MAX_CHANGES = 100000
+    # max number of (resource, role) pairs per IN clause
+    MATRIX_CHUNK_SIZE = 1000
+
     def __init__(self, app, handler):
         """Constructor
 
@@ -22,6 +54,26 @@ class PermissionsController(Controller):
             handler
         )
 
+        # warnings for all permissions of tenant as
+        #   {<tenant>: [(<role>, <type>, <resource>, <parent>)]}
+        self.warnings_cache = ConfigDBCache()
+
+        base_route = self.base_route
+        suffix = self.endpoint_suffix
+        # permission matrix
+        app.add_url_rule(
+            '/%s/matrix' % base_route, 'matrix_%s' % suffix, self.matrix,
+            methods=['GET']
+        )
+        app.add_url_rule(
+            '/%s/matrix/rows' % base_route, 'matrix_rows_%s' % suffix,
+            self.matrix_rows, methods=['GET']
+        )
+        app.add_url_rule(
+            '/%s/matrix' % base_route, 'update_matrix_%s' % suffix,
+            self.update_matrix, methods=['POST']
+        )
+
     def resources_for_index_query(self, search_text, role, resource_type,
                                   resource_id, session):
         """Return query for permissions list filtered by role or resource type.
@@ -38,7 +90,7 @@ class PermissionsController(Controller):
 
         if search_text:
             query = query.filter(
-                self.Resource.name.ilike("%%%s%%" % search_text)
+                self.search_filter(self.Resource.name, search_text)
             )
 
         if role is not None:
@@ -57,10 +109,42 @@ class PermissionsController(Controller):
         query = query.options(
             joinedload(self.Permission.role),
             joinedload(self.Permission.resource)
+            .joinedload(self.Resource.parent)
         )
 
         return query
 
+    def export_query(self, session):
+        """Return query for permissions export filtered by request args
+        for search, role, resource type and resource ID.
+
+        :param Session session: DB session
+        """
+        role = request.args.get('role')
+        if role in ['', 'all']:
+            role = None
+        resource_type = request.args.get('type')
+        if resource_type in ['', 'all']:
+            resource_type = None
+        resource_id = request.args.get('resource_id') or None
+
+        return self.resources_for_index_query(
+            self.search_text_arg(), role, resource_type, resource_id, session
+        )
+
+    def export_columns(self, query):
+        """Return exported columns as {<name>: <column expression>}.
+
+        :param Query query: Query for permissions export
+        """
+        columns = super(PermissionsController, self).export_columns(query)
+        # add names from joined role and resource
+        columns['role'] = self.Role.name
+        columns['resource_type'] = self.Resource.type
+        columns['resource'] = self.Resource.name
+
+        return columns
+
     def order_by_criterion(self, sort, sort_asc):
         """Return order_by criterion for sorted resources list as tuple.
 
@@ -156,10 +240,13 @@ class PermissionsController(Controller):
                 flask_session["permissions"]['params']["sort"] = sort_param
 
         # paginate
-        page, per_page = self.pagination_args(flask_session["permissions"]['params'])
-        num_pages = math.ceil(query.count() / per_page)
-        resources = query.limit(per_page).offset((page - 1) * per_page).all()
-        flask_session["permissions"]['params']['per_page'] = per_page
+        resources, pagination = self.paginate(
+            query,
+            (active_search_text, active_role, active_resource_type,
+             resource_id),
+            flask_session["permissions"]['params']
+        )
+        flask_session["permissions"]['params']['per_page'] = pagination['per_page']
 
         # Set modified property to True so that the flask_session object
         # updates our cookie
@@ -168,13 +255,11 @@ class PermissionsController(Controller):
         # See https://stackoverflow.com/questions/39261260/flask-session-variable-not-persisting-between-requests/39261335#39261335
         flask_session.modified = True
 
-        pagination = {
-            'page': page,
-            'num_pages': num_pages,
+        pagination.update({
             'per_page_options': self.PER_PAGE_OPTIONS,
             'per_page_default': self.DEFAULT_PER_PAGE,
             'params': flask_session["permissions"]["params"]
-        }
+        })
 
         # query roles
         roles = session.query(self.Role).order_by(self.Role.name).all()
@@ -186,38 +271,25 @@ class PermissionsController(Controller):
         for resource_type in query.all():
             resource_types[resource_type.name] = resource_type.description
 
-        # Create dict with all defined parents from resource objects
-        all_resources = self.resources_for_index_query(
-            None, None, None, resource_id, session
-        ).all()
+        # parent names of resources on current page
         parents_dict = {}
-        for res in all_resources:
-            if res.resource.parent is not None and \
-                    res.resource.parent.id not in parents_dict.keys():
-                parents_dict[res.resource.parent.id] = res.resource.parent.name
+        for res in resources:
+            parent = res.resource.parent
+            if parent is not None:
+                parents_dict[parent.id] = parent.name
 
         # Warn if role does not have permission on resource parent
-        resource_roles = {}
-        for res in all_resources:
-            resource_roles[res.resource.type + ":" + res.resource.name] = \
-                resource_roles.get(res.resource.type + ":" + res.resource.name, []) + [res.role.name]
-
-        public_default_allow_resources = ['attribute', 'layer', 'feature_info_layer', 'print_template']
-
-        role_warnings = []
-        for res in all_resources:
-            parent = res.resource.parent
-            default_parent_roles = ['public'] if parent is not None and res.resource.type in public_default_allow_resources else []
-            if parent is not None and \
-                    'public' not in resource_roles.get(parent.type + ":" + parent.name, default_parent_roles) and \
-                    res.role.name not in resource_roles.get(parent.type + ":" + parent.name, default_parent_roles):
-                role_warnings.append(
-                    (
-                        "The permission for role <b>%s</b> on the <b>%s</b> resource <b>%s</b> " +
-                        "has no effect because <b>%s</b> has no permission on the " +
-                        "parent resource <b>%s</b>."
-                     ) % (res.role.name, res.resource.type, res.resource.name, res.role.name, parent.name)
-                )
+        role_warnings = [
+            (
+                "The permission for role <b>%s</b> on the <b>%s</b> resource <b>%s</b> " +
+                "has no effect because <b>%s</b> has no permission on the " +
+                "parent resource <b>%s</b>."
+            ) % (Markup.escape(role), Markup.escape(type), Markup.escape(name),
+                 Markup.escape(role), Markup.escape(parent))
+            for role, type, name, parent in self.role_warnings(
+                [res.id for res in resources], session
+            )
+        ]
         if role_warnings:
             flash(Markup("<br />".join(role_warnings)), 'warning')
 
@@ -233,6 +305,98 @@ class PermissionsController(Controller):
             active_resource_type=active_resource_type
         )
 
+    def role_warnings(self, permission_ids, session):
+        """Return permissions without effect, because their role has no
+        permission on the parent resource, as
+        [(<role>, <resource type>, <resource name>, <parent name>)].
+
+        Depending on 'permission_warnings_scope', warnings are checked only
+        for the permissions on the current page (default), or for all
+        permissions of the tenant and cached until the next ConfigDB change.
+
+        :param list(int) permission_ids: IDs of permissions on current page
+        :param Session session: DB session
+        """
+        scope = self.config.get(
+            'permission_warnings_scope', self.WARNINGS_SCOPE_PAGE
+        )
+        if scope != self.WARNINGS_SCOPE_ALL:
+            if not permission_ids:
+                return []
+            return self.role_warnings_query(permission_ids, session).all()
+
+        tenant = self.handler().tenant
+        cache_ttl = self.config.get(
+            'permission_warnings_cache_ttl', self.DEFAULT_WARNINGS_CACHE_TTL
+        )
+        if cache_ttl > 0:
+            last_update = ConfigDBCache.last_update(self.config_models, session)
+            cached = self.warnings_cache.lookup(tenant, last_update, 'all')
+            if cached is not None:
+                return cached['value']
+
+        warnings = [
+            tuple(row) for row in self.role_warnings_query(None, session)
+        ]
+
+        if cache_ttl > 0:
+            self.warnings_cache.set(
+                tenant, last_update, 'all', warnings, cache_ttl
+            )
+
+        return warnings
+
+    def role_warnings_query(self, permission_ids, session):
+        """Return query for permissions without effect, because their role
+        has no permission on the parent resource.
+
+        Parent permissions are matched by resource type and name. Resources
+        of PUBLIC_DEFAULT_ALLOW_RESOURCES are public if there are no
+        permissions on their parent resource.
+
+        :param list(int) permission_ids: Optional permission IDs filter
+        :param Session session: DB session
+        """
+        Parent = aliased(self.Resource)
+        ParentResource = aliased(self.Resource)
+        ParentPermission = aliased(self.Permission)
+        ParentRole = aliased(self.Role)
+
+        # any permissions on parent resource
+        parent_permissions = session.query(ParentPermission.id) \
+            .join(
+                ParentResource,
+                ParentPermission.resource_id == ParentResource.id
+            ) \
+            .filter(ParentResource.type == Parent.type) \
+            .filter(ParentResource.name == Parent.name)
+        # permissions on parent resource for role or public
+        parent_role_permissions = parent_permissions \
+            .join(ParentRole, ParentPermission.role_id == ParentRole.id) \
+            .filter(ParentRole.name.in_(['public', self.Role.name]))
+
+        query = session.query(
+            self.Role.name, self.Resource.type, self.Resource.name,
+            Parent.name
+        ) \
+            .select_from(self.Permission) \
+            .join(self.Permission.role) \
+            .join(self.Permission.resource) \
+            .join(Parent, self.Resource.parent_id == Parent.id) \
+            .filter(~parent_role_permissions.exists()) \
+            .filter(or_(
+                self.Resource.type.notin_(
+                    self.PUBLIC_DEFAULT_ALLOW_RESOURCES
+                ),
+                parent_permissions.exists()
+            )) \
+            .order_by(self.Role.name, self.Resource.type, self.Resource.name)
+
+        if permission_ids is not None:
+            query = query.filter(self.Permission.id.in_(permission_ids))
+
+        return query
+
     def find_resource(self, id, session):
         """Find permission by ID.
 
@@ -261,27 +425,6 @@ class PermissionsController(Controller):
             .order_by(self.ResourceType.list_order, self.ResourceType.name)
         resource_types = query.all()
 
-        # query resources
-        query = session.query(self.Resource) \
-            .join(self.Resource.resource_type) \
-            .order_by(self.ResourceType.list_order, self.Resource.type,
-                      self.Resource.name)
-        # eager load relations
-        query = query.options(
-            joinedload(self.Resource.resource_type)
-        )
-        resources = query.all()
-
-        # This small code is needed to make sure that the parent object
-        # of all resources is called at least once before closing the session.
-        # Doing this allows us to call the parent object even after the session
-        # was closed.
-        for res in resources:
-            if res.parent is not None:
-                res.parent.name
-
-        session.close()
-
         # set choices for role select field
         form.role_id.choices = [(0, "")] + [
             (r.id, r.name) for r in roles
@@ -292,33 +435,18 @@ class PermissionsController(Controller):
             (r.name, r.description) for r in resource_types
         ]
 
-        # set choices for resource select field
-        form.resource_id.choices = [(0, "")] + [
-            (r.id, "%s: %s" % (r.type, r.name)) for r in resources
-        ]
-
         resource_id = request.args.get('resource_id')
-        if resource_id is not None and resource_id.isdigit():
+        if resource_id is not None and resource_id.isdigit() and \
+                not form.is_submitted():
             form.resource_id.data = int(resource_id)
 
-        # set choices for resource select field, grouped by resource type
-        current_type = None
-        group = {}
-        form.resource_choices = []
-        for r in resources:
-            if r.type != current_type:
-                # add new group
-                current_type = r.type
-                group = {
-                    'resource_type': r.type,
-                    'group_label': r.resource_type.description,
-                    'options': []
-                }
-
-                form.resource_choices.append(group)
+        # set choices for resource select field to selected resource,
+        # further resources are loaded on demand
+        form.resource_choices = self.resource_select_choices(
+            form.resource_id, session
+        )
 
-            # add resource to group
-            group['options'].append((r.id, r.name, r.parent))
+        session.close()
 
         return form
 
@@ -351,3 +479,316 @@ class PermissionsController(Controller):
             permission.resource_id = form.resource_id.data
         else:
             permission.resource_id = None
+
+    # permission matrix
+
+    def matrix(self):
+        """Show matrix of roles and resources for bulk editing permissions.
+
+        Resource rows are loaded on demand from matrix_rows.
+        """
+        self.setup_models()
+        session = self.session()
+
+        # query roles
+        roles = session.query(self.Role.id, self.Role.name) \
+            .order_by(self.Role.name).all()
+
+        # query resource types
+        resource_types = OrderedDict()
+        query = session.query(self.ResourceType) \
+            .order_by(self.ResourceType.list_order, self.ResourceType.name)
+        for resource_type in query.all():
+            resource_types[resource_type.name] = resource_type.description
+
+        resource_type, parent_id, search_text = self.matrix_args()
+        if 'type' not in request.args and parent_id is None and \
+                resource_types:
+            # default to first resource type
+            resource_type = next(iter(resource_types))
+
+        # selected subtree root
+        parent = None
+        if parent_id is not None:
+            parent = session.query(self.Resource).get(parent_id)
+            if parent is not None:
+                parent = {
+                    'id': parent.id,
+                    'type': parent.type,
+                    'name': parent.name
+                }
+
+        session.close()
+
+        return render_template(
+            '%s/matrix.html' % self.templates_dir,
+            roles=[{'id': id, 'name': name} for id, name in roles],
+            resource_types=resource_types, active_resource_type=resource_type,
+            parent=parent, search_text=search_text,
+            rows_url=url_for(
+                'matrix_rows_%s' % self.endpoint_suffix, type=resource_type,
+                parent_id=parent_id, search=search_text
+            ),
+            update_url=url_for('update_matrix_%s' % self.endpoint_suffix),
+            endpoint_suffix=self.endpoint_suffix
+        )
+
+    def matrix_args(self):
+        """Return permission matrix filters from request args as
+        (<resource type>, <subtree root ID>, <search text>).
+        """
+        resource_type = request.args.get('type') or None
+        parent_id = request.args.get('parent_id', type=int) or None
+        search_text = self.search_text_arg()
+
+        return resource_type, parent_id, search_text
+
+    def matrix_rows(self):
+        """Return page of permission matrix rows as JSON.
+
+        Query parameters:
+            type: Optional resource type filter
+            parent_id: Optional ID of root resource of subtree filter
+            search: Optional search text for resource name
+            cursor: Cursor of next page from previous response
+            per_page: Number of resources per page
+
+        Response:
+            {
+                'rows': [
+                    {
+                        'id': <resource ID>,
+                        'type': <resource type>,
+                        'name': <resource name>,
+                        'parent': <parent name or None>,
+                        'cells': {<role ID>: 'read' | 'write'}
+                    }
+                ],
+                'next_cursor': <cursor of next page or None>
+            }
+        """
+        self.setup_models()
+        session = self.session()
+
+        resource_type, parent_id, search_text = self.matrix_args()
+        per_page = min(
+            request.args.get(
+                'per_page', self.MATRIX_DEFAULT_PER_PAGE, type=int
+            ) or self.MATRIX_DEFAULT_PER_PAGE,
+            self.MATRIX_MAX_PER_PAGE
+        )
+
+        query = session.query(self.Resource) \
+            .options(joinedload(self.Resource.parent)) \
+            .order_by(self.Resource.name)
+        if resource_type is not None:
+            query = query.filter(self.Resource.type == resource_type)
+        if parent_id is not None:
+            # filter by subtree
+            query = query.filter(self.Resource.id.in_(
+                self.subtree_ids_query([parent_id], session)
+            ))
+        if search_text:
+            query = query.filter(
+                self.search_filter(self.Resource.name, search_text)
+            )
+
+        resources, next_cursor, _ = KeysetPagination(
+            query, self.Resource.id
+        ).page(request.args.get('cursor'), per_page)
+
+        rows = OrderedDict()
+        for resource in resources:
+            rows[resource.id] = {
+                'id': resource.id,
+                'type': resource.type,
+                'name': resource.name,
+                'parent': resource.parent.name if resource.parent else None,
+                'cells': {}
+            }
+
+        if rows:
+            # pivot permissions of page into cells
+            for resource_id, role_id, write in self.matrix_cells_query(
+                list(rows.keys()), session
+            ):
+                rows[resource_id]['cells'][role_id] = \
+                    self.MATRIX_ACCESS_WRITE if write \
+                    else self.MATRIX_ACCESS_READ
+
+        session.close()
+
+        return jsonify({
+            'rows': list(rows.values()),
+            'next_cursor': next_cursor
+        })
+
+    def matrix_cells_query(self, resource_ids, session):
+        """Return query for (<resource ID>, <role ID>, <write>) of all
+        permissions on resources, with multiple permissions of a role on the
+        same resource combined into a single cell with write access if any
+        of them has write access.
+
+        :param list(int) resource_ids: Resource IDs
+        :param Session session: DB session
+        """
+        return session.query(
+            self.Permission.resource_id, self.Permission.role_id,
+            func.max(case((self.Permission.write, 1), else_=0))
+        ).filter(self.Permission.resource_id.in_(resource_ids)) \
+            .filter(self.Permission.role_id.isnot(None)) \
+            .group_by(self.Permission.resource_id, self.Permission.role_id)
+
+    def update_matrix(self):
+        """Apply changed permission matrix cells in a single transaction.
+
+        Request body:
+            {
+                'changes': [
+                    {
+                        'resource_id': <resource ID>,
+                        'role_id': <role ID>,
+                        'access': 'none' | 'read' | 'write'
+                    }
+                ]
+            }
+
+        Response:
+            {'created': <count>, 'updated': <count>, 'deleted': <count>}
+        """
+        self.setup_models()
+
+        data = request.get_json(silent=True) or {}
+        changes = data.get('changes')
+        if not isinstance(changes, list):
+            return jsonify({'error': "Missing list of changes"}), 400
+        if len(changes) > self.MATRIX_MAX_CHANGES:
+            return jsonify({
+                'error': "Too many changes (max. %d)" % self.MATRIX_MAX_CHANGES
+            }), 400
+
+        # changed cells as {(<resource ID>, <role ID>): <access>}
+        cells = OrderedDict()
+        accesses = [
+            self.MATRIX_ACCESS_NONE, self.MATRIX_ACCESS_READ,
+            self.MATRIX_ACCESS_WRITE
+        ]
+        for change in changes:
+            try:
+                key = (int(change['resource_id']), int(change['role_id']))
+                access = change['access']
+            except (KeyError, TypeError, ValueError):
+                return jsonify({'error': "Invalid change: %s" % change}), 400
+            if access not in accesses:
+                return jsonify({
+                    'error': "Invalid access '%s'" % access
+                }), 400
+            # NOTE: last change of a cell wins
+            cells[key] = access
+
+        if not cells:
+            return jsonify({'created': 0, 'updated': 0, 'deleted': 0})
+
+        session = self.session()
+        try:
+            result = self.apply_matrix_changes(cells, session)
+            if result is None:
+                session.rollback()
+                return jsonify({'error': "Unknown resource or role"}), 400
+            # commit all changes with new config timestamp
+            self.update_config_timestamp(session)
+        except SQLAlchemyError as e:
+            session.rollback()
+            self.logger.error("Could not update permissions:\n%s" % e)
+            return jsonify({'error': "Could not update permissions"}), 500
+        finally:
+            session.close()
+
+        return jsonify(result)
+
+    def apply_matrix_changes(self, cells, session):
+        """Apply changed permission matrix cells with bulk statements, and
+        return counts of created, updated and deleted permissions, or None if
+        any resource or role does not exist.
+
+        :param OrderedDict cells: Changed cells as
+                                  {(<resource ID>, <role ID>): <access>}
+        :param Session session: DB session
+        """
+        resource_ids = set(resource_id for resource_id, _ in cells)
+        role_ids = set(role_id for _, role_id in cells)
+
+        # check resources and roles
+        found = 0
+        for ids in self.chunks(list(resource_ids)):
+            found += session.query(func.count(self.Resource.id)) \
+                .filter(self.Resource.id.in_(ids)).scalar()
+        if found != len(resource_ids):
+            return None
+        found = session.query(func.count(self.Role.id)) \
+            .filter(self.Role.id.in_(role_ids)).scalar()
+        if found != len(role_ids):
+            return None
+
+        # existing cells
+        existing = set()
+        for ids in self.chunks(list(resource_ids)):
+            query = session.query(
+                self.Permission.resource_id, self.Permission.role_id
+            ).filter(self.Permission.resource_id.in_(ids)) \
+                .filter(self.Permission.role_id.in_(role_ids)).distinct()
+            existing.update(tuple(row) for row in query.all())
+
+        # group cells by statement
+        delete_keys = []
+        read_keys = []
+        write_keys = []
+        new_rows = []
+        for key, access in cells.items():
+            if key in existing:
+                if access == self.MATRIX_ACCESS_NONE:
+                    delete_keys.append(key)
+                elif access == self.MATRIX_ACCESS_READ:
+                    read_keys.append(key)
+                else:
+                    write_keys.append(key)
+            elif access != self.MATRIX_ACCESS_NONE:
+                new_rows.append({
+                    'resource_id': key[0],
+                    'role_id': key[1],
+                    'priority': 0,
+                    'write': access == self.MATRIX_ACCESS_WRITE
+                })
+
+        table = self.Permission.__table__
+        pair = tuple_(table.c.resource_id, table.c.role_id)
+        result = {'created': 0, 'updated': 0, 'deleted': 0}
+
+        for keys in self.chunks(delete_keys):
+            result['deleted'] += session.execute(
+                table.delete().where(pair.in_(keys))
+            ).rowcount
+        for keys, write in self.chunks(read_keys, False) + \
+                self.chunks(write_keys, True):
+            result['updated'] += session.execute(
+                table.update().where(pair.in_(keys)).values(write=write)
+            ).rowcount
+        if new_rows:
+            # NOTE: use executemany for fast bulk inserts
+            session.execute(table.insert(), new_rows)
+            result['created'] = len(new_rows)
+
+        return result
+
+    def chunks(self, items, *extra):
+        """Return list split into chunks of MATRIX_CHUNK_SIZE, optionally as
+        tuples with extra values.
+
+        :param list items: List items
+        :param extra: Optional values appended to each chunk
+        """
+        size = self.MATRIX_CHUNK_SIZE
+        chunks = [items[i:i + size] for i in range(0, len(items), size)]
+        if extra:
+            return [(chunk,) + extra for chunk in chunks]
+        return chunks
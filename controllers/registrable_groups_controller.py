@@ -32,8 +32,10 @@ class RegistrableGroupsController(Controller):
             # filter by registrable group title or group name
             query = query.join(self.RegistrableGroup.group) \
                 .filter(or_(
-                    self.RegistrableGroup.title.ilike("%%%s%%" % search_text),
-                    self.Group.name.ilike("%%%s%%" % search_text)
+                    self.search_filter(
+                        self.RegistrableGroup.title, search_text
+                    ),
+                    self.search_filter(self.Group.name, search_text)
                 ))
 
         # eager load relations
@@ -41,6 +43,19 @@ class RegistrableGroupsController(Controller):
 
         return query
 
+    def export_columns(self, query):
+        """Return exported columns as {<name>: <column expression>}.
+
+        :param Query query: Query for registrable groups export
+        """
+        columns = super(RegistrableGroupsController, self).export_columns(
+            query
+        )
+        # add name from joined group
+        columns['group'] = self.Group.name
+
+        return columns
+
     def order_by_criterion(self, sort, sort_asc):
         """Return order_by criterion for sorted resources list as tuple.
 
@@ -25,6 +25,8 @@ class RegistrationRequestsController(Controller):
 
         self.i18n = i18n
         self.mail = mail
+        # locale of user notification mails
+        self.default_locale = app.config.get('DEFAULT_LOCALE', 'en')
 
     def resources_for_index_query(self, search_text, session):
         """Return query for registration requests list.
@@ -45,9 +47,11 @@ class RegistrationRequestsController(Controller):
             query = query.join(self.RegistrationRequest.registrable_group) \
                 .join(self.RegistrableGroup.group) \
                 .filter(or_(
-                    self.User.name.ilike("%%%s%%" % search_text),
-                    self.RegistrableGroup.title.ilike("%%%s%%" % search_text),
-                    self.Group.name.ilike("%%%s%%" % search_text)
+                    self.search_filter(self.User.name, search_text),
+                    self.search_filter(
+                        self.RegistrableGroup.title, search_text
+                    ),
+                    self.search_filter(self.Group.name, search_text)
                 ))
 
         # eager load relations
@@ -58,6 +62,20 @@ class RegistrationRequestsController(Controller):
 
         return query
 
+    def export_columns(self, query):
+        """Return exported columns as {<name>: <column expression>}.
+
+        :param Query query: Query for registration requests export
+        """
+        columns = super(RegistrationRequestsController, self).export_columns(
+            query
+        )
+        # add names from joined user and registrable group
+        columns['user'] = self.User.name
+        columns['registrable_group'] = self.RegistrableGroup.title
+
+        return columns
+
     def order_by_criterion(self, sort, sort_asc):
         """Return order_by criterion for sorted resources list as tuple.
 
@@ -270,14 +288,18 @@ class RegistrationRequestsController(Controller):
         # send notification to user
         try:
             msg = Message(
-                self.i18n('registration_requests.user_notification.subject'),
+                self.i18n(
+                    'registration_requests.user_notification.subject',
+                    locale=self.default_locale
+                ),
                 recipients=[user.email]
             )
             # set message body from template
             msg.body = render_template(
                 '%s/user_notification.txt' % self.templates_dir, user=user,
                 groups_joined=groups_joined, groups_left=groups_left,
-                rejected_requests=rejected_requests
+                rejected_requests=rejected_requests,
+                i18n_locale=self.default_locale
             )
 
             # send message
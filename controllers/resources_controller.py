@@ -1,13 +1,14 @@
 from collections import OrderedDict
-import math
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import os
 import requests
 import json
 from urllib.parse import urljoin
-from operator import itemgetter
 
-from flask import abort, flash, redirect, render_template, request, url_for, session as flask_session
+from flask import abort, flash, jsonify, redirect, render_template, request, url_for, session as flask_session
+from sqlalchemy import BigInteger, Column, MetaData, Table, exists, select
 from sqlalchemy.exc import IntegrityError, InternalError
-from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import aliased, joinedload
 from sqlalchemy.ext.declarative import DeclarativeMeta
 
 from .controller import Controller
@@ -17,16 +18,41 @@ from forms import ImportResourceForm, ResourceForm
 class ResourcesController(Controller):
     """Controller for resource model"""
 
-    def __init__(self, app, handler):
+    # use keyset pagination for large tables
+    PAGINATION_MODE = Controller.PAGINATION_KEYSET
+
+    # max number of rows per bulk INSERT
+    BULK_INSERT_SIZE = 1000
+
+    # default and max number of concurrent requests to ConfigGenerator
+    # when refreshing all maps
+    DEFAULT_IMPORT_MAX_WORKERS = 8
+    IMPORT_MAX_WORKERS_LIMIT = 32
+    # timeout in seconds for map requests to ConfigGenerator
+    CONFIG_GENERATOR_TIMEOUT = 60
+
+    # job kind and report file for unused resources report
+    UNUSED_REPORT_JOB = 'unused_resources_report'
+    UNUSED_REPORT_FILE = 'unused_resources.jsonl'
+    # temporary table for filtering by unused resources report
+    UNUSED_REPORT_TABLE = Table(
+        'unused_report_ids', MetaData(),
+        Column('id', BigInteger, primary_key=True, autoincrement=False),
+        prefixes=['TEMPORARY'], postgresql_on_commit='DROP'
+    )
+
+    def __init__(self, app, handler, job_runner):
         """Constructor
 
         :param Flask app: Flask application
         :param handler: Tenant config handler
+        :param JobRunner job_runner: Runner for background jobs
         """
         super(ResourcesController, self).__init__(
             "Resource", 'resources', 'resource', 'resources', app,
             handler
         )
+        self.job_runner = job_runner
 
         # add custom routes
         base_route = self.base_route
@@ -43,6 +69,27 @@ class ResourcesController(Controller):
             'destroy_multiple_%s' % suffix,
             self.destroy_multiple, methods=['DELETE', 'POST']
         )
+        # unused resources report
+        app.add_url_rule(
+            '/%s/unused_report' % base_route, 'unused_report_%s' % suffix,
+            self.start_unused_report, methods=['POST']
+        )
+        app.add_url_rule(
+            '/%s/unused_report/status' % base_route,
+            'unused_report_status_%s' % suffix,
+            self.unused_report_status, methods=['GET']
+        )
+        # delete unreferenced resources from report
+        app.add_url_rule(
+            '/%s/delete_unreferenced' % base_route,
+            'destroy_unreferenced_%s' % suffix,
+            self.destroy_unreferenced, methods=['DELETE', 'POST']
+        )
+        # resources lookup for select fields
+        app.add_url_rule(
+            '/%s/lookup' % base_route, 'lookup_%s' % suffix,
+            self.lookup, methods=['GET']
+        )
         # resource hierarchy
         app.add_url_rule(
             '/%s/<int:id>/hierarchy' % base_route, 'hierarchy_%s' % suffix,
@@ -53,6 +100,11 @@ class ResourcesController(Controller):
             '/%s/import_maps' % base_route, 'import_maps_%s' % suffix,
             self.import_maps, methods=['POST']
         )
+        # refresh all maps and layers
+        app.add_url_rule(
+            '/%s/refresh_maps' % base_route, 'refresh_maps_%s' % suffix,
+            self.refresh_maps, methods=['POST']
+        )
         # import resource children
         app.add_url_rule(
             '/%s/<int:id>/import_children' % base_route,
@@ -85,7 +137,7 @@ class ResourcesController(Controller):
 
         if search_text:
             query = query.filter(
-                self.Resource.name.ilike("%%%s%%" % search_text)
+                self.search_filter(self.Resource.name, search_text)
             )
 
         if resource_type is not None:
@@ -97,6 +149,44 @@ class ResourcesController(Controller):
 
         return query
 
+    def export_query(self, session):
+        """Return query for resources export filtered by request args
+        for search, resource type and unused resources report.
+
+        :param Session session: DB session
+        """
+        resource_type = request.args.get('type')
+        if resource_type in ['', 'all']:
+            resource_type = None
+        query = self.resources_for_index_query(
+            self.search_text_arg(), resource_type, session
+        )
+
+        if request.args.get('unreferenced') == "True":
+            # filter by unused resources report
+            unreferenced_ids = self.unused_report_ids(self.handler().tenant)
+            if unreferenced_ids is None:
+                abort(404, "No unused resources report available")
+            query = query.filter(
+                self.unused_report_filter(unreferenced_ids, session)
+            )
+
+        return query
+
+    def export_columns(self, query):
+        """Return exported columns as {<name>: <column expression>}.
+
+        :param Query query: Query for resources export
+        """
+        columns = super(ResourcesController, self).export_columns(query)
+        # add parent name
+        parent = aliased(self.Resource)
+        columns['parent'] = select(parent.name) \
+            .where(parent.id == self.Resource.parent_id) \
+            .scalar_subquery()
+
+        return columns
+
     def order_by_criterion(self, sort, sort_asc):
         """Return order_by criterion for sorted resources list as tuple.
 
@@ -155,10 +245,30 @@ class ResourcesController(Controller):
             flask_session["resources"]['params']["type"] = resource_type
         active_resource_type = flask_session["resources"]['params'].get("type", None)
 
+        unreferenced = request.args.get('unreferenced')
+        if unreferenced == "False":
+            flask_session["resources"]['params'].pop("unreferenced", None)
+        elif unreferenced == "True":
+            flask_session["resources"]['params']["unreferenced"] = unreferenced
+        active_unreferenced = flask_session["resources"]['params'].get("unreferenced", None)
+
         query = self.resources_for_index_query(
             active_search_text, active_resource_type, session
         )
 
+        tenant = self.handler().tenant
+        if active_unreferenced:
+            # filter by unused resources report
+            unreferenced_ids = self.unused_report_ids(tenant)
+            if unreferenced_ids is not None:
+                query = query.filter(
+                    self.unused_report_filter(unreferenced_ids, session)
+                )
+            else:
+                flash('No unused resources report available.', 'warning')
+                flask_session["resources"]['params'].pop("unreferenced", None)
+                active_unreferenced = None
+
         # order by sort args
         sort, sort_asc = self.sort_args()
         sort_param = None
@@ -179,10 +289,12 @@ class ResourcesController(Controller):
                 flask_session["resources"]['params']["sort"] = sort_param
 
         # paginate
-        page, per_page = self.pagination_args(flask_session["resources"]['params'])
-        num_pages = math.ceil(query.count() / per_page)
-        resources = query.limit(per_page).offset((page - 1) * per_page).all()
-        flask_session["resources"]['params']['per_page'] = per_page
+        resources, pagination = self.paginate(
+            query,
+            (active_search_text, active_resource_type, active_unreferenced),
+            flask_session["resources"]['params']
+        )
+        flask_session["resources"]['params']['per_page'] = pagination['per_page']
 
         check_unused = request.args.get('check_unused')
         if check_unused == "True":
@@ -199,13 +311,11 @@ class ResourcesController(Controller):
         # See https://stackoverflow.com/questions/39261260/flask-session-variable-not-persisting-between-requests/39261335#39261335
         flask_session.modified = True
 
-        pagination = {
-            'page': page,
-            'num_pages': num_pages,
+        pagination.update({
             'per_page_options': self.PER_PAGE_OPTIONS,
             'per_page_default': self.DEFAULT_PER_PAGE,
             'params': flask_session["resources"]["params"]
-        }
+        })
 
         # query resource types
         resource_types = OrderedDict()
@@ -221,6 +331,12 @@ class ResourcesController(Controller):
             "http://qwc-config-service:9090"
         ) else False
 
+        # latest unused resources report
+        unused_report = self.job_runner.latest(tenant, self.UNUSED_REPORT_JOB)
+        have_unused_report = os.path.exists(
+            self.job_runner.path(tenant, self.UNUSED_REPORT_FILE)
+        )
+
         return render_template(
             '%s/index.html' % self.templates_dir, resources=resources,
             endpoint_suffix=self.endpoint_suffix, pkey=self.resource_pkey(),
@@ -228,9 +344,82 @@ class ResourcesController(Controller):
             sort=sort, sort_asc=sort_asc, check_unused=active_check_unused,
             base_route=self.base_route, resource_types=resource_types,
             active_resource_type=active_resource_type,
-            have_config_generator=have_config_generator
+            have_config_generator=have_config_generator,
+            unreferenced=active_unreferenced, unused_report=unused_report,
+            have_unused_report=have_unused_report
+        )
+
+    def lookup(self):
+        """Return page of resources for select fields as JSON.
+
+        Query parameters:
+            q: Optional name prefix (case-insensitive)
+            type: Optional resource types (can be repeated)
+            page: Page number (default: 1)
+            per_page: Number of resources per page (default: 20, max: 100)
+
+        Returns JSON as
+            {
+                'results': [
+                    {
+                        'id': <resource ID>,
+                        'type': '<resource type>',
+                        'type_description': '<resource type description>',
+                        'name': '<resource name>',
+                        'parent': '<parent name>' or None
+                    }
+                ],
+                'more': <True if there are further pages>
+            }
+        """
+        self.setup_models()
+
+        prefix = request.args.get('q', '').strip()
+        resource_types = [t for t in request.args.getlist('type') if t]
+        page = max(1, request.args.get('page', 1, type=int))
+        per_page = min(
+            max(1, request.args.get(
+                'per_page', self.LOOKUP_PER_PAGE, type=int
+            )),
+            self.LOOKUP_MAX_PER_PAGE
         )
 
+        session = self.session()
+        query = session.query(self.Resource, self.ResourceType.description) \
+            .join(self.Resource.resource_types) \
+            .options(joinedload(self.Resource.parent)) \
+            .order_by(self.ResourceType.list_order, self.Resource.type,
+                      self.Resource.name, self.Resource.id)
+        if prefix:
+            # escape LIKE wildcards in prefix
+            escaped = prefix.replace('\\', '\\\\') \
+                .replace('%', '\\%').replace('_', '\\_')
+            query = query.filter(
+                self.Resource.name.ilike(escaped + '%', escape='\\')
+            )
+        if resource_types:
+            query = query.filter(self.Resource.type.in_(resource_types))
+
+        # query one additional row to detect further pages
+        rows = query.offset((page - 1) * per_page).limit(per_page + 1).all()
+        results = [
+            {
+                'id': resource.id,
+                'type': resource.type,
+                'type_description': type_description,
+                'name': resource.name,
+                'parent': resource.parent.name if resource.parent else None
+            }
+            for resource, type_description in rows[:per_page]
+        ]
+
+        session.close()
+
+        return jsonify({
+            'results': results,
+            'more': len(rows) > per_page
+        })
+
     def find_resource(self, id, session):
         """Find resource by ID.
 
@@ -261,11 +450,14 @@ class ResourcesController(Controller):
 
             try:
                 # delete and commit resource and its children
-                self.destroy_resource_cascaded(resource, session)
+                deleted_resources, deleted_permissions = \
+                    self.destroy_resources_cascaded([resource.id], session)
                 session.commit()
                 self.update_config_timestamp(session)
                 flash(
-                    'Resource and its children have been deleted.', 'success'
+                    'Resource and its children have been deleted '
+                    '(%d resources, %d permissions).' %
+                    (deleted_resources, deleted_permissions), 'success'
                 )
             except InternalError as e:
                 flash('InternalError: %s' % e.orig, 'error')
@@ -287,21 +479,31 @@ class ResourcesController(Controller):
             session.close()
             abort(404)
 
-    def destroy_resource_cascaded(self, resource, session):
-        """Recursively delete existing resource and its children in DB.
+    def destroy_resources_cascaded(self, ids, session):
+        """Delete existing resources, their children and all their
+        permissions in DB, and return number of deleted rows as
+        (<deleted resources>, <deleted permissions>).
 
-        :param object resource: Resource object
+        :param list ids: Resource IDs
         :param Session session: DB session
         """
-        # recursively delete child resources (depth first)
-        for child in resource.children:
-            self.destroy_resource_cascaded(child, session)
+        subtree_ids = self.subtree_ids_query(ids, session)
+
+        # delete permissions before their resources
+        deleted_permissions = session.query(self.Permission) \
+            .filter(self.Permission.resource_id.in_(subtree_ids)) \
+            .delete(synchronize_session=False)
+        deleted_resources = session.query(self.Resource) \
+            .filter(self.Resource.id.in_(subtree_ids)) \
+            .delete(synchronize_session=False)
+
+        # discard any loaded deleted objects
+        session.expire_all()
 
-        # delete resource
-        session.delete(resource)
+        return deleted_resources, deleted_permissions
 
     def destroy_multiple(self):
-        """Delete selected resources.
+        """Delete selected resources and their children.
         """
         # workaround for missing DELETE methods in HTML forms
         #   using hidden form parameter '_method'
@@ -311,31 +513,43 @@ class ResourcesController(Controller):
 
         self.setup_models()
 
-        selected_id_resources = request.form.getlist("resource_checkbox")
+        try:
+            selected_ids = set(
+                int(id) for id in request.form.getlist("resource_checkbox")
+            )
+        except ValueError:
+            abort(400)
 
         session = self.session()
-        for id in selected_id_resources:
-            # find resource
-            resource = self.find_resource(id, session)
 
-            if resource is not None:
-                try:
-                    # delete and commit resource and its children
-                    self.destroy_resource(resource, session)
-                    session.commit()
-                    self.update_config_timestamp(session)
-                    flash(
-                        f"{self.resource_name} '{resource.name}' has been deleted.", 'success'
+        # check that all selected resources exist
+        query = session.query(self.Resource.id) \
+            .filter(self.Resource.id.in_(selected_ids))
+        if query.count() != len(selected_ids):
+            # resource not found
+            session.close()
+            abort(404)
+
+        if selected_ids:
+            try:
+                # delete and commit resources and their children
+                deleted_resources, deleted_permissions = \
+                    self.destroy_resources_cascaded(
+                        sorted(selected_ids), session
                     )
-                except InternalError as e:
-                    flash('InternalError: %s' % e.orig, 'error')
-                except IntegrityError as e:
-                    flash('IntegrityError: %s' % e.orig, 'error')
+                session.commit()
+                self.update_config_timestamp(session)
+                flash(
+                    '%d selected resources and their children have been '
+                    'deleted (%d resources, %d permissions).' %
+                    (len(selected_ids), deleted_resources,
+                     deleted_permissions), 'success'
+                )
+            except InternalError as e:
+                flash('InternalError: %s' % e.orig, 'error')
+            except IntegrityError as e:
+                flash('IntegrityError: %s' % e.orig, 'error')
 
-            else:
-                # resource not found
-                session.close()
-                abort(404)
         session.close()
         # redirect to resources list
         return redirect(url_for(self.base_route))
@@ -355,19 +569,6 @@ class ResourcesController(Controller):
             .order_by(self.ResourceType.list_order, self.ResourceType.name)
         resource_types = query.all()
 
-        # query resources
-        query = session.query(self.Resource) \
-            .join(self.Resource.resource_types) \
-            .order_by(self.ResourceType.list_order, self.Resource.type,
-                      self.Resource.name)
-        # eager load relations
-        query = query.options(
-            joinedload(self.Resource.resource_type)
-        )
-        resources = query.all()
-
-        session.close()
-
         # set choices for type select field
         form.type.choices = [
             (t.name, t.description) for t in resource_types
@@ -377,29 +578,13 @@ class ResourcesController(Controller):
         if resource_type is not None:
             form.type.data = resource_type
 
-        # set choices for parent select field
-        form.parent_id.choices = [(0, "")] + [
-            (r.id, "%s: %s" % (r.type, r.name)) for r in resources
-        ]
+        # set choices for parent select field to selected parent,
+        # further resources are loaded on demand
+        form.parent_choices = self.resource_select_choices(
+            form.parent_id, session
+        )
 
-        # set choices for parent select field, grouped by resource type
-        current_type = None
-        group = {}
-        form.parent_choices = []
-        for r in resources:
-            if r.type != current_type:
-                # add new group
-                current_type = r.type
-                group = {
-                    'resource_type': r.type,
-                    'group_label': r.resource_type.description,
-                    'options': []
-                }
-
-                form.parent_choices.append(group)
-
-            # add resource to group
-            group['options'].append((r.id, r.name))
+        session.close()
 
         return form
 
@@ -472,16 +657,9 @@ class ResourcesController(Controller):
         resource = self.find_resource(id, session)
 
         if resource is not None:
-            # get root resource
-            root = resource
-            parent = root.parent
-            while parent is not None:
-                root = parent
-                parent = root.parent
-
-            # recursively collect hierarchy
-            items = []
-            self.collect_resources(root, 0, items, session)
+            # load whole hierarchy of root resource
+            root_id = self.root_resource_id(resource.id, session)
+            items = self.collect_resources(root_id, session)
 
             # query resource types
             resource_types = OrderedDict()
@@ -503,44 +681,106 @@ class ResourcesController(Controller):
             session.close()
             abort(404)
 
-    def collect_resources(self, resource, depth, items, session):
-        """Recursively collect resource hierarchy from DB.
+    def root_resource_id(self, id, session):
+        """Return ID of root resource of a resource.
 
-        :param object resource: Resource object
-        :param int depth: Hierarchy depth
-        :param list[object] choices: List of collected resources
+        :param int id: Resource ID
         :param Session session: DB session
         """
-        # query resource permissions
-        query = session.query(self.Permission) \
-            .filter(self.Permission.resource_id == resource.id)
-        has_permissions = query.count() > 0
-
-        permissions = []
-        for permission in query.all():
-            permissions.append({
-                "role": permission.role.name,
-                "write": permission.write
-            })
+        # recursively collect ancestors
+        ancestors = session.query(
+            self.Resource.id, self.Resource.parent_id
+        ).filter(self.Resource.id == id).cte('ancestors', recursive=True)
+        parent = aliased(self.Resource)
+        # NOTE: UNION stops on cyclic parents
+        ancestors = ancestors.union(
+            session.query(parent.id, parent.parent_id)
+            .filter(parent.id == ancestors.c.parent_id)
+        )
 
-        # add resource
-        items.append({
-            'depth': depth,
-            'resource': resource,
-            'has_permissions': has_permissions,
-            'permissions': permissions
-        })
+        root_id = session.query(ancestors.c.id) \
+            .filter(ancestors.c.parent_id.is_(None)).scalar()
+        if root_id is None:
+            # no root found for cyclic parents
+            root_id = id
 
-        # get sorted children
+        return root_id
+
+    def collect_resources(self, root_id, session):
+        """Collect resource hierarchy from DB in depth-first order.
+
+        Returns list of items as
+            {
+                'depth': <hierarchy depth>,
+                'resource': <resource>,
+                'has_permissions': <bool>,
+                'permissions': [{'role': <role name>, 'write': <bool>}]
+            }
+
+        :param int root_id: ID of root resource
+        :param Session session: DB session
+        """
+        subtree_ids = self.subtree_ids_query([root_id], session)
+
+        # query all resources of hierarchy, sorted with DB collation
         query = session.query(self.Resource) \
-            .join(self.Resource.resource_types) \
-            .order_by(self.ResourceType.list_order, self.Resource.type,
-                      self.Resource.name, self.Resource.id) \
-            .filter(self.Resource.parent_id == resource.id)
+            .outerjoin(self.Resource.resource_types) \
+            .filter(self.Resource.id.in_(subtree_ids)) \
+            .order_by(
+                self.ResourceType.list_order.nullslast(), self.Resource.type,
+                self.Resource.name, self.Resource.id
+            )
+        resources = query.all()
 
-        # recursively collect children
-        for child in query.all():
-            self.collect_resources(child, depth + 1, items, session)
+        # query permissions of all resources of hierarchy
+        query = session.query(
+            self.Permission.resource_id, self.Role.name,
+            self.Permission.write
+        ).join(self.Permission.role) \
+            .filter(self.Permission.resource_id.in_(subtree_ids)) \
+            .order_by(self.Role.name)
+        permissions = {}
+        for resource_id, role_name, write in query.all():
+            permissions.setdefault(resource_id, []).append({
+                "role": role_name,
+                "write": write
+            })
+
+        # lookup for sorted children by parent ID
+        children = {}
+        root = None
+        for resource in resources:
+            if resource.id == root_id:
+                root = resource
+            else:
+                children.setdefault(resource.parent_id, []).append(resource)
+
+        items = []
+        if root is None:
+            return items
+
+        # collect hierarchy in depth-first order
+        stack = [(root, 0)]
+        visited = set()
+        while stack:
+            resource, depth = stack.pop()
+            if resource.id in visited:
+                continue
+            visited.add(resource.id)
+
+            resource_permissions = permissions.get(resource.id, [])
+            items.append({
+                'depth': depth,
+                'resource': resource,
+                'has_permissions': len(resource_permissions) > 0,
+                'permissions': resource_permissions
+            })
+
+            # add children in reverse order, to pop them in sort order
+            for child in reversed(children.get(resource.id, [])):
+                stack.append((child, depth + 1))
+
+        return items
 
     def import_maps(self):
         """Import map resources."""
@@ -555,7 +795,9 @@ class ResourcesController(Controller):
             # get maps for tenant from config generator service
             url = urljoin(config_generator_service_url, 'maps')
             tenant = self.handler().tenant
-            response = requests.get(url, params={'tenant': tenant})
+            response = self.handler().http_session().get(
+                url, params={'tenant': tenant}
+            )
             if response.status_code != requests.codes.ok:
                 self.logger.error(
                     "Could not get maps from %s:\n%s" %
@@ -611,6 +853,175 @@ class ResourcesController(Controller):
             flash(msg, 'error')
             return redirect(url_for(self.base_route))
 
+    def refresh_maps(self):
+        """Import all maps and their layers from ConfigGenerator.
+
+        Map details are requested concurrently, and missing maps and layers
+        are added in a single transaction.
+        """
+        # get config generator URL
+        config = self.handler().config()
+        config_generator_service_url = config.get(
+            "config_generator_service_url",
+            "http://qwc-config-service:9090"
+        )
+        tenant = self.handler().tenant
+        http_session = self.handler().http_session()
+        max_workers = max(1, min(
+            config.get('import_max_workers', self.DEFAULT_IMPORT_MAX_WORKERS),
+            self.IMPORT_MAX_WORKERS_LIMIT
+        ))
+
+        session = None
+        try:
+            # get maps for tenant from config generator service
+            url = urljoin(config_generator_service_url, 'maps')
+            response = http_session.get(
+                url, params={'tenant': tenant},
+                timeout=self.CONFIG_GENERATOR_TIMEOUT
+            )
+            if response.status_code != requests.codes.ok:
+                self.logger.error(
+                    "Could not get maps from %s:\n%s" %
+                    (response.url, response.content)
+                )
+                flash(
+                    'Could not refresh maps: Status %s' %
+                    response.status_code, 'error'
+                )
+                return redirect(url_for(self.base_route))
+
+            maps_from_config = list(OrderedDict.fromkeys(response.json()))
+
+            # get layers of all maps
+            layers_from_config, failed_maps = self.fetch_map_layers(
+                config_generator_service_url, tenant, maps_from_config,
+                max_workers, http_session
+            )
+
+            self.setup_models()
+            session = self.session()
+
+            # get map IDs from ConfigDB as {<map name>: [<ID>]}
+            map_ids = OrderedDict()
+            query = session.query(self.Resource.id, self.Resource.name) \
+                .filter(self.Resource.type == 'map') \
+                .order_by(self.Resource.id)
+            for map_id, map_name in query.all():
+                map_ids.setdefault(map_name, []).append(map_id)
+
+            # add additional maps to ConfigDB
+            new_maps = [
+                map_name for map_name in maps_from_config
+                if map_name not in map_ids
+            ]
+            inserted = self.bulk_insert(
+                self.Resource, [
+                    {'type': 'map', 'name': map_name, 'parent_id': None}
+                    for map_name in sorted(new_maps)
+                ], session, 'name'
+            )
+            for map_id, map_name in inserted:
+                map_ids[map_name] = [map_id]
+
+            # get existing layers of all maps as {(<map ID>, <layer name>)}
+            all_map_ids = [
+                map_id for ids in map_ids.values() for map_id in ids
+            ]
+            query = session.query(
+                self.Resource.parent_id, self.Resource.name
+            ).filter(self.Resource.type == 'layer') \
+                .filter(self.Resource.parent_id.in_(all_map_ids))
+            existing_layers = set(query.all())
+
+            # add additional layers to ConfigDB
+            new_layers = []
+            for map_name, layers in layers_from_config.items():
+                for map_id in map_ids.get(map_name, []):
+                    for layer in sorted(set(layers)):
+                        if (map_id, layer) not in existing_layers:
+                            new_layers.append({
+                                'type': 'layer',
+                                'name': layer,
+                                'parent_id': map_id
+                            })
+            inserted_layers = self.bulk_insert(
+                self.Resource, new_layers, session
+            )
+
+            if inserted or inserted_layers:
+                # commit resources
+                session.commit()
+                self.update_config_timestamp(session)
+
+                flash(
+                    '%d new maps and %d new layers have been added.' %
+                    (len(inserted), len(inserted_layers)), 'success'
+                )
+            else:
+                flash('No additional maps or layers found.', 'info')
+
+            if failed_maps:
+                flash(
+                    'Could not get layers for %d maps: %s' %
+                    (len(failed_maps), ", ".join(failed_maps)), 'warning'
+                )
+
+            session.close()
+
+            return redirect(url_for(self.base_route, type='map'))
+        except Exception as e:
+            if session:
+                session.close()
+            msg = "Could not refresh maps: %s" % e
+            self.logger.error(msg)
+            flash(msg, 'error')
+            return redirect(url_for(self.base_route))
+
+    def fetch_map_layers(self, config_generator_service_url, tenant,
+                         map_names, max_workers, http_session):
+        """Get layers of maps from ConfigGenerator concurrently.
+
+        Returns ({<map name>: [<layer name>]}, [<names of failed maps>]).
+
+        :param str config_generator_service_url: ConfigGenerator service URL
+        :param str tenant: Tenant ID
+        :param list map_names: Map names
+        :param int max_workers: Max number of concurrent requests
+        :param Session http_session: Pooled HTTP session
+        """
+        def fetch_layers(map_name):
+            url = urljoin(config_generator_service_url, 'maps/%s' % map_name)
+            response = http_session.get(
+                url, params={'tenant': tenant},
+                timeout=self.CONFIG_GENERATOR_TIMEOUT
+            )
+            if response.status_code != requests.codes.ok:
+                raise Exception(
+                    "Status %s: %s" % (response.status_code, response.content)
+                )
+            return response.json().get('layers', [])
+
+        layers = OrderedDict()
+        failed_maps = []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(fetch_layers, map_name): map_name
+                for map_name in map_names
+            }
+            for future in as_completed(futures):
+                map_name = futures[future]
+                try:
+                    layers[map_name] = future.result()
+                except Exception as e:
+                    self.logger.error(
+                        "Could not get map details for '%s': %s" %
+                        (map_name, e)
+                    )
+                    failed_maps.append(map_name)
+
+        return layers, sorted(failed_maps)
+
     def _check_unused_resources(self, resources):
         """Check for unreferenced resources."""
         # get config generator URL
@@ -618,90 +1029,327 @@ class ResourcesController(Controller):
             "config_generator_service_url",
             "http://qwc-config-service:9090"
         )
+        resources_from_config = self._config_resources(
+            config_generator_service_url, self.handler().tenant,
+            self.handler().http_session()
+        )
+        if resources_from_config is None:
+            resources_from_config = []
+
+        self.logger.debug("resources_from_config: %s" % resources_from_config)
+        config_index = self._config_resources_index(resources_from_config)
+
+        # Iterate over all registered resources and
+        # check whether they are referenced in a service config or not
+        for res in resources:
+            res.not_referenced = self._is_unreferenced(res, config_index)
+
+            if res.not_referenced:
+                self.logger.info("Unreferenced resource: %s" % json.dumps(
+                    res, cls=AlchemyEncoder))
+
+    def _config_resources(self, config_generator_service_url, tenant,
+                          http_session):
+        """Return all maps and their layers (and attributes) that the
+        ConfigGenerator sees, or None on error.
+
+        :param str config_generator_service_url: ConfigGenerator service URL
+        :param str tenant: Tenant ID
+        :param Session http_session: Pooled HTTP session
+        """
         url = urljoin(config_generator_service_url, "resources")
-        tenant = self.handler().tenant
-        response = requests.get(url, params={'tenant': tenant})
+        response = http_session.get(url, params={'tenant': tenant})
         if response.status_code != requests.codes.ok:
             self.logger.error(
                 "Could not get all resources from %s:\n%s" %
                 (response.url, response.content)
             )
-            resources_from_config = []
-        else:
-            # List of resources that are referenced somewhere in the config of
-            # a service
-            resources_from_config = response.json()
+            return None
 
-        self.logger.debug("resources_from_config: %s" % resources_from_config)
-        maps_from_config = list(map(itemgetter('map'), resources_from_config))
+        # List of resources that are referenced somewhere in the config of
+        # a service
+        return response.json()
 
-        # Iterate over all registered resources and
-        # check whether they are referenced in a service config or not
+    def _config_resources_index(self, resources_from_config):
+        """Return lookup sets for resources referenced in service configs.
 
-        # resources_from_config is a dict with all maps and their
-        # layers(and attributes) that the ConfigGenerator sees.
+        resources_from_config is a list with all maps and their
+        layers (and attributes) that the ConfigGenerator sees, as
+            [{'map': <map>, 'layers': [{<layer>: [<attribute>]}]}]
 
-        for res in resources:
-            if res.type == "map":
-                if res.name not in maps_from_config:
-                    res.not_referenced = True
+        Returns dict with sets
+            'maps': {<map>}
+            'map_layers': {(<map>, <layer>)}
+            'layer_attributes': {(<layer>, <attribute>)}
 
-                continue
-            elif res.type in ["layer", "attribute", "data"]:
-                # Check if parent exists --> If not, then resource is not referenced
-                if res.parent is None:
-                    res.not_referenced = True
-                else:
-                    # Iterate over all resources found in the config
-                    res.not_referenced = True
-                    for resource in resources_from_config:
-                        # data and layer types are handled the same
-
-                        # When iterating over the `resources_from_config` list,
-                        # the existance of the `res` resource will be checked in all maps.
-                        # This means that when have found the resource in a map, this loop should end.
-                        if res.not_referenced == False:
-                            break
-
-                        # Check whether the resource parent is referenced
-                        if "*" in res.name and res.parent.name in maps_from_config:
-                            res.not_referenced = False
-                            continue
-                        elif (res.type == "data" or res.type == "layer") and \
-                            res.parent.name in maps_from_config and \
-                                resource["map"] == res.parent.name:
-
-                            # Here we use generator comprehension to boost the
-                            # performance
-                            res.not_referenced = next(
-                                (False for layer in resource[
-                                    "layers"] if res.name in layer.keys()),
-                                True)
-                            # Stop here, because we iterated over
-                            # the maps(parent) resources and didn't find
-                            # any reference
-                            continue
-
-                        elif res.type == "attribute":
-                            # Here we use generator comprehension to boost the
-                            # performance
-                            # What we do here is we iterate over the layers list and check the following
-                            # - Is the resources parent (which is a layer) in the layers list?
-                            # - Does the corresponding layer attribute list contain the resource name?
-                            res.not_referenced = next(
-                                (False for layer in resource["layers"] if res.parent.name in layer.keys() \
-                                    and res.name in list(layer.values())[0]), True)
-                            # Stop here, because we iterated over
-                            # the maps(parent) resources and didn't find
-                            # any reference
-                            continue
+        :param list resources_from_config: Resources from ConfigGenerator
+        """
+        maps = set()
+        map_layers = set()
+        layer_attributes = set()
+        for resource in resources_from_config:
+            map_name = resource.get('map')
+            maps.add(map_name)
+            for layer in resource.get('layers', []):
+                # attributes are in first value of layer dict
+                attributes = next(iter(layer.values()), None) or []
+                for layer_name in layer.keys():
+                    map_layers.add((map_name, layer_name))
+                    for attribute in attributes:
+                        layer_attributes.add((layer_name, attribute))
+
+        return {
+            'maps': maps,
+            'map_layers': map_layers,
+            'layer_attributes': layer_attributes
+        }
+
+    def _is_unreferenced(self, res, config_index):
+        """Check whether a resource is not referenced in any service config.
+
+        NOTE: attributes are matched by layer name in any map,
+              as only the parent layer of an attribute is known
+
+        :param object res: Resource object with parent
+        :param obj config_index: Lookup sets from _config_resources_index()
+        """
+        maps = config_index['maps']
+        if res.type == "map":
+            return res.name not in maps
+        elif res.type in ["layer", "attribute", "data"]:
+            # Check if parent exists --> If not, then resource is not referenced
+            if res.parent is None:
+                return True
+
+            if "*" in res.name and res.parent.name in maps:
+                # wildcard resource in referenced parent
+                return False
+            elif res.type in ["data", "layer"]:
+                # data and layer types are handled the same
+                return (res.parent.name, res.name) \
+                    not in config_index['map_layers']
             else:
-                # Resources are marked as referenced per default, if we don't check them
-                res.not_referenced = False
+                # check whether the parent layer has this attribute
+                return (res.parent.name, res.name) \
+                    not in config_index['layer_attributes']
+        else:
+            # Resources are marked as referenced per default, if we don't check them
+            return False
 
-            if res.not_referenced:
-                self.logger.info("Unreferenced resource: %s" % json.dumps(
-                    res, cls=AlchemyEncoder))
+    def start_unused_report(self):
+        """Start background job for unused resources report."""
+        # get config generator URL
+        config_generator_service_url = self.handler().config().get(
+            "config_generator_service_url",
+            "http://qwc-config-service:9090"
+        )
+        tenant = self.handler().tenant
+
+        record, started = self.job_runner.submit(
+            tenant, self.UNUSED_REPORT_JOB, self.unused_report_job,
+            self.handler().config_models(), config_generator_service_url,
+            self.handler().http_session(),
+            self.job_runner.path(tenant, self.UNUSED_REPORT_FILE)
+        )
+        if started:
+            flash('Unused resources report has been started.', 'success')
+        else:
+            flash('Unused resources report is already running.', 'info')
+
+        return redirect(url_for(self.base_route))
+
+    def unused_report_job(self, job, config_models,
+                          config_generator_service_url, http_session,
+                          report_path):
+        """Check all resources of tenant for references in service configs
+        and write unreferenced resources to report file.
+
+        The report file contains one JSON object per line as
+            {'id': <ID>, 'type': <type>, 'name': <name>,
+             'parent': <parent name or None>}
+
+        NOTE: runs in background thread without request context
+
+        :param Job job: Background job
+        :param ConfigModels config_models: Helper for ORM models
+        :param str config_generator_service_url: ConfigGenerator service URL
+        :param Session http_session: Pooled HTTP session
+        :param str report_path: Path to report file
+        """
+        resources_from_config = self._config_resources(
+            config_generator_service_url, job.tenant, http_session
+        )
+        if resources_from_config is None:
+            raise Exception("Could not get resources from ConfigGenerator")
+        config_index = self._config_resources_index(resources_from_config)
+        job.log(
+            "Got %d maps from ConfigGenerator" % len(config_index['maps'])
+        )
+
+        Resource = config_models.model('resources')
+        session = config_models.session()
+        checked = 0
+        unreferenced = 0
+        tmp_path = "%s.%s.tmp" % (report_path, job.id)
+        try:
+            # stream all resources with their parents
+            query = session.query(Resource) \
+                .options(joinedload(Resource.parent)) \
+                .order_by(Resource.id).yield_per(1000)
+            with open(tmp_path, 'w') as f:
+                for res in query:
+                    checked += 1
+                    if self._is_unreferenced(res, config_index):
+                        unreferenced += 1
+                        f.write(json.dumps({
+                            'id': res.id,
+                            'type': res.type,
+                            'name': res.name,
+                            'parent': res.parent.name if res.parent else None
+                        }) + "\n")
+
+                    if checked % 10000 == 0:
+                        job.log("Checked %d resources" % checked)
+
+            # replace previous report
+            os.replace(tmp_path, report_path)
+        finally:
+            session.close()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        job.log(
+            "Found %d unreferenced of %d resources" % (unreferenced, checked)
+        )
+
+        return {
+            'checked': checked,
+            'unreferenced': unreferenced
+        }
+
+    def unused_report_status(self):
+        """Return status of latest unused resources report as JSON."""
+        record = self.job_runner.latest(
+            self.handler().tenant, self.UNUSED_REPORT_JOB
+        )
+        if record is None:
+            abort(404)
+
+        return jsonify(record)
+
+    def unused_report_ids(self, tenant):
+        """Return IDs of unreferenced resources from unused resources report,
+        or None if there is no report.
+
+        :param str tenant: Tenant ID
+        """
+        try:
+            with open(self.job_runner.path(tenant, self.UNUSED_REPORT_FILE)) \
+                    as f:
+                return [json.loads(line)['id'] for line in f if line.strip()]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def unused_report_filter(self, unreferenced_ids, session):
+        """Return filter for resources of unused resources report.
+
+        The IDs are loaded into a temporary table in batches, to avoid
+        unbounded bind parameter lists in the resources queries.
+        The table is dropped at the end of the DB transaction.
+
+        :param list(int) unreferenced_ids: IDs from unused_report_ids()
+        :param Session session: DB session
+        """
+        ids_table = self.UNUSED_REPORT_TABLE
+        conn = session.connection()
+        ids_table.create(conn, checkfirst=True)
+        conn.execute(ids_table.delete())
+        for i in range(0, len(unreferenced_ids), self.BULK_INSERT_SIZE):
+            conn.execute(ids_table.insert(), [
+                {'id': id}
+                for id in unreferenced_ids[i:i + self.BULK_INSERT_SIZE]
+            ])
+
+        return exists().where(ids_table.c.id == self.Resource.id)
+
+    def destroy_unreferenced(self):
+        """Delete all unreferenced resources from unused resources report
+        and their children.
+
+        Resources are checked again against the current service configs, to
+        keep resources which have been referenced since the report.
+        """
+        # workaround for missing DELETE methods in HTML forms
+        #   using hidden form parameter '_method'
+        method = request.form.get('_method', request.method).upper()
+        if method != 'DELETE':
+            abort(405)
+
+        self.setup_models()
+
+        tenant = self.handler().tenant
+        unreferenced_ids = self.unused_report_ids(tenant)
+        if not unreferenced_ids:
+            flash('No unreferenced resources in report.', 'info')
+            return redirect(url_for(self.base_route))
+
+        # get config generator URL
+        config_generator_service_url = self.handler().config().get(
+            "config_generator_service_url",
+            "http://qwc-config-service:9090"
+        )
+        resources_from_config = self._config_resources(
+            config_generator_service_url, tenant, self.handler().http_session()
+        )
+        if resources_from_config is None:
+            flash(
+                'Could not delete unreferenced resources: '
+                'Could not get resources from ConfigGenerator', 'error'
+            )
+            return redirect(url_for(self.base_route))
+        config_index = self._config_resources_index(resources_from_config)
+
+        session = self.session()
+        try:
+            query = session.query(self.Resource) \
+                .options(joinedload(self.Resource.parent)) \
+                .filter(self.unused_report_filter(unreferenced_ids, session))
+            resources = [
+                res for res in query.all()
+                if self._is_unreferenced(res, config_index)
+            ]
+
+            # delete and commit resources and their children
+            deleted_resources, deleted_permissions = \
+                self.destroy_resources_cascaded(
+                    [res.id for res in resources], session
+                )
+            session.commit()
+            self.update_config_timestamp(session)
+
+            # discard report
+            os.remove(self.job_runner.path(tenant, self.UNUSED_REPORT_FILE))
+            flask_session.get("resources", {}).get("params", {}) \
+                .pop("unreferenced", None)
+            flask_session.modified = True
+
+            flash(
+                '%d unreferenced resources and their children have been '
+                'deleted (%d resources, %d permissions).' %
+                (len(resources), deleted_resources, deleted_permissions),
+                'success'
+            )
+        except InternalError as e:
+            flash('InternalError: %s' % e.orig, 'error')
+        except IntegrityError as e:
+            flash('IntegrityError: %s' % e.orig, 'error')
+        except OSError as e:
+            self.logger.warning("Could not remove report: %s" % e)
+
+        session.close()
+
+        # redirect to resources list
+        return redirect(url_for(self.base_route))
 
     def import_children(self, id):
         """Import child resources for a resource:
@@ -754,7 +1402,9 @@ class ResourcesController(Controller):
                 config_generator_service_url, 'maps/%s' % map_resource.name
             )
             tenant = self.handler().tenant
-            response = requests.get(url, params={'tenant': tenant})
+            response = self.handler().http_session().get(
+                url, params={'tenant': tenant}
+            )
             if response.status_code != requests.codes.ok:
                 self.logger.error(
                     "Could not get map details from %s:\n%s" %
@@ -851,7 +1501,7 @@ class ResourcesController(Controller):
                             config_generator_service_url, 'maps/%s' % parent_resource.name
                         )
                         tenant = self.handler().tenant
-                        response = requests.get(url, params={'tenant': tenant})
+                        response = self.handler().http_session().get(url, params={'tenant': tenant})
                         if response.status_code != requests.codes.ok:
                             self.logger.error(
                                 "Could not get map details from %s:\n%s" %
@@ -866,61 +1516,13 @@ class ResourcesController(Controller):
                         layers_from_config = response.json().get('layers', [])
 
                         if layers_from_config:
-                            new_resources = []
-                            new_permissions = []
-                            for layer in layers_from_config:
-                                # first query to know if resource already exists
-                                query = session.query(self.Resource) \
-                                    .filter(self.Resource.name == layer) \
-                                    .filter(self.Resource.type == type) \
-                                    .filter(self.Resource.parent_id == parent_resource.id)
-                                resources = query.all()
-
-                                if not resources:
-                                    # resource does not exist in database so create new resource
-                                    resource = self.Resource()
-                                    resource.type = type
-                                    resource.name = layer
-                                    resource.parent_id = parent_resource.id
-                                    new_resources.append(resource)
-                                    session.add(resource)
-
-                                    # new query to get id of new resource
-                                    query = session.query(self.Resource) \
-                                        .filter(self.Resource.name == layer) \
-                                        .filter(self.Resource.type == type) \
-                                        .filter(self.Resource.parent_id == parent_resource.id)
-                                    resources = query.all()
-
-                                # handle permission for existing or new resource if role has been chosen
-                                role = form.role_id.data
-                                if role > 0:
-                                    for resource in resources:
-                                        resource_id = resource.__dict__.get('id')
-                                        # query resource permissions
-                                        query = session.query(self.Permission) \
-                                            .filter(self.Permission.resource_id == resource_id) \
-                                            .filter(self.Permission.role_id == role)
-
-                                        permissions = []
-                                        for permission in query.all():
-                                            permissions.append({
-                                                "role": permission.role.name,
-                                                "write": permission.write
-                                            })
-                                        if not permissions:
-                                            # create new permission for resource
-                                            permission = self.Permission()
-                                            session.add(permission)
-
-                                            # update permission
-                                            permission.priority = form.priority.data
-                                            permission.write = form.write.data
-
-                                            permission.role_id = role
-
-                                            permission.resource_id = resource_id
-                                            new_permissions.append(permission)                                
+                            new_resources, new_permissions = \
+                                self.import_child_resources(
+                                    parent_resource, layers_from_config,
+                                    type, form.role_id.data,
+                                    form.priority.data, form.write.data,
+                                    session
+                                )
 
                             # commit resources
                             session.commit()
@@ -929,7 +1531,7 @@ class ResourcesController(Controller):
                             if new_resources:
                                 flash(
                                     '%d new resources have been added.' %
-                                    len(new_resources), 'success'
+                                    new_resources, 'success'
                                 )
                             else:
                                 flash('No additional resources found.', 'info')
@@ -937,7 +1539,7 @@ class ResourcesController(Controller):
                             if new_permissions:
                                 flash(
                                     '%d new permissions have been added.' %
-                                    len(new_permissions), 'success'
+                                    new_permissions, 'success'
                                 )
                             else:
                                 flash('No additional permissions found.', 'info')
@@ -972,6 +1574,102 @@ class ResourcesController(Controller):
             flash('Could not import resources from %s.' % parent_resource,
                   'warning')
 
+    def import_child_resources(self, parent_resource, names, type, role_id,
+                               priority, write, session):
+        """Add missing child resources of a type and their permissions for a
+        role in bulk, and return number of added resources and permissions as
+        (<new resources>, <new permissions>).
+
+        :param object parent_resource: Parent resource
+        :param list names: Names of child resources
+        :param str type: Resource type of child resources
+        :param int role_id: Role ID for permissions (0 for no permissions)
+        :param int priority: Priority of new permissions
+        :param bool write: Write flag of new permissions
+        :param Session session: DB session
+        """
+        # lock parent, so concurrent imports do not add the same children
+        session.query(self.Resource.id) \
+            .filter(self.Resource.id == parent_resource.id) \
+            .with_for_update().all()
+
+        # query existing children of type once
+        children_query = session.query(self.Resource.id) \
+            .filter(self.Resource.type == type) \
+            .filter(self.Resource.parent_id == parent_resource.id)
+        existing_names = set(
+            name for name, in
+            children_query.with_entities(self.Resource.name)
+        )
+
+        # insert missing children
+        new_names = list(OrderedDict.fromkeys(
+            name for name in names if name not in existing_names
+        ))
+        new_resources = len(self.bulk_insert(
+            self.Resource, [
+                {'type': type, 'name': name, 'parent_id': parent_resource.id}
+                for name in new_names
+            ], session
+        ))
+
+        new_permissions = 0
+        if role_id is not None and role_id > 0:
+            # children in names without permission for role
+            has_permission = session.query(self.Permission.id) \
+                .filter(self.Permission.resource_id == self.Resource.id) \
+                .filter(self.Permission.role_id == role_id) \
+                .exists()
+            unique_names = list(OrderedDict.fromkeys(names))
+            resource_ids = []
+            for i in range(0, len(unique_names), self.BULK_INSERT_SIZE):
+                resource_ids += [
+                    resource_id for resource_id, in children_query
+                    .filter(self.Resource.name.in_(
+                        unique_names[i:i + self.BULK_INSERT_SIZE]
+                    ))
+                    .filter(~has_permission).order_by(self.Resource.id)
+                ]
+
+            # insert missing permissions
+            new_permissions = len(self.bulk_insert(
+                self.Permission, [
+                    {
+                        'priority': priority,
+                        'write': write,
+                        'role_id': role_id,
+                        'resource_id': resource_id
+                    }
+                    for resource_id in resource_ids
+                ], session
+            ))
+
+        return new_resources, new_permissions
+
+    def bulk_insert(self, model, rows, session, *returning):
+        """Insert rows in chunks and return inserted rows as list of
+        (<id>, <returning columns>).
+
+        NOTE: rows are not checked for duplicates, callers must skip
+              existing rows
+
+        :param DeclarativeMeta model: ORM model
+        :param list rows: Rows as list of dicts with column values
+        :param Session session: DB session
+        :param returning: Additional column names to return
+        """
+        table = model.__table__
+        columns = [table.c.id] + [table.c[name] for name in returning]
+
+        inserted = []
+        for i in range(0, len(rows), self.BULK_INSERT_SIZE):
+            stmt = table.insert() \
+                .values(rows[i:i + self.BULK_INSERT_SIZE]) \
+                .returning(*columns)
+            inserted += session.execute(stmt).fetchall()
+
+        return inserted
+
 class AlchemyEncoder(json.JSONEncoder):
 
     def default(self, obj):
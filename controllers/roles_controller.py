@@ -1,5 +1,6 @@
 from .controller import Controller
 from forms import RoleForm
+from permission_resolver import PermissionResolver
 from flask import flash, Markup
 from wtforms import ValidationError
 
@@ -7,6 +8,12 @@ from wtforms import ValidationError
 class RolesController(Controller):
     """Controller for role model"""
 
+    # JSON lookup for multi-select fields
+    LOOKUP_ENABLED = True
+
+    # view of effective permissions
+    EFFECTIVE_PERMISSIONS_SUBJECT = PermissionResolver.SUBJECT_ROLE
+
     # name of admin iam.role
     ADMIN_ROLE_NAME = 'admin'
 
@@ -28,7 +35,9 @@ class RolesController(Controller):
         """
         query = session.query(self.Role).order_by(self.Role.name)
         if search_text:
-            query = query.filter(self.Role.name.ilike("%%%s%%" % search_text))
+            query = query.filter(
+                self.search_filter(self.Role.name, search_text)
+            )
 
         return query
 
@@ -105,11 +114,11 @@ class RolesController(Controller):
 
         # update groups
         self.update_collection(
-            role.groups_collection, form.groups, self.Group, 'id', session
+            role, form.groups, self.Group, 'groups_collection', 'id', session
         )
         # update users
         self.update_collection(
-            role.users_collection, form.users, self.User, 'id', session
+            role, form.users, self.User, 'users_collection', 'id', session
         )
 
     def destroy_resource(self, resource, session):
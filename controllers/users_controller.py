@@ -1,23 +1,62 @@
 import os
+import shutil
+import uuid
 
-from flask import json
+from flask import abort, flash, json, jsonify, redirect, render_template, \
+    request, url_for
 
 from .controller import Controller
 from forms import UserForm
+from permission_resolver import PermissionResolver
+from user_import import UserImport
 
 
 class UsersController(Controller):
     """Controller for user model"""
 
-    def __init__(self, app, handler):
+    # JSON lookup for multi-select fields
+    LOOKUP_ENABLED = True
+
+    # view of effective permissions
+    EFFECTIVE_PERMISSIONS_SUBJECT = PermissionResolver.SUBJECT_USER
+
+    # job kind for user import
+    IMPORT_JOB = 'user_import'
+    # content types of web forms, which can be sent cross-site without
+    # CORS preflight and require a CSRF token
+    FORM_CONTENT_TYPES = [
+        'application/x-www-form-urlencoded', 'multipart/form-data',
+        'text/plain'
+    ]
+
+    def __init__(self, app, handler, job_runner):
         """Constructor
 
         :param Flask app: Flask application
         :param handler: Tenant config handler
+        :param JobRunner job_runner: Runner for background jobs
         """
         super(UsersController, self).__init__(
             "User", 'users', 'user', 'users', app, handler
         )
+        self.job_runner = job_runner
+
+        # add custom routes
+        base_route = self.base_route
+        suffix = self.endpoint_suffix
+        # bulk import of users, groups and memberships
+        app.add_url_rule(
+            '/%s/import' % base_route, 'import_%s' % suffix,
+            self.import_users, methods=['GET', 'POST']
+        )
+        app.add_url_rule(
+            '/%s/import/status' % base_route, 'import_status_%s' % suffix,
+            self.import_status, methods=['GET']
+        )
+        # NOTE: CSRF token is checked in import_users for web forms only,
+        #       so files can be sent as raw request body by scripts
+        self.csrf = app.extensions['csrf']
+        self.csrf.exempt(self.import_users)
 
     def resources_for_index_query(self, search_text, session):
         """Return query for users list.
@@ -27,7 +66,9 @@ class UsersController(Controller):
         """
         query = session.query(self.User).order_by(self.User.name)
         if search_text:
-            query = query.filter(self.User.name.ilike("%%%s%%" % search_text))
+            query = query.filter(
+                self.search_filter(self.User.name, search_text)
+            )
 
         return query
 
@@ -58,6 +99,16 @@ class UsersController(Controller):
         """
         return session.query(self.User).filter_by(id=id).first()
 
+    def user_info_fields(self):
+        """Return custom user info fields from config."""
+        user_info_fields = self.handler().config().get(
+            "user_info_fields", [])
+        # make sure that all python strings
+        # are in double quotes and not single quotes
+        return json.loads(
+            json.dumps(user_info_fields)
+        )
+
     def create_form(self, resource=None, edit_form=False):
         """Return form with fields loaded from DB.
 
@@ -66,14 +117,7 @@ class UsersController(Controller):
         """
 
         # get custom user info fields
-        # get custom user info fields
-        user_info_fields = self.handler().config().get(
-            "user_info_fields", [])
-        # make sure that all python strings
-        # are in double quotes and not single quotes
-        user_info_fields = json.loads(
-            json.dumps(user_info_fields)
-        )
+        user_info_fields = self.user_info_fields()
 
         form = UserForm(self.config_models, user_info_fields, obj=resource)
 
@@ -149,9 +193,138 @@ class UsersController(Controller):
 
         # update groups
         self.update_collection(
-            user.groups_collection, form.groups, self.Group, 'id', session
+            user, form.groups, self.Group, 'groups_collection', 'id', session
         )
         # update roles
         self.update_collection(
-            user.roles_collection, form.roles, self.Role, 'id', session
+            user, form.roles, self.Role, 'roles_collection', 'id', session
         )
+
+    def import_users(self):
+        """Show import form or start background job for importing users,
+        groups and memberships from an uploaded CSV or JSONL file.
+
+        The file is either uploaded as multipart field 'file' or sent as
+        request body. The format is taken from the 'format' param, the file
+        extension or the content type.
+
+        Returns the job status record as JSON if requested, otherwise
+        redirects to the import form, which shows the latest import.
+        """
+        self.setup_models()
+
+        tenant = self.handler().tenant
+        if request.method == 'POST':
+            if request.mimetype in self.FORM_CONTENT_TYPES:
+                self.csrf.protect()
+
+            upload = request.files.get('file')
+            if upload is not None and upload.filename:
+                stream = upload.stream
+                format = request.values.get('format') or \
+                    UserImport.detect_format(
+                        upload.filename, upload.content_type
+                    )
+            else:
+                # streamed request body
+                stream = request.stream
+                format = request.values.get('format') or \
+                    UserImport.detect_format(content_type=request.mimetype)
+
+            error = None
+            status_code = None
+            if format not in [UserImport.FORMAT_CSV, UserImport.FORMAT_JSONL]:
+                error = "Unsupported import format, use CSV or JSONL"
+                status_code = 400
+            elif self.job_runner.active_job(tenant, self.IMPORT_JOB):
+                error = "An import is already running"
+                status_code = 409
+            else:
+                # store file for background job
+                path = self.job_runner.path(
+                    tenant, "user_import_%s.%s" % (uuid.uuid4().hex, format)
+                )
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'wb') as f:
+                    shutil.copyfileobj(stream, f)
+
+                record, started = self.job_runner.submit(
+                    tenant, self.IMPORT_JOB, self.import_users_job,
+                    self.config_models, self.user_info_fields(),
+                    self.config.get(
+                        'user_import_batch_size',
+                        UserImport.DEFAULT_BATCH_SIZE
+                    ),
+                    path, format
+                )
+                if not started:
+                    # import started concurrently
+                    os.remove(path)
+                    error = "An import is already running"
+                    status_code = 409
+
+            if request.accept_mimetypes.best == 'application/json':
+                if error:
+                    return jsonify({'error': error}), status_code
+                return jsonify(dict(record, started=True)), 202
+
+            if error:
+                flash(error, 'error')
+            else:
+                flash('User import has been started.', 'success')
+            return redirect(url_for('import_%s' % self.endpoint_suffix))
+
+        return render_template(
+            '%s/import_form.html' % self.templates_dir, title='Import users',
+            action=url_for('import_%s' % self.endpoint_suffix),
+            job=self.job_runner.latest(tenant, self.IMPORT_JOB)
+        )
+
+    def import_users_job(self, job, config_models, user_info_fields,
+                         batch_size, path, format):
+        """Import users from stored file and return import report.
+
+        NOTE: runs in background thread without request context
+
+        :param Job job: Background job
+        :param ConfigModels config_models: Helper for ORM models
+        :param list(obj) user_info_fields: Custom user info fields
+        :param int batch_size: Number of rows per transaction
+        :param str path: Path to stored import file
+        :param str format: Import format ('csv' or 'jsonl')
+        """
+        try:
+            with self.app.app_context():
+                user_import = UserImport(
+                    config_models, user_info_fields, self.logger, batch_size
+                )
+                with open(path, 'rb') as f:
+                    report = user_import.run(
+                        f, format, lambda report: job.log(
+                            "Imported %d rows, %d failed" %
+                            (report['rows'], report['failed'])
+                        )
+                    )
+        finally:
+            os.remove(path)
+
+        return report
+
+    def import_status(self):
+        """Return status of a user import job as JSON.
+
+        Parameter:
+            job_id: Optional job ID (default: latest job)
+        """
+        tenant = self.handler().tenant
+        job_id = request.args.get('job_id')
+        if job_id:
+            record = self.job_runner.status(tenant, job_id)
+            if record is not None and record['kind'] != self.IMPORT_JOB:
+                record = None
+        else:
+            record = self.job_runner.latest(tenant, self.IMPORT_JOB)
+        if record is None:
+            abort(404)
+
+        return jsonify(record)
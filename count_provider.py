@@ -0,0 +1,94 @@
+from config_cache import ConfigDBCache
+
+
+class CountProvider:
+    """Row counts for paginated resources lists
+
+    Counts are memoized per tenant and filter key until they expire or the
+    ConfigDB changes. Above a threshold, PostgreSQL planner estimates are
+    used instead of exact counts.
+    """
+
+    # default time in seconds until cached counts expire
+    DEFAULT_CACHE_TTL = 300
+    # default max number of cached counts per tenant
+    DEFAULT_CACHE_SIZE = 1000
+
+    def __init__(self, logger):
+        """Constructor
+
+        :param Logger logger: Application logger
+        """
+        self.logger = logger
+        self.cache = ConfigDBCache()
+
+    def count(self, query, key, tenant, config_models, config):
+        """Return number of rows for query as (count, estimated).
+
+        :param Query query: Query for resources list
+        :param obj key: Hashable key for query filters
+        :param str tenant: Tenant ID
+        :param ConfigModels config_models: Helper for ORM models
+        :param obj config: Tenant config
+        """
+        session = query.session
+        cache_ttl = config.get('count_cache_ttl', self.DEFAULT_CACHE_TTL)
+        estimate_threshold = config.get('count_estimate_threshold', 0)
+
+        if cache_ttl > 0:
+            last_update = ConfigDBCache.last_update(config_models, session)
+            cached = self.cache.lookup(tenant, last_update, key)
+            if cached is not None:
+                return cached['value']
+
+        result = None
+        if estimate_threshold > 0:
+            estimate = self.estimate(query)
+            if estimate is not None and estimate >= estimate_threshold:
+                result = (estimate, True)
+
+        if result is None:
+            # exact count
+            result = (query.order_by(None).count(), False)
+
+        if cache_ttl > 0:
+            self.cache.set(
+                tenant, last_update, key, result, cache_ttl,
+                self.DEFAULT_CACHE_SIZE
+            )
+
+        return result
+
+    def estimate(self, query):
+        """Return planner estimate for number of rows of query,
+        or None if not supported.
+
+        :param Query query: Query for resources list
+        """
+        session = query.session
+        engine = session.get_bind()
+        if engine.dialect.name != 'postgresql':
+            return None
+
+        try:
+            compiled = query.order_by(None).statement.compile(
+                dialect=engine.dialect
+            )
+            # NOTE: use session connection, as the query may use temporary
+            #       tables, and a savepoint, so errors do not abort the
+            #       session
+            with session.begin_nested():
+                plan = session.connection().exec_driver_sql(
+                    "EXPLAIN (FORMAT JSON) %s" % compiled, compiled.params
+                ).scalar()
+            return int(plan[0]['Plan']['Plan Rows'])
+        except Exception as e:
+            self.logger.warning("Could not estimate row count: %s" % e)
+            return None
+
+    def clear(self, tenant=None):
+        """Discard cached counts.
+
+        :param str tenant: Only clear counts for this tenant (default: all)
+        """
+        self.cache.clear(tenant)
@@ -0,0 +1,82 @@
+from threading import Lock
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from proxy_whitelist import ProxyWhitelist
+
+
+class HttpRegistry:
+    """Process-wide registry of pooled HTTP sessions and proxy URL
+    whitelists
+
+    Keep the keep-alive connections and whitelist counters of each tenant
+    across tenant config handlers, which are recreated when the tenant
+    config changes. Entries are only replaced if their settings change.
+    """
+
+    def __init__(self, logger):
+        """Constructor
+
+        :param Logger logger: Application logger
+        """
+        self.logger = logger
+
+        # pooled HTTP sessions as {<tenant>: (<pool_maxsize>, <Session>)}
+        self.sessions = {}
+        # proxy URL whitelists as
+        #   {<tenant>: (<patterns>, <ProxyWhitelist>)}
+        self.whitelists = {}
+        self.lock = Lock()
+
+    def http_session(self, tenant, pool_maxsize):
+        """Return pooled HTTP session for a tenant, created on first access
+        or if the pool size has changed.
+
+        :param str tenant: Tenant ID
+        :param int pool_maxsize: Max number of pooled connections per host
+        """
+        entry = self.sessions.get(tenant)
+        if entry is not None and entry[0] == pool_maxsize:
+            return entry[1]
+
+        with self.lock:
+            # check again after acquiring lock
+            entry = self.sessions.get(tenant)
+            if entry is not None and entry[0] == pool_maxsize:
+                return entry[1]
+
+            self.logger.debug("Setup HTTP session for tenant '%s'" % tenant)
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_maxsize=pool_maxsize)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self.sessions[tenant] = (pool_maxsize, session)
+
+        if entry is not None:
+            # close connections of replaced session
+            entry[1].close()
+
+        return session
+
+    def proxy_whitelist(self, tenant, patterns):
+        """Return compiled proxy URL whitelist for a tenant, created on first
+        access or if the patterns have changed.
+
+        :param str tenant: Tenant ID
+        :param list(str) patterns: RegExes for whitelisted URLs
+        """
+        entry = self.whitelists.get(tenant)
+        if entry is not None and entry[0] == patterns:
+            return entry[1]
+
+        with self.lock:
+            # check again after acquiring lock
+            entry = self.whitelists.get(tenant)
+            if entry is not None and entry[0] == patterns:
+                return entry[1]
+
+            whitelist = ProxyWhitelist(patterns, self.logger)
+            self.whitelists[tenant] = (list(patterns), whitelist)
+
+        return whitelist
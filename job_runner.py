@@ -0,0 +1,426 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import fcntl
+import json
+import os
+import re
+import socket
+from threading import Lock, Thread
+import time
+import uuid
+
+
+class JobRunner:
+    """Runner for background jobs in worker threads
+
+    Job status records are stored as JSON files in
+    '<jobs_path>/<tenant>/'. Only one job of each kind is active per tenant
+    at any time. jobs_path must be a directory shared by all processes and
+    containers of the service (e.g. a shared volume), else job status
+    requests and locks do not cover jobs started in other containers.
+
+    Each job kind has its own worker threads in each process, so a slow job
+    does not block jobs of other kinds. The workers of a kind are shared by
+    all tenants.
+
+    The records of unfinished jobs are refreshed periodically as a heartbeat.
+    An unfinished job is considered interrupted if its heartbeat lease has
+    expired, or if its process is no longer running on the same host.
+    Job status records older than RECORD_MAX_AGE are removed, except for the
+    latest job of each kind.
+
+    Job status record:
+        {
+            'id': <job ID>,
+            'tenant': <tenant>,
+            'kind': <job kind, e.g. 'generate_configs'>,
+            'status': <'pending'|'running'|'success'|'failed'>,
+            'host': <host name of process running the job>,
+            'pid': <ID of process running the job>,
+            'created_at': <ISO timestamp>,
+            'updated_at': <ISO timestamp>,
+            'finished_at': <ISO timestamp or None>,
+            'log': [<log messages>],
+            'result': <JSON result or None>,
+            'error': <error message or None>
+        }
+    """
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    SUCCESS = 'success'
+    FAILED = 'failed'
+
+    # interval in seconds for refreshing records of unfinished jobs
+    HEARTBEAT_INTERVAL = 30
+    # time in seconds after last heartbeat until a job is interrupted
+    LEASE_TIMEOUT = 120
+    # max age in seconds of job status records
+    RECORD_MAX_AGE = 7 * 24 * 3600
+
+    def __init__(self, jobs_path, logger, max_workers=2):
+        """Constructor
+
+        :param str jobs_path: Base dir for job status records
+        :param Logger logger: Application logger
+        :param int max_workers: Max number of concurrent jobs of each kind
+                                in this process
+        """
+        self.jobs_path = jobs_path
+        self.logger = logger
+        self.max_workers = max_workers
+
+        self.hostname = socket.gethostname()
+
+        # worker pools as {<job kind>: <ThreadPoolExecutor>}
+        self.executors = {}
+        self.executors_lock = Lock()
+
+        # unfinished jobs of this process as {<job ID>: <Job>}
+        self.jobs = {}
+        self.heartbeat_thread = None
+
+    def submit(self, tenant, kind, fn, *args):
+        """Start a background job, unless a job of the same kind is already
+        active for the tenant.
+
+        Returns (<job status record>, <True if new job was started>).
+
+        The job function is called as fn(job, *args) with a Job instance for
+        logging, and returns the JSON result of the job.
+
+        :param str tenant: Tenant ID
+        :param str kind: Job kind
+        :param callable fn: Job function
+        """
+        with self.lock(tenant, kind):
+            record = self.active_job(tenant, kind)
+            if record is not None:
+                # coalesce with active job
+                return record, False
+
+            now = self.timestamp()
+            record = {
+                'id': uuid.uuid4().hex,
+                'tenant': tenant,
+                'kind': kind,
+                'status': self.PENDING,
+                'host': self.hostname,
+                'pid': os.getpid(),
+                'created_at': now,
+                'updated_at': now,
+                'finished_at': None,
+                'log': [],
+                'result': None,
+                'error': None
+            }
+            self.write_record(record)
+            self.write_file(
+                self.path(tenant, "%s.latest" % kind), record['id']
+            )
+            self.prune(tenant)
+
+        # NOTE: return copy, as record is updated by worker thread
+        result = dict(record, log=[])
+        job = Job(self, record)
+        with self.executors_lock:
+            self.jobs[job.id] = job
+            self.start_heartbeat()
+        self.executor(kind).submit(self.run, job, fn, args)
+        return result, True
+
+    def executor(self, kind):
+        """Return worker pool of a job kind, creating it on first use.
+
+        :param str kind: Job kind
+        """
+        with self.executors_lock:
+            executor = self.executors.get(kind)
+            if executor is None:
+                executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix='job-%s' % kind
+                )
+                self.executors[kind] = executor
+            return executor
+
+    def start_heartbeat(self):
+        """Start heartbeat thread of this process if not yet running.
+
+        NOTE: call with executors_lock held
+        """
+        if self.heartbeat_thread is not None and \
+                self.heartbeat_thread.is_alive():
+            return
+
+        self.heartbeat_thread = Thread(
+            target=self.heartbeat, name='job-heartbeat', daemon=True
+        )
+        self.heartbeat_thread.start()
+
+    def heartbeat(self):
+        """Periodically refresh records of unfinished jobs of this process.
+        """
+        while True:
+            time.sleep(self.HEARTBEAT_INTERVAL)
+            with self.executors_lock:
+                jobs = list(self.jobs.values())
+            for job in jobs:
+                try:
+                    job.update()
+                except Exception as e:
+                    self.logger.warning(
+                        "Could not refresh job '%s': %s" % (job.id, e)
+                    )
+
+    def run(self, job, fn, args):
+        """Run job function and update job status.
+
+        :param Job job: Job
+        :param callable fn: Job function
+        :param tuple args: Additional args for job function
+        """
+        record = job.record
+        job.update(status=self.RUNNING)
+        try:
+            result = fn(job, *args)
+            job.update(
+                status=self.SUCCESS, result=result,
+                finished_at=self.timestamp()
+            )
+        except Exception as e:
+            self.logger.exception(
+                "Job %s '%s' failed" % (record['kind'], record['id'])
+            )
+            job.log("Error: %s" % e)
+            job.update(
+                status=self.FAILED, error=str(e),
+                finished_at=self.timestamp()
+            )
+        finally:
+            with self.executors_lock:
+                self.jobs.pop(job.id, None)
+
+    def status(self, tenant, job_id):
+        """Return job status record or None if not found.
+
+        Interrupted jobs are returned as failed.
+
+        :param str tenant: Tenant ID
+        :param str job_id: Job ID
+        """
+        if not re.match(r'^[0-9a-f]{32}$', job_id or ''):
+            return None
+
+        try:
+            with open(self.path(tenant, "%s.json" % job_id)) as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if self.is_stale(record):
+            record['status'] = self.FAILED
+            record['error'] = "Job was interrupted"
+        return record
+
+    def latest(self, tenant, kind):
+        """Return status record of latest job of a kind or None.
+
+        :param str tenant: Tenant ID
+        :param str kind: Job kind
+        """
+        try:
+            with open(self.path(tenant, "%s.latest" % kind)) as f:
+                job_id = f.read().strip()
+        except OSError:
+            return None
+
+        return self.status(tenant, job_id)
+
+    def active_job(self, tenant, kind):
+        """Return status record of pending or running job of a kind or None.
+
+        :param str tenant: Tenant ID
+        :param str kind: Job kind
+        """
+        record = self.latest(tenant, kind)
+        if record is not None and \
+                record['status'] in [self.PENDING, self.RUNNING]:
+            return record
+        return None
+
+    def is_stale(self, record):
+        """Check if an unfinished job has been interrupted,
+        i.e. if its heartbeat lease has expired or its process is no longer
+        running.
+
+        :param obj record: Job status record
+        """
+        if record['status'] not in [self.PENDING, self.RUNNING]:
+            return False
+
+        if record.get('host') == self.hostname:
+            # NOTE: process IDs are only meaningful on the same host
+            if record['pid'] == os.getpid():
+                # job of this process, or of a previous process with the
+                # same process ID
+                with self.executors_lock:
+                    return record['id'] not in self.jobs
+            try:
+                os.kill(record['pid'], 0)
+            except ProcessLookupError:
+                return True
+            except PermissionError:
+                # process exists
+                pass
+
+        # NOTE: also check lease of running process, as process IDs
+        #       may be reused
+        try:
+            updated_at = datetime.fromisoformat(record['updated_at'])
+        except (KeyError, TypeError, ValueError):
+            return True
+        lease = timedelta(seconds=self.LEASE_TIMEOUT)
+        return datetime.utcnow() - updated_at > lease
+
+    def prune(self, tenant):
+        """Remove old job status records of a tenant, except for the latest
+        job of each kind.
+
+        :param str tenant: Tenant ID
+        """
+        tenant_dir = self.tenant_dir(tenant)
+        try:
+            filenames = os.listdir(tenant_dir)
+        except OSError:
+            return
+
+        # keep latest jobs
+        keep = set()
+        for filename in filenames:
+            if filename.endswith('.latest'):
+                try:
+                    with open(os.path.join(tenant_dir, filename)) as f:
+                        keep.add(f.read().strip())
+                except OSError:
+                    pass
+
+        max_mtime = time.time() - self.RECORD_MAX_AGE
+        for filename in filenames:
+            job_id, ext = os.path.splitext(filename)
+            if ext != '.json' or job_id in keep or \
+                    not re.match(r'^[0-9a-f]{32}$', job_id):
+                continue
+            path = os.path.join(tenant_dir, filename)
+            try:
+                if os.path.getmtime(path) < max_mtime:
+                    os.remove(path)
+            except OSError:
+                # e.g. already removed by another process
+                pass
+
+    def tenant_dir(self, tenant):
+        """Return jobs dir of tenant.
+
+        :param str tenant: Tenant ID
+        """
+        return os.path.join(self.jobs_path, re.sub(r'[^\w.-]', '_', tenant))
+
+    def path(self, tenant, filename):
+        """Return path of a file in jobs dir of tenant.
+
+        :param str tenant: Tenant ID
+        :param str filename: File name
+        """
+        return os.path.join(self.tenant_dir(tenant), filename)
+
+    def write_record(self, record):
+        """Store job status record.
+
+        :param obj record: Job status record
+        """
+        record['updated_at'] = self.timestamp()
+        self.write_file(
+            self.path(record['tenant'], "%s.json" % record['id']),
+            json.dumps(record)
+        )
+
+    def write_file(self, path, content):
+        """Atomically replace file content.
+
+        :param str path: File path
+        :param str content: File content
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = "%s.%s.tmp" % (path, uuid.uuid4().hex)
+        with open(tmp_path, 'w') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+    @contextmanager
+    def lock(self, tenant, kind):
+        """Exclusive lock for a job kind of a tenant across processes.
+
+        :param str tenant: Tenant ID
+        :param str kind: Job kind
+        """
+        path = self.path(tenant, "%s.lock" % kind)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    @staticmethod
+    def timestamp():
+        """Return current UTC time as ISO string."""
+        return datetime.utcnow().isoformat()
+
+
+class Job:
+    """Handle for updating a running background job"""
+
+    def __init__(self, runner, record):
+        """Constructor
+
+        :param JobRunner runner: Job runner
+        :param obj record: Job status record
+        """
+        self.runner = runner
+        self.record = record
+        # NOTE: records are also updated by the heartbeat thread
+        self.lock = Lock()
+
+    @property
+    def id(self):
+        return self.record['id']
+
+    @property
+    def tenant(self):
+        return self.record['tenant']
+
+    def log(self, msg):
+        """Add message to job log.
+
+        :param str msg: Log message
+        """
+        self.runner.logger.info(
+            "Job %s '%s': %s" % (self.record['kind'], self.id, msg)
+        )
+        with self.lock:
+            self.record['log'].append(
+                "%s %s" % (self.runner.timestamp(), msg)
+            )
+            self.runner.write_record(self.record)
+
+    def update(self, **fields):
+        """Update job status record and refresh its timestamp.
+
+        :param fields: Fields to update
+        """
+        with self.lock:
+            self.record.update(fields)
+            self.runner.write_record(self.record)
@@ -0,0 +1,190 @@
+import base64
+from datetime import date, datetime
+import hashlib
+import json
+
+from sqlalchemy import and_, or_
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import UnaryExpression
+
+
+class KeysetPagination:
+    """Keyset (seek) pagination for ORM queries
+
+    Select a page by filtering on the sort column values of the last (or
+    first) row of the adjacent page instead of using OFFSET, so deep pages
+    cost the same as the first page.
+
+    The sort columns are taken from the ORDER BY of the query, with the
+    primary key appended as tie-breaker. Cursors are opaque URL-safe strings.
+
+    NOTE: NULL values are assumed to sort as in PostgreSQL,
+          i.e. last in ascending and first in descending order.
+    """
+
+    def __init__(self, query, pkey_column):
+        """Constructor
+
+        :param Query query: Sorted ORM query
+        :param Column pkey_column: Primary key column of queried model
+        """
+        self.query = query
+
+        # sort columns as [(<column>, <ascending>)]
+        self.sort_columns = []
+        for criterion in query._order_by_clauses:
+            ascending = True
+            if isinstance(criterion, UnaryExpression):
+                if criterion.modifier is operators.desc_op:
+                    ascending = False
+                criterion = criterion.element
+            self.sort_columns.append((criterion, ascending))
+
+        if not any(
+            column.compare(pkey_column) for column, _ in self.sort_columns
+        ):
+            # add unique tie-breaker
+            self.sort_columns.append((pkey_column, True))
+
+        # key for detecting cursors of a different sort order
+        self.sort_key = hashlib.md5("|".join([
+            "%s %s" % (column, 'asc' if ascending else 'desc')
+            for column, ascending in self.sort_columns
+        ]).encode('utf-8')).hexdigest()[:8]
+
+    def page(self, cursor, per_page):
+        """Return rows of page for cursor as (rows, next_cursor, prev_cursor).
+
+        :param str cursor: Cursor from previous page or None for first page
+        :param int per_page: Number of rows per page
+        """
+        values, forward = self.decode_cursor(cursor)
+
+        # sort in reverse order for previous page
+        sort_columns = [
+            (column, ascending == forward)
+            for column, ascending in self.sort_columns
+        ]
+
+        columns = [column for column, _ in sort_columns]
+        query = self.query.order_by(None).order_by(*[
+            column if ascending else column.desc()
+            for column, ascending in sort_columns
+        ]).add_columns(*columns)
+        if values is not None:
+            query = query.filter(self.seek_filter(sort_columns, values))
+
+        # query one additional row to detect further pages
+        rows = query.limit(per_page + 1).all()
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        if not forward:
+            rows.reverse()
+
+        num_columns = len(columns)
+        resources = [row[0] for row in rows]
+        row_values = [list(row[-num_columns:]) for row in rows]
+
+        next_cursor = None
+        prev_cursor = None
+        if rows:
+            if (has_more if forward else values is not None):
+                next_cursor = self.encode_cursor(row_values[-1], True)
+            if (values is not None if forward else has_more):
+                prev_cursor = self.encode_cursor(row_values[0], False)
+
+        return resources, next_cursor, prev_cursor
+
+    def seek_filter(self, sort_columns, values):
+        """Return filter for rows after values in sort order.
+
+        :param list sort_columns: Sort columns as [(<column>, <ascending>)]
+        :param list values: Sort column values of last row
+        """
+        clauses = []
+        equal_clauses = []
+        for (column, ascending), value in zip(sort_columns, values):
+            after_clause = self.after_clause(column, ascending, value)
+            if after_clause is not None:
+                clauses.append(and_(*(equal_clauses + [after_clause])))
+            if value is None:
+                equal_clauses.append(column.is_(None))
+            else:
+                equal_clauses.append(column == value)
+
+        return or_(*clauses)
+
+    def after_clause(self, column, ascending, value):
+        """Return filter for column values after value, or None if empty.
+
+        :param Column column: Sort column
+        :param bool ascending: Whether column is sorted in ascending order
+        :param obj value: Column value of last row
+        """
+        if ascending:
+            # NULLS LAST
+            if value is None:
+                return None
+            return or_(column > value, column.is_(None))
+        else:
+            # NULLS FIRST
+            if value is None:
+                return column.isnot(None)
+            return column < value
+
+    def encode_cursor(self, values, forward):
+        """Return opaque cursor string for sort column values.
+
+        :param list values: Sort column values
+        :param bool forward: Whether cursor is for next or previous page
+        """
+        data = {
+            'k': self.sort_key,
+            'd': 'n' if forward else 'p',
+            'v': values
+        }
+        return base64.urlsafe_b64encode(
+            json.dumps(data, default=self.json_default).encode('utf-8')
+        ).decode('ascii')
+
+    def decode_cursor(self, cursor):
+        """Return cursor as (values, forward).
+
+        Return (None, True) for first page if cursor is blank or invalid.
+
+        :param str cursor: Cursor string
+        """
+        if not cursor:
+            return None, True
+
+        try:
+            data = json.loads(
+                base64.urlsafe_b64decode(cursor.encode('ascii')),
+                object_hook=self.json_object_hook
+            )
+            values = data['v']
+            if data['k'] != self.sort_key or \
+                    len(values) != len(self.sort_columns):
+                # cursor for different sort order
+                return None, True
+            return values, data['d'] != 'p'
+        except Exception:
+            return None, True
+
+    @staticmethod
+    def json_default(value):
+        """Encode datetime values in cursor."""
+        if isinstance(value, datetime):
+            return {'$dt': value.isoformat()}
+        elif isinstance(value, date):
+            return {'$d': value.isoformat()}
+        raise TypeError("Unsupported cursor value %r" % value)
+
+    @staticmethod
+    def json_object_hook(obj):
+        """Decode datetime values in cursor."""
+        if '$dt' in obj:
+            return datetime.fromisoformat(obj['$dt'])
+        elif '$d' in obj:
+            return date.fromisoformat(obj['$d'])
+        return obj
@@ -0,0 +1,350 @@
+from sqlalchemy import or_
+from sqlalchemy.orm import aliased
+
+
+class PermissionResolver:
+    """Effective permissions of a user, group or role on ConfigDB resources
+
+    The roles of a subject are
+        * user: direct user roles, roles of user groups and public role
+        * group: group roles and public role
+        * role: the role itself and public role
+
+    A resource is permitted if any of these roles has a permission on it.
+    If there are multiple permissions, the write flag of the permissions with
+    the highest priority applies.
+
+    A permitted resource is only effective if its whole ancestor chain is
+    accessible. As in the permission warnings of the permissions list,
+    permissions on parents are matched by resource type and name.
+    An ancestor is accessible if it is permitted, or if it is of
+    PUBLIC_DEFAULT_ALLOW_RESOURCES and there are no permissions on it at all,
+    and its own parent is accessible.
+    """
+
+    # subject types
+    SUBJECT_USER = 'user'
+    SUBJECT_GROUP = 'group'
+    SUBJECT_ROLE = 'role'
+
+    # name of public iam.role
+    PUBLIC_ROLE_NAME = 'public'
+
+    # resource types which are public by default if there are no
+    # permissions on them
+    PUBLIC_DEFAULT_ALLOW_RESOURCES = [
+        'attribute', 'layer', 'feature_info_layer', 'print_template'
+    ]
+
+    def __init__(self, config_models):
+        """Constructor
+
+        :param ConfigModels config_models: Helper for ORM models
+        """
+        self.Group = config_models.model('groups')
+        self.Permission = config_models.model('permissions')
+        self.Resource = config_models.model('resources')
+        self.ResourceType = config_models.model('resource_types')
+        self.Role = config_models.model('roles')
+        self.User = config_models.model('users')
+
+    def resolve(self, subject, id, session):
+        """Return roles and effective permissions of a subject as
+            {
+                'roles': [<role name>],
+                'resources': [
+                    {
+                        'id': <resource ID>,
+                        'type': <resource type>,
+                        'name': <resource name>,
+                        'parent_id': <parent resource ID or None>,
+                        'depth': <hierarchy depth>,
+                        'permitted': <True if any role has a permission>,
+                        'effective': <True if permission is effective>,
+                        'write': <write flag or None>,
+                        'priority': <highest priority or None>,
+                        'roles': [<names of roles with permission>],
+                        'reason': <reason if permission has no effect>
+                    }
+                ]
+            }
+
+        Resources are the permitted resources and their ancestors,
+        in depth-first order.
+
+        :param str subject: Subject type ('user', 'group' or 'role')
+        :param int id: ID of user, group or role
+        :param Session session: DB session
+        """
+        # roles of subject
+        roles_query = self.roles_query(subject, id, session)
+        roles = roles_query.order_by(self.Role.name).all()
+        role_ids = [role_id for role_id, _ in roles]
+
+        # permissions of roles
+        query = session.query(
+            self.Permission.resource_id, self.Permission.priority,
+            self.Permission.write, self.Role.name
+        ).join(self.Permission.role) \
+            .filter(self.Permission.role_id.in_(role_ids)) \
+            .order_by(self.Role.name)
+        permissions = {}
+        for resource_id, priority, write, role_name in query.all():
+            permission = permissions.setdefault(resource_id, {
+                'priority': None,
+                'write': False,
+                'roles': []
+            })
+            priority = priority or 0
+            if permission['priority'] is None or \
+                    priority > permission['priority']:
+                permission['priority'] = priority
+                permission['write'] = bool(write)
+            elif priority == permission['priority']:
+                permission['write'] = permission['write'] or bool(write)
+            if role_name not in permission['roles']:
+                permission['roles'].append(role_name)
+
+        if not permissions:
+            return {
+                'roles': [name for _, name in roles],
+                'resources': []
+            }
+
+        nodes = self.load_resources(role_ids, session)
+
+        # resources with permissions for roles as (<type>, <name>)
+        permitted_keys = set(
+            (nodes[resource_id]['type'], nodes[resource_id]['name'])
+            for resource_id in permissions if resource_id in nodes
+        )
+
+        for node in nodes.values():
+            permission = permissions.get(node['id'])
+            node['permitted'] = permission is not None
+            node['write'] = permission['write'] if permission else None
+            node['priority'] = permission['priority'] if permission else None
+            node['roles'] = permission['roles'] if permission else []
+
+        # resolve effective permissions
+        effective = {}
+        for node in nodes.values():
+            self.resolve_node(node, nodes, permitted_keys, effective)
+
+        return {
+            'roles': [name for _, name in roles],
+            'resources': self.sorted_tree(nodes)
+        }
+
+    def roles_query(self, subject, id, session):
+        """Return query for (<role ID>, <role name>) of a subject.
+
+        :param str subject: Subject type ('user', 'group' or 'role')
+        :param int id: ID of user, group or role
+        :param Session session: DB session
+        """
+        query = session.query(self.Role.id, self.Role.name)
+        conditions = [self.Role.name == self.PUBLIC_ROLE_NAME]
+
+        if subject == self.SUBJECT_USER:
+            # direct user roles
+            conditions.append(self.Role.id.in_(
+                session.query(self.Role.id)
+                .join(self.Role.users_collection)
+                .filter(self.User.id == id)
+            ))
+            # roles of user groups
+            conditions.append(self.Role.id.in_(
+                session.query(self.Role.id)
+                .join(self.Role.groups_collection)
+                .join(self.Group.users_collection)
+                .filter(self.User.id == id)
+            ))
+        elif subject == self.SUBJECT_GROUP:
+            # group roles
+            conditions.append(self.Role.id.in_(
+                session.query(self.Role.id)
+                .join(self.Role.groups_collection)
+                .filter(self.Group.id == id)
+            ))
+        elif subject == self.SUBJECT_ROLE:
+            conditions.append(self.Role.id == id)
+        else:
+            raise ValueError("Unknown subject type '%s'" % subject)
+
+        return query.filter(or_(*conditions))
+
+    def load_resources(self, role_ids, session):
+        """Load resources with permissions for roles and all their ancestors,
+        and return them as {<resource ID>: <node>}.
+
+        :param list(int) role_ids: Role IDs
+        :param Session session: DB session
+        """
+        # recursively collect ancestors of permitted resources
+        ancestors = session.query(
+            self.Resource.id, self.Resource.parent_id
+        ).filter(self.Resource.id.in_(
+            session.query(self.Permission.resource_id)
+            .filter(self.Permission.role_id.in_(role_ids))
+        )).cte('ancestors', recursive=True)
+        parent = aliased(self.Resource)
+        # NOTE: UNION stops on cyclic parents
+        ancestors = ancestors.union(
+            session.query(parent.id, parent.parent_id)
+            .filter(parent.id == ancestors.c.parent_id)
+        )
+
+        query = session.query(
+            self.Resource.id, self.Resource.parent_id, self.Resource.type,
+            self.Resource.name, self.ResourceType.list_order
+        ).outerjoin(self.Resource.resource_types) \
+            .filter(self.Resource.id.in_(session.query(ancestors.c.id)))
+
+        nodes = {}
+        for id, parent_id, type, name, list_order in query.all():
+            nodes[id] = {
+                'id': id,
+                'type': type,
+                'name': name,
+                'parent_id': parent_id,
+                'list_order': list_order,
+                'has_permissions': False
+            }
+
+        # mark parents with any permissions on resources with same type
+        # and name, regardless of role
+        parent_names = set(
+            nodes[node['parent_id']]['name'] for node in nodes.values()
+            if node['parent_id'] in nodes
+        )
+        if parent_names:
+            query = session.query(self.Resource.type, self.Resource.name) \
+                .join(
+                    self.Permission,
+                    self.Permission.resource_id == self.Resource.id
+                ) \
+                .filter(self.Resource.name.in_(parent_names)) \
+                .distinct()
+            keys = set(tuple(row) for row in query.all())
+            for node in nodes.values():
+                if (node['type'], node['name']) in keys:
+                    node['has_permissions'] = True
+
+        return nodes
+
+    def resolve_node(self, node, nodes, permitted_keys, effective):
+        """Resolve effective permission of a resource and its ancestors.
+
+        :param obj node: Resource node
+        :param obj nodes: Resource nodes by ID
+        :param set permitted_keys: (<type>, <name>) of permitted resources
+        :param obj effective: Resolved accessible flags by ID
+        """
+        # collect unresolved ancestors
+        chain = []
+        chain_ids = set()
+        current = node
+        while current is not None and current['id'] not in effective:
+            if current['id'] in chain_ids:
+                # cyclic parents
+                break
+            chain.append(current)
+            chain_ids.add(current['id'])
+            current = nodes.get(current['parent_id'])
+
+        # resolve from top
+        for current in reversed(chain):
+            parent = nodes.get(current['parent_id'])
+            parent_accessible = \
+                parent is None or effective.get(parent['id'], False)
+
+            result = False
+            reason = None
+            if (current['type'], current['name']) in permitted_keys:
+                result = parent_accessible
+            elif self.is_public_default(current):
+                result = parent_accessible
+
+            if not parent_accessible:
+                if (parent['type'], parent['name']) not in permitted_keys \
+                        and not self.is_public_default(parent):
+                    reason = "No permission on parent %s '%s'" % (
+                        parent['type'], parent['name']
+                    )
+                else:
+                    reason = "Parent %s '%s' is not accessible" % (
+                        parent['type'], parent['name']
+                    )
+
+            # accessible if permitted or public by default
+            effective[current['id']] = result
+            current['effective'] = result and current['permitted']
+            current['reason'] = reason if current['permitted'] else None
+
+    def is_public_default(self, node):
+        """Check if a resource is public by default, i.e. of
+        PUBLIC_DEFAULT_ALLOW_RESOURCES without any permissions.
+
+        :param obj node: Resource node
+        """
+        return node['type'] in self.PUBLIC_DEFAULT_ALLOW_RESOURCES and \
+            not node['has_permissions']
+
+    def sorted_tree(self, nodes):
+        """Return resource nodes in depth-first order.
+
+        :param obj nodes: Resource nodes by ID
+        """
+        def sort_key(node):
+            # NOTE: sort NULL list_order last, as in DB
+            return (
+                node['list_order'] is None, node['list_order'] or 0,
+                node['type'], node['name'], node['id']
+            )
+
+        children = {}
+        roots = []
+        for node in sorted(nodes.values(), key=sort_key):
+            if node['parent_id'] in nodes:
+                children.setdefault(node['parent_id'], []).append(node)
+            else:
+                roots.append(node)
+
+        # NOTE: add nodes with cyclic parents as roots after all other nodes
+        cyclic = [
+            node for node in sorted(nodes.values(), key=sort_key)
+            if node['parent_id'] in nodes
+        ]
+
+        items = []
+        visited = set()
+        stack = [(node, 0) for node in reversed(roots)]
+        while stack or cyclic:
+            if not stack:
+                node = cyclic.pop(0)
+                if node['id'] not in visited:
+                    stack.append((node, 0))
+                continue
+            node, depth = stack.pop()
+            if node['id'] in visited:
+                continue
+            visited.add(node['id'])
+
+            items.append({
+                'id': node['id'],
+                'type': node['type'],
+                'name': node['name'],
+                'parent_id': node['parent_id'],
+                'depth': depth,
+                'permitted': node['permitted'],
+                'effective': node['effective'],
+                'write': node['write'],
+                'priority': node['priority'],
+                'roles': node['roles'],
+                'reason': node['reason']
+            })
+            for child in reversed(children.get(node['id'], [])):
+                stack.append((child, depth + 1))
+
+        return items
@@ -4,7 +4,6 @@ import os
 from flask import flash, redirect, render_template, url_for
 from sqlalchemy.exc import IntegrityError, InternalError
 from sqlalchemy.ext.automap import automap_base
-from qwc_services_core.config_models import ConfigModels
 
 from plugins.alkis.forms import ALKISForm
 
@@ -45,9 +44,7 @@ class ALKISController():
         )
         self.app = app
         self.handler = handler
-        config_handler = handler()
-        db_engine = config_handler.db_engine()
-        self.config_models = ConfigModels(db_engine, config_handler.conn_str(), ["alkis"])
+        self.config_models = handler().config_models(["alkis"])
         self.resources = self.config_models.model('resources')
         self.alkis = self.config_models.model('alkis')
 
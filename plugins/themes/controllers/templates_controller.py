@@ -6,7 +6,6 @@ from wtforms import ValidationError
 from collections import OrderedDict
 from plugins.themes.forms import InfoTemplateForm
 from plugins.themes.utils import ThemeUtils
-from qwc_services_core.config_models import ConfigModels
 from sqlalchemy.exc import IntegrityError, InternalError
 
 class InfoTemplatesController():
@@ -24,8 +23,7 @@ class InfoTemplatesController():
         self.info_templates_path = current_handler.config().get("info_templates_path")
         self.ows_prefix = urlparse(current_handler.config().get("ows_prefix", "")).path.rstrip("/") + "/"
         self.default_qgis_server_url = current_handler.config().get("default_qgis_server_url")
-        db_engine = current_handler.db_engine()
-        self.config_models = ConfigModels(db_engine, current_handler.conn_str())
+        self.config_models = current_handler.config_models()
         self.resources = self.config_models.model('resources')
 
         app.add_url_rule(
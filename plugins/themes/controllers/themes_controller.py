@@ -3,7 +3,6 @@ from flask import abort, flash, redirect, render_template, request, url_for
 from wtforms import ValidationError
 from sqlalchemy.exc import IntegrityError, InternalError
 from urllib.parse import urlparse
-from qwc_services_core.config_models import ConfigModels
 
 from plugins.themes.forms import ThemeForm
 from plugins.themes.utils import ThemeUtils
@@ -119,9 +118,7 @@ class ThemesController:
         self.themesconfig = themesconfig
         self.template_dir = "plugins/themes/templates"
 
-        config_handler = handler()
-        db_engine = config_handler.db_engine()
-        self.config_models = ConfigModels(db_engine, config_handler.conn_str())
+        self.config_models = handler().config_models()
         self.resources = self.config_models.model('resources')
 
     def index(self):
@@ -0,0 +1,144 @@
+import re
+from threading import Lock
+
+
+class ProxyWhitelist:
+    """Compiled matcher for proxy URL whitelist
+
+    Patterns are RegExes matched at the start of the URL, as with re.match.
+
+    Plain prefix patterns without RegEx special characters (optionally
+    starting with '^' and ending with '.*' or '.*$') are checked with a
+    single str.startswith, and all other patterns are combined into a single
+    compiled RegEx.
+
+    Keeps counters of permitted (hits) and forbidden (misses) URLs.
+    """
+
+    # RegEx for patterns with backreferences, which can not be combined
+    BACKREFERENCE_RE = re.compile(r'\\[1-9]|\(\?P=')
+
+    def __init__(self, patterns, logger):
+        """Constructor
+
+        :param list(str) patterns: RegExes for whitelisted URLs
+        :param Logger logger: Application logger
+        """
+        self.logger = logger
+
+        prefixes = []
+        regexes = []
+        for pattern in patterns:
+            try:
+                re.compile(pattern)
+            except (re.error, TypeError) as e:
+                # NOTE: skip invalid patterns, so their URLs are forbidden
+                self.logger.error(
+                    "Invalid proxy URL whitelist pattern '%s': %s" %
+                    (pattern, e)
+                )
+                continue
+
+            prefix = self.plain_prefix(pattern)
+            if prefix is not None:
+                prefixes.append(prefix)
+            else:
+                regexes.append(pattern)
+
+        # plain prefixes for str.startswith
+        self.prefixes = tuple(prefixes)
+        # compiled RegExes
+        self.regexes = self.compile(regexes)
+
+        self.num_patterns = len(prefixes) + len(regexes)
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    def plain_prefix(self, pattern):
+        """Return literal prefix if pattern is a plain prefix, else None.
+
+        :param str pattern: RegEx pattern
+        """
+        if pattern.startswith('^'):
+            pattern = pattern[1:]
+        for suffix in ['.*$', '.*']:
+            if pattern.endswith(suffix) and not pattern.endswith(
+                '\\' + suffix
+            ):
+                pattern = pattern[:-len(suffix)]
+                break
+
+        prefix = []
+        escaped = False
+        for char in pattern:
+            if escaped:
+                if char.isalnum():
+                    # special sequence, e.g. '\d'
+                    return None
+                prefix.append(char)
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char in '.^$*+?{}[]|()':
+                return None
+            else:
+                prefix.append(char)
+        if escaped:
+            return None
+
+        return ''.join(prefix)
+
+    def compile(self, patterns):
+        """Return list of compiled RegExes, combined into a single RegEx
+        where possible.
+
+        :param list(str) patterns: Valid RegEx patterns
+        """
+        combinable = []
+        separate = []
+        for pattern in patterns:
+            if self.BACKREFERENCE_RE.search(pattern):
+                separate.append(pattern)
+            else:
+                combinable.append(pattern)
+
+        regexes = []
+        if combinable:
+            try:
+                regexes.append(re.compile('|'.join(
+                    '(?:%s)' % pattern for pattern in combinable
+                )))
+            except re.error:
+                # e.g. global inline flags not at the start of the RegEx
+                separate = combinable + separate
+        regexes += [re.compile(pattern) for pattern in separate]
+
+        return regexes
+
+    def match(self, url):
+        """Return whether URL is whitelisted and update counters.
+
+        :param str url: Target URL
+        """
+        permitted = url.startswith(self.prefixes) or any(
+            regex.match(url) for regex in self.regexes
+        )
+
+        with self.lock:
+            if permitted:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        return permitted
+
+    def stats(self):
+        """Return number of patterns and counters."""
+        with self.lock:
+            return {
+                'patterns': self.num_patterns,
+                'prefixes': len(self.prefixes),
+                'hits': self.hits,
+                'misses': self.misses
+            }
@@ -0,0 +1,164 @@
+from threading import Lock
+
+from sqlalchemy import or_
+from sqlalchemy.sql import text as sql_text
+
+
+class SearchBackend:
+    """Search filters for resources lists
+
+    Search modes:
+        'ilike': case-insensitive substring match
+        'trigram': substring or word similarity match using pg_trgm
+                   (falls back to 'ilike' if the extension is not installed)
+
+    Both modes can use the trigram GIN indexes in TRIGRAM_INDEXES.
+    """
+
+    SEARCH_ILIKE = 'ilike'
+    SEARCH_TRIGRAM = 'trigram'
+
+    # trigram GIN indexes for searchable ConfigDB columns
+    # as [(<index name>, <table>, <column>)]
+    TRIGRAM_INDEXES = [
+        ('users_name_trgm_idx', 'users', 'name'),
+        ('groups_name_trgm_idx', 'groups', 'name'),
+        ('roles_name_trgm_idx', 'roles', 'name'),
+        ('resources_name_trgm_idx', 'resources', 'name'),
+        ('registrable_groups_title_trgm_idx', 'registrable_groups', 'title')
+    ]
+
+    # ConfigDB schema
+    SCHEMA = 'qwc_config'
+
+    def __init__(self, logger):
+        """Constructor
+
+        :param Logger logger: Application logger
+        """
+        self.logger = logger
+
+        # lookup for pg_trgm availability as {<engine URL>: <bool>}
+        self.trigram_available = {}
+        self.lock = Lock()
+
+    def search_filter(self, column, search_text, search_mode, engine):
+        """Return filter for column matching search string.
+
+        :param Column column: Column to search
+        :param str search_text: Search string
+        :param str search_mode: Search mode ('ilike' or 'trigram')
+        :param Engine engine: DB engine for ConfigDB
+        """
+        ilike_filter = column.ilike("%%%s%%" % search_text)
+        if search_mode == self.SEARCH_TRIGRAM and \
+                self.has_trigram_extension(engine):
+            # also match similar words, e.g. with typos
+            return or_(ilike_filter, column.op('%>')(search_text))
+
+        return ilike_filter
+
+    def has_trigram_extension(self, engine):
+        """Check if pg_trgm extension is installed in DB.
+
+        :param Engine engine: DB engine
+        """
+        key = str(engine.url)
+        available = self.trigram_available.get(key)
+        if available is None:
+            with self.lock:
+                available = self.trigram_available.get(key)
+                if available is None:
+                    available = self.query_trigram_extension(engine)
+                    if not available:
+                        self.logger.warning(
+                            "Extension pg_trgm is not installed, "
+                            "using 'ilike' search instead"
+                        )
+                    self.trigram_available[key] = available
+
+        return available
+
+    @staticmethod
+    def query_trigram_extension(engine):
+        """Query whether pg_trgm extension is installed in DB.
+
+        :param Engine engine: DB engine
+        """
+        if engine.dialect.name != 'postgresql':
+            return False
+
+        with engine.connect() as conn:
+            sql = sql_text(
+                "SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm';"
+            )
+            return conn.execute(sql).first() is not None
+
+    def clear(self):
+        """Discard cached extension checks."""
+        with self.lock:
+            self.trigram_available = {}
+
+    @classmethod
+    def create_trigram_indexes(cls, engine, logger):
+        """Create pg_trgm extension and trigram GIN indexes in ConfigDB.
+
+        :param Engine engine: DB engine for ConfigDB
+        :param Logger logger: Logger
+        """
+        # NOTE: CREATE INDEX CONCURRENTLY cannot run inside a transaction
+        with engine.execution_options(
+            isolation_level='AUTOCOMMIT'
+        ).connect() as conn:
+            logger.info("Creating extension pg_trgm")
+            conn.execute(sql_text("CREATE EXTENSION IF NOT EXISTS pg_trgm;"))
+
+            for index_name, table, column in cls.TRIGRAM_INDEXES:
+                logger.info(
+                    "Creating index %s on %s.%s(%s)" %
+                    (index_name, cls.SCHEMA, table, column)
+                )
+                conn.execute(sql_text(
+                    'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{index}" '
+                    'ON "{schema}"."{table}" '
+                    'USING gin ("{column}" gin_trgm_ops);'.format(
+                        index=index_name, schema=cls.SCHEMA, table=table,
+                        column=column
+                    )
+                ))
+
+    @classmethod
+    def verify_trigram_indexes(cls, engine):
+        """Return list of problems with pg_trgm extension or trigram indexes
+        in ConfigDB (empty if ok).
+
+        :param Engine engine: DB engine for ConfigDB
+        """
+        problems = []
+        if not cls.query_trigram_extension(engine):
+            problems.append("Extension pg_trgm is not installed")
+
+        with engine.connect() as conn:
+            sql = sql_text("""
+                SELECT indexname, indexdef FROM pg_indexes
+                WHERE schemaname = :schema;
+            """)
+            index_defs = {
+                row.indexname: row.indexdef
+                for row in conn.execute(sql, {'schema': cls.SCHEMA})
+            }
+
+        for index_name, table, column in cls.TRIGRAM_INDEXES:
+            index_def = index_defs.get(index_name)
+            if index_def is None:
+                problems.append(
+                    "Missing index %s on %s.%s(%s)" %
+                    (index_name, cls.SCHEMA, table, column)
+                )
+            elif 'gin_trgm_ops' not in index_def:
+                problems.append(
+                    "Index %s is not a trigram index: %s" %
+                    (index_name, index_def)
+                )
+
+        return problems
@@ -1,18 +1,21 @@
 from datetime import datetime
 import logging
 import os
-import re
 import requests
 from shutil import copyfile
+import tempfile
 import time
 import urllib.parse
 import importlib
 
-from flask import abort, Flask, json, redirect, render_template, request, \
-    Response, stream_with_context, jsonify, send_from_directory
+import click
+from flask import abort, Flask, g, has_request_context, json, redirect, \
+    render_template, render_template_string, request, Response, \
+    stream_with_context, jsonify, send_from_directory
 from flask_bootstrap import Bootstrap
 from flask_wtf.csrf import CSRFProtect
 from flask_mail import Mail
+from jinja2 import pass_context
 
 from qwc_services_core.auth import auth_manager, optional_auth, get_identity
 from qwc_services_core.tenant_handler import TenantHandler, \
@@ -20,6 +23,12 @@ from qwc_services_core.tenant_handler import TenantHandler, \
 from qwc_services_core.runtime_config import RuntimeConfig
 from qwc_services_core.database import DatabaseEngine
 from access_control import AccessControl
+from config_models_registry import ConfigModelsRegistry
+from http_registry import HttpRegistry
+from job_runner import JobRunner
+from user_import import UserImport
+from search_backend import SearchBackend
+from translation_table import TranslationTable
 from controllers import UsersController, GroupsController, RolesController, \
     ResourcesController, PermissionsController, RegistrableGroupsController, \
     RegistrationRequestsController
@@ -27,6 +36,9 @@ from controllers import UsersController, GroupsController, RolesController, \
 
 AUTH_PATH = os.environ.get('AUTH_PATH', '/auth')
 SKIP_LOGIN = os.environ.get('SKIP_LOGIN', False)
+JOBS_PATH = os.environ.get(
+    'JOBS_PATH', os.path.join(tempfile.gettempdir(), 'qwc-admin-gui-jobs')
+)
 
 # Flask application
 app = Flask(__name__, template_folder='.')
@@ -72,22 +84,30 @@ mail = Mail(app)
 
 # Load translation strings
 DEFAULT_LOCALE = os.environ.get('DEFAULT_LOCALE', 'en')
-translations = {}
-try:
-    locale = DEFAULT_LOCALE
-    path = os.path.join(app.root_path, 'translations/%s.json' % locale)
-    with open(path, 'r') as f:
-        translations[locale] = json.load(f)
-except Exception as e:
-    app.logger.error(
-        "Failed to load translation strings for locale '%s' from %s\n%s"
-        % (locale, path, e)
-    )
+app.config['DEFAULT_LOCALE'] = DEFAULT_LOCALE
+translation_table = TranslationTable(
+    os.path.join(app.root_path, 'translations'), DEFAULT_LOCALE, app.logger
+)
+
+
+def request_locale():
+    """Return locale for current request.
+
+    The locale is selected from the Accept-Language header among the
+    available translations (default: DEFAULT_LOCALE).
+    """
+    if not has_request_context():
+        return DEFAULT_LOCALE
+
+    if 'locale' not in g:
+        g.locale = request.accept_languages.best_match(
+            translation_table.available_locales, default=DEFAULT_LOCALE
+        )
+    return g.locale
 
 
 # Setup translation helper
-@app.template_filter('i18n')
-def i18n(value, locale=DEFAULT_LOCALE):
+def i18n(value, locale=None):
     """Lookup string in translations.
 
     Usage:
@@ -95,34 +115,50 @@ def i18n(value, locale=DEFAULT_LOCALE):
         Jinja2 filter for templates: 'example.path_to.string' | i18n
 
     :param str value: Dot-separated path to translation string
-    :param str locale: Override locale (optional)
+    :param str locale: Override locale (optional, default: request locale)
     """
-    # traverse translations dict for locale
-    parts = value.split('.')
-    lookup = translations.get(locale, {})
-    for part in parts:
-        if isinstance(lookup, dict):
-            # get next lookup level
-            lookup = lookup.get(part)
-        else:
-            # lookup level too deep
-            lookup = None
-        if lookup is None:
-            # return input value if not found
-            lookup = value
-            break
+    if locale is None:
+        locale = request_locale()
+
+    return translation_table.translate(value, locale)
 
-    return lookup
+
+@app.template_filter('i18n')
+@pass_context
+def i18n_filter(context, value, locale=None):
+    """Jinja2 filter for i18n, using the locale from the template context.
+
+    :param Context context: Template context
+    :param str value: Dot-separated path to translation string
+    :param str locale: Override locale (optional, default: request locale)
+    """
+    if locale is None:
+        locale = context.get('i18n_locale', DEFAULT_LOCALE)
+
+    return translation_table.translate(value, locale)
+
+
+@app.context_processor
+def inject_locale():
+    """Add request locale to template context, so it is only looked up
+    once per template.
+    """
+    return {'i18n_locale': request_locale()}
 
 
 tenant_handler = TenantHandler(app.logger)
 db_engine = DatabaseEngine()
+config_models_registry = ConfigModelsRegistry(db_engine, app.logger)
+http_registry = HttpRegistry(app.logger)
 
 
 class TenantConfigHandler:
-    def __init__(self, tenant, db_engine, logger):
+    def __init__(self, tenant, db_engine, config_models_registry,
+                 http_registry, logger):
         self.tenant = tenant
         self._db_engine = db_engine
+        self._config_models_registry = config_models_registry
+        self._http_registry = http_registry
         self.logger = logger
 
         config_handler = RuntimeConfig("adminGui", logger)
@@ -134,10 +170,36 @@ class TenantConfigHandler:
     def db_engine(self):
         return self._db_engine
 
+    def http_session(self):
+        """Return shared pooled HTTP session of this tenant for requests to
+        internal services."""
+        return self._http_registry.http_session(
+            self.tenant, self._config.get('proxy_pool_maxsize', 10)
+        )
+
+    def proxy_whitelist(self):
+        """Return shared compiled proxy URL whitelist of this tenant."""
+        return self._http_registry.proxy_whitelist(
+            self.tenant, self._config.get('proxy_url_whitelist', [])
+        )
+
     def conn_str(self):
         return self._config.get(
             'db_url', 'postgresql:///?service=qwc_configdb')
 
+    def config_models(self, extra_tables=[]):
+        """Return shared ConfigModels for this tenant.
+
+        :param list[str] extra_tables: Additional tables to reflect
+        """
+        return self._config_models_registry.config_models(
+            self.tenant, self.conn_str(), extra_tables
+        )
+
+    def invalidate_config_models(self):
+        """Discard shared ConfigModels for this tenant."""
+        self._config_models_registry.invalidate(self.tenant)
+
 
 def handler():
     tenant = tenant_handler.tenant()
@@ -145,7 +207,9 @@ def handler():
     if handler is None:
         handler = tenant_handler.register_handler(
             'handler', tenant,
-            TenantConfigHandler(tenant, db_engine, app.logger))
+            TenantConfigHandler(
+                tenant, db_engine, config_models_registry, http_registry,
+                app.logger))
     return handler
 
 
@@ -158,11 +222,20 @@ def auth_path_prefix():
     return app.session_interface.tenant_path_prefix().rstrip("/") + "/" + AUTH_PATH.lstrip("/")
 
 
+# runner for background jobs
+# NOTE: separate workers for each job kind (unused resources report,
+#       config generation, Solr index update), shared by all tenants
+job_runner = JobRunner(JOBS_PATH, app.logger, max_workers=2)
+
+# job kinds
+GENERATE_CONFIGS_JOB = 'generate_configs'
+UPDATE_SOLR_INDEX_JOB = 'update_solr_index'
+
 # create controllers (including their routes)
-UsersController(app, handler)
+UsersController(app, handler, job_runner)
 GroupsController(app, handler)
 RolesController(app, handler)
-ResourcesController(app, handler)
+ResourcesController(app, handler, job_runner)
 PermissionsController(app, handler)
 if app.config.get('QWC_GROUP_REGISTRATION_ENABLED'):
     RegistrableGroupsController(app, handler)
@@ -171,10 +244,57 @@ if app.config.get('QWC_GROUP_REGISTRATION_ENABLED'):
 access_control = AccessControl(handler, app.logger)
 
 
+# route classes for access control
+ROUTE_CLASS_PUBLIC_PROBE = 'public_probe'
+ROUTE_CLASS_STATIC_ASSET = 'static_asset'
+ROUTE_CLASS_ADMIN_PAGE = 'admin_page'
+ROUTE_CLASS_ADMIN_API = 'admin_api'
+
+# route classes for endpoints (default: ROUTE_CLASS_ADMIN_PAGE)
+ROUTE_CLASSES = {
+    'ready': ROUTE_CLASS_PUBLIC_PROBE,
+    'healthz': ROUTE_CLASS_PUBLIC_PROBE,
+    'static': ROUTE_CLASS_STATIC_ASSET,
+    'bootstrap.static': ROUTE_CLASS_STATIC_ASSET,
+    'plugin_static': ROUTE_CLASS_STATIC_ASSET,
+    'generate_configs': ROUTE_CLASS_ADMIN_API,
+    'generate_configs_status': ROUTE_CLASS_ADMIN_API,
+    'update_solr_index': ROUTE_CLASS_ADMIN_API,
+    'update_solr_index_status': ROUTE_CLASS_ADMIN_API,
+    'proxy': ROUTE_CLASS_ADMIN_API,
+    'proxy_whitelist_stats': ROUTE_CLASS_ADMIN_API,
+    'unused_report_status_resource': ROUTE_CLASS_ADMIN_API,
+    'import_status_user': ROUTE_CLASS_ADMIN_API,
+    'lookup_resource': ROUTE_CLASS_ADMIN_API,
+    'lookup_user': ROUTE_CLASS_ADMIN_API,
+    'lookup_group': ROUTE_CLASS_ADMIN_API,
+    'lookup_role': ROUTE_CLASS_ADMIN_API,
+    'effective_permissions_json_user': ROUTE_CLASS_ADMIN_API,
+    'effective_permissions_json_group': ROUTE_CLASS_ADMIN_API,
+    'effective_permissions_json_role': ROUTE_CLASS_ADMIN_API,
+    'matrix_rows_permission': ROUTE_CLASS_ADMIN_API,
+    'update_matrix_permission': ROUTE_CLASS_ADMIN_API
+}
+
+# route classes accessible without identity and admin role check
+PUBLIC_ROUTE_CLASSES = [ROUTE_CLASS_PUBLIC_PROBE, ROUTE_CLASS_STATIC_ASSET]
+
+
+def route_class(endpoint):
+    """Return route class for an endpoint.
+
+    :param str endpoint: Flask endpoint name
+    """
+    return ROUTE_CLASSES.get(endpoint, ROUTE_CLASS_ADMIN_PAGE)
+
+
 plugins_loaded = False
 @app.before_request
 def load_plugins():
     global plugins_loaded
+    if route_class(request.endpoint) in PUBLIC_ROUTE_CLASSES:
+        # defer loading plugins until first admin request
+        return
     if not plugins_loaded:
         # HACK to work around
         #     The setup method 'add_url_rule' can no longer be called on the application.
@@ -196,8 +316,20 @@ def load_plugins():
 
 
 @app.before_request
-@optional_auth
 def assert_admin_role():
+    if route_class(request.endpoint) in PUBLIC_ROUTE_CLASSES:
+        # skip identity and DB lookups for probes and static assets
+        return None
+
+    return check_admin_role(route_class(request.endpoint))
+
+
+@optional_auth
+def check_admin_role(current_route_class):
+    """Check that the current identity has the admin role.
+
+    :param str current_route_class: Route class of request endpoint
+    """
     identity = get_identity()
     app.logger.debug("Access with identity %s" % identity)
     if not access_control.is_admin(identity):
@@ -207,6 +339,19 @@ def assert_admin_role():
         else:
             app.logger.info("Access denied for user %s" % identity)
             prefix = auth_path_prefix()
+            if current_route_class == ROUTE_CLASS_ADMIN_API:
+                # return JSON error with login or logout URL for AJAX
+                # requests, which redirect the page (see base.html)
+                if identity:
+                    return jsonify({
+                        'error': "Admin role required",
+                        'redirect': prefix + '/logout'
+                    }), 403
+                else:
+                    return jsonify({
+                        'error': "Login required",
+                        'redirect': prefix + '/login'
+                    }), 401
             if identity:
                 # Already logged in, but not with admin role
                 return redirect(prefix + '/logout?url=%s' % request.url)
@@ -231,12 +376,25 @@ def home():
         "http://qwc-config-service:9090"
     ) else False
     solr_index_update_enabled = True if config.get('solr_service_url', '') else False
+    # resume polling of active background jobs
+    active_generate_configs_job = None
+    if have_config_generator:
+        active_generate_configs_job = job_runner.active_job(
+            handler().tenant, GENERATE_CONFIGS_JOB
+        )
+    active_update_solr_index_job = None
+    if solr_index_update_enabled:
+        active_update_solr_index_job = job_runner.active_job(
+            handler().tenant, UPDATE_SOLR_INDEX_JOB
+        )
     return render_template(
         'templates/home.html',
         admin_gui_title=admin_gui_title,
         admin_gui_subtitle=admin_gui_subtitle,
         have_config_generator=have_config_generator,
-        solr_index_update_enabled=solr_index_update_enabled
+        solr_index_update_enabled=solr_index_update_enabled,
+        generate_configs_job=active_generate_configs_job,
+        update_solr_index_job=active_update_solr_index_job
     )
 
 
@@ -249,36 +407,100 @@ def plugin_static(plugin, filename):
 
 @app.route('/generate_configs', methods=['POST'])
 def generate_configs():
-    """ Generate service configurations """
+    """Start background job for generating service configurations.
 
+    Returns the job status record as JSON. If a job is already active for
+    the tenant, its record is returned instead of starting another job.
+    """
     current_handler = handler()
-    config_generator_url = current_handler.config().get(
+    config = current_handler.config()
+    config_generator_url = config.get(
         "config_generator_service_url",
         "http://qwc-config-service:9090")
+    timeout = config.get("generate_configs_timeout", 1800)
 
+    record, started = job_runner.submit(
+        current_handler.tenant, GENERATE_CONFIGS_JOB, generate_configs_job,
+        config_generator_url, timeout
+    )
+    return jsonify(dict(record, started=started)), 202
+
+
+def generate_configs_job(job, config_generator_url, timeout):
+    """Call ConfigGenerator to generate service configurations.
+
+    NOTE: runs in background thread without request context
+
+    :param Job job: Background job
+    :param str config_generator_url: ConfigGenerator service URL
+    :param int timeout: Timeout in seconds for ConfigGenerator request
+    """
+    job.log("Generating service configurations")
     response = requests.post(
         urllib.parse.urljoin(
             config_generator_url,
-            "generate_configs?tenant=" + current_handler.tenant))
+            "generate_configs?tenant=" + job.tenant),
+        timeout=timeout)
+
+    if response.status_code != 200:
+        raise Exception(
+            "ConfigGenerator returned status %d:\n%s" %
+            (response.status_code, response.text)
+        )
+
+    job.log("Service configurations generated")
+    return {'output': response.text}
 
-    return (response.text, response.status_code)
+
+@app.route('/generate_configs/status', methods=['GET'])
+def generate_configs_status():
+    """Return status of a config generation job as JSON.
+
+    Parameter:
+        job_id: Optional job ID (default: latest job)
+    """
+    return job_status(GENERATE_CONFIGS_JOB)
 
 
 @app.route('/update_solr_index', methods=['POST'])
 def update_solr_index():
-    """Update Solr index for a tenant."""
-    config = handler().config()
-    tenant = handler().tenant
+    """Start background job for updating the Solr index of a tenant.
+
+    Returns the job status record as JSON. If a job is already active for
+    the tenant, its record is returned instead of starting another job.
+    """
+    current_handler = handler()
+    config = current_handler.config()
 
     solr_service_url = config.get('solr_service_url', '')
     if not solr_service_url:
         abort(404, "Missing config for 'solr_service_url'")
 
     # get DataImportHandler for tenant
-    solr_tenant_dih = config.get('solr_tenant_dih', '')
-    if not solr_tenant_dih:
+    if not config.get('solr_tenant_dih', ''):
         abort(500, "Missing config for 'solr_tenant_dih'")
 
+    record, started = job_runner.submit(
+        current_handler.tenant, UPDATE_SOLR_INDEX_JOB, update_solr_index_job,
+        config, current_handler.http_session()
+    )
+    return jsonify(dict(record, started=started)), 202
+
+
+def update_solr_index_job(job, config, http_session):
+    """Clear Solr index of tenant, wait until cleared, run full import and
+    wait until it is finished.
+
+    NOTE: runs in background thread without request context
+
+    :param Job job: Background job
+    :param obj config: Tenant config
+    :param Session http_session: Pooled HTTP session
+    """
+    tenant = job.tenant
+    solr_service_url = config.get('solr_service_url', '')
+    solr_tenant_dih = config.get('solr_tenant_dih', '')
+
     # get optional source DataImportHandler config file for tenant
     solr_tenant_dih_config_file = config.get('solr_tenant_dih_config_file', '')
     # get optional target path for Solr configs
@@ -288,7 +510,7 @@ def update_solr_index():
         try:
             # copy tenant config file to Solr configs dir
             file_name = os.path.basename(solr_tenant_dih_config_file)
-            app.logger.info(
+            job.log(
                 "Updating Solr config file '%s' for tenant '%s'" %
                 (file_name, tenant)
             )
@@ -297,160 +519,404 @@ def update_solr_index():
                 os.path.join(solr_config_path, file_name)
             )
         except Exception as e:
-            msg = "Could not copy Solr tenant config:\n%s" % e
-            app.logger.error(msg)
-            abort(500, msg)
+            raise Exception("Could not copy Solr tenant config:\n%s" % e)
 
-    try:
-        timeout = config.get('proxy_timeout', 60)
-
-        # clear search index for tenant
-        url = urllib.parse.urljoin(solr_service_url, "update?commitWithin=1000")
-        data = {'delete': {'query': "tenant:%s" % tenant}}
-        headers = {'content-type': 'application/json'}
-        app.logger.info("Clearing Solr search index for tenant '%s'" % tenant)
-        response = requests.post(
-            url, data=json.dumps(data), headers=headers, timeout=timeout
-        )
-        if response.status_code != 200:
-            abort(
-                response.status_code,
-                "Could not clear Solr search index:\n%s" % response.text
-            )
+    timeout = config.get('proxy_timeout', 60)
 
-        # wait until index has been cleared
-        solr_update_check_max_retries = config.get(
-            'solr_update_check_max_retries', 10
+    # clear search index for tenant
+    url = urllib.parse.urljoin(solr_service_url, "update?commitWithin=1000")
+    data = {'delete': {'query': "tenant:%s" % tenant}}
+    headers = {'content-type': 'application/json'}
+    job.log("Clearing Solr search index for tenant '%s'" % tenant)
+    response = http_session.post(
+        url, data=json.dumps(data), headers=headers, timeout=timeout
+    )
+    if response.status_code != 200:
+        raise Exception(
+            "Could not clear Solr search index:\n%s" % response.text
         )
-        solr_update_check_wait = config.get('solr_update_check_wait', 5)
-        num_found = -1
-        for i in range(solr_update_check_max_retries):
-            time.sleep(solr_update_check_wait)
-
-            # send dummy query with tenant filter
-            url = urllib.parse.urljoin(
-                solr_service_url,
-                "select?omitHeader=true&q=tenant:%s&rows=0" % tenant
-            )
-            app.logger.info("Checking result count for tenant '%s'" % tenant)
-            response = requests.get(url, timeout=timeout)
-
-            # check if result count is 0
-            num_found = json.loads(response.text) \
-                .get('response', {}).get('numFound', -1)
-            if num_found == 0:
-                break
-
-        if num_found != 0:
-            abort(
-                500,
-                "Solr search index could not be cleared (%s results)" %
-                num_found
-            )
 
-        # update search index for tenant
+    # wait until index has been cleared
+    solr_update_check_max_retries = config.get(
+        'solr_update_check_max_retries', 10
+    )
+    solr_update_check_wait = config.get('solr_update_check_wait', 5)
+    num_found = -1
+    for i in range(solr_update_check_max_retries):
+        time.sleep(solr_update_check_wait)
+
+        # send dummy query with tenant filter
         url = urllib.parse.urljoin(
             solr_service_url,
-            "%s?command=full-import&clean=false" % solr_tenant_dih
+            "select?omitHeader=true&q=tenant:%s&rows=0" % tenant
         )
-        app.logger.info(
-            "Updating Solr search index for '%s' for tenant '%s'" %
-            (solr_tenant_dih, tenant)
+        job.log("Checking result count for tenant '%s'" % tenant)
+        response = http_session.get(url, timeout=timeout)
+
+        # check if result count is 0
+        num_found = json.loads(response.text) \
+            .get('response', {}).get('numFound', -1)
+        if num_found == 0:
+            break
+
+    if num_found != 0:
+        raise Exception(
+            "Solr search index could not be cleared (%s results)" % num_found
+        )
+
+    # update search index for tenant
+    url = urllib.parse.urljoin(
+        solr_service_url,
+        "%s?command=full-import&clean=false" % solr_tenant_dih
+    )
+    job.log(
+        "Updating Solr search index for '%s' for tenant '%s'" %
+        (solr_tenant_dih, tenant)
+    )
+    response = http_session.get(url, timeout=timeout)
+    if response.status_code != 200:
+        raise Exception(
+            "Could not create Solr search index:\n%s" % response.text
         )
-        response = requests.get(url, timeout=timeout)
-        if response.status_code != 200:
-            abort(
-                response.status_code,
-                "Could not create Solr search index:\n%s" % response.text
-            )
 
-        # wait until index has been updated
-        for i in range(solr_update_check_max_retries):
-            time.sleep(solr_update_check_wait)
+    # wait until index has been updated
+    for i in range(solr_update_check_max_retries):
+        time.sleep(solr_update_check_wait)
 
-            # check status for tenant
-            url = urllib.parse.urljoin(
-                solr_service_url,
-                "%s?command=status" % solr_tenant_dih
+        # check status for tenant
+        url = urllib.parse.urljoin(
+            solr_service_url,
+            "%s?command=status" % solr_tenant_dih
+        )
+        job.log("Checking Solr status for tenant '%s'" % tenant)
+        response = http_session.get(url, timeout=timeout)
+
+        status_response = json.loads(response.text)
+        status = status_response.get('status')
+        if status == 'idle':
+            import_failed = 'Full Import failed' in status_response.get(
+                'statusMessages', {}
             )
-            app.logger.info("Checking Solr status for tenant '%s'" % tenant)
-            response = requests.get(url, timeout=timeout)
-
-            status_response = json.loads(response.text)
-            status = status_response.get('status')
-            if status == 'idle':
-                import_failed = 'Full Import failed' in status_response.get(
-                    'statusMessages', {}
+            if not import_failed:
+                msg = (
+                    "Solr search index for tenant '%s' "
+                    "has been successfully updated" % tenant
                 )
-                if not import_failed:
-                    msg = (
-                        "Solr search index for tenant '%s' "
-                        "has been successfully updated" % tenant
-                    )
-                    app.logger.info(msg)
-                    return (msg)
-                else:
-                    abort(
-                        500,
-                        "Solr full import failed. Check Solr logs for errors."
-                    )
+                job.log(msg)
+                return {'output': msg}
+            else:
+                raise Exception(
+                    "Solr full import failed. Check Solr logs for errors."
+                )
+
+    # if still updating
+    msg = "Started Solr search index update for tenant '%s'" % tenant
+    job.log(msg)
+    return {'output': msg}
+
+
+@app.route('/update_solr_index/status', methods=['GET'])
+def update_solr_index_status():
+    """Return status of a Solr index update job as JSON.
+
+    Parameter:
+        job_id: Optional job ID (default: latest job)
+    """
+    return job_status(UPDATE_SOLR_INDEX_JOB)
+
+
+def job_status(kind):
+    """Return status of a background job of the tenant as JSON.
+
+    Parameter:
+        job_id: Optional job ID (default: latest job)
+
+    :param str kind: Job kind
+    """
+    tenant = handler().tenant
+    job_id = request.args.get('job_id')
+    if job_id:
+        record = job_runner.status(tenant, job_id)
+        if record is not None and record['kind'] != kind:
+            record = None
+    else:
+        record = job_runner.latest(tenant, kind)
+    if record is None:
+        abort(404)
+
+    return jsonify(record)
+
+
+# request headers forwarded to proxied services
+PROXY_REQUEST_HEADERS = [
+    'Accept', 'Accept-Language', 'Content-Encoding', 'Content-Type',
+    'If-Modified-Since', 'If-None-Match', 'Range'
+]
+# response headers returned from proxied services
+PROXY_RESPONSE_HEADERS = [
+    'Accept-Ranges', 'Cache-Control', 'Content-Disposition',
+    'Content-Encoding', 'Content-Length', 'Content-Range', 'Content-Type',
+    'ETag', 'Expires', 'Last-Modified', 'Vary'
+]
+# default chunk size in bytes for streaming proxy requests and responses
+PROXY_DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+class ProxyRequestBody:
+    """File-like wrapper for streaming a request body of known length to a
+    proxied service without buffering.
+    """
+
+    def __init__(self, stream, length, chunk_size):
+        """Constructor
 
-        # if still updating
-        return ("Started Solr search index update for tenant '%s'" % tenant)
-    except Exception as e:
-        msg = "Could not update Solr search index:\n%s" % e
-        app.logger.error(msg)
-        abort(500, msg)
+        :param file stream: Input stream of request
+        :param int length: Content length of request body
+        :param int chunk_size: Size of read chunks
+        """
+        self.stream = stream
+        self.length = length
+        self.chunk_size = chunk_size
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size=-1):
+        # NOTE: read larger chunks than the default block size of http.client
+        return self.stream.read(max(size, self.chunk_size))
 
 
 @app.route("/proxy", methods=['GET', 'POST', 'PUT', 'DELETE'])
 def proxy():
     """Proxy for calling whitelisted internal services.
 
+    Request and response bodies are streamed in chunks over pooled
+    keep-alive connections.
+
     Parameter:
         url: Target URL
     """
     url = request.args.get('url')
     current_handler = handler()
+    config = current_handler.config()
 
-    PROXY_URL_WHITELIST = current_handler.config().get(
-        "proxy_url_whitelist", [])
+    if not url:
+        abort(400, "Missing parameter 'url'")
 
     # check if URL is in whitelist
-    url_permitted = False
-    for expr in PROXY_URL_WHITELIST:
-        if re.match(expr, url):
-            url_permitted = True
-            break
-    if not url_permitted:
+    if not current_handler.proxy_whitelist().match(url):
         app.logger.info("Proxy forbidden for URL '%s'" % url)
         abort(403)
 
     # settings for proxy to internal services
-    PROXY_TIMEOUT = current_handler.config().get(
-        "proxy_timeout", 60)
+    PROXY_TIMEOUT = config.get("proxy_timeout", 60)
+    chunk_size = config.get("proxy_chunk_size", PROXY_DEFAULT_CHUNK_SIZE)
+    upload_chunk_size = config.get(
+        "proxy_upload_chunk_size", PROXY_DEFAULT_CHUNK_SIZE
+    )
+
+    headers = {
+        name: request.headers[name] for name in PROXY_REQUEST_HEADERS
+        if name in request.headers
+    }
+    # NOTE: do not request compressed content the client cannot decode
+    headers['Accept-Encoding'] = request.headers.get(
+        'Accept-Encoding', 'identity'
+    )
+
+    # stream request body
+    data = None
+    if request.method in ['POST', 'PUT']:
+        if request.content_length is not None:
+            data = ProxyRequestBody(
+                request.stream, request.content_length, upload_chunk_size
+            )
+        else:
+            # forward with chunked transfer encoding
+            data = iter(
+                lambda: request.stream.read(upload_chunk_size), b''
+            )
 
     # forward request
-    if request.method == 'GET':
-        res = requests.get(url, stream=True, timeout=PROXY_TIMEOUT)
-    elif request.method == 'POST':
-        headers = {'content-type': request.headers['content-type']}
-        res = requests.post(url, stream=True, timeout=PROXY_TIMEOUT,
-                            data=request.get_data(), headers=headers)
-    elif request.method == 'PUT':
-        headers = {'content-type': request.headers['content-type']}
-        res = requests.put(url, stream=True, timeout=PROXY_TIMEOUT,
-                           data=request.get_data(), headers=headers)
-    elif request.method == 'DELETE':
-        res = requests.delete(url, stream=True, timeout=PROXY_TIMEOUT)
-    else:
-        raise "Invalid operation"
-    response = Response(stream_with_context(res.iter_content(chunk_size=1024)),
-                        status=res.status_code)
-    response.headers['content-type'] = res.headers['content-type']
+    try:
+        res = current_handler.http_session().request(
+            request.method, url, data=data, headers=headers, stream=True,
+            timeout=PROXY_TIMEOUT
+        )
+    except requests.exceptions.RequestException as e:
+        app.logger.error("Proxy request to '%s' failed: %s" % (url, e))
+        abort(502)
+
+    def generate():
+        try:
+            # NOTE: pass through content as is, e.g. still gzip encoded
+            for chunk in res.raw.stream(chunk_size, decode_content=False):
+                yield chunk
+        finally:
+            # release connection to pool
+            res.close()
+
+    response = Response(
+        stream_with_context(generate()), status=res.status_code
+    )
+    for name in PROXY_RESPONSE_HEADERS:
+        if name in res.headers:
+            response.headers[name] = res.headers[name]
     return response
 
 
+@app.route("/proxy/whitelist_stats", methods=['GET'])
+def proxy_whitelist_stats():
+    """Return proxy URL whitelist counters of tenant as JSON."""
+    return jsonify(handler().proxy_whitelist().stats())
+
+
+@app.cli.command('search-indexes')
+@click.option(
+    '--tenant', default=None,
+    help="Tenant ID (default: $QWC_TENANT or 'default')"
+)
+@click.option(
+    '--check', is_flag=True,
+    help="Only verify pg_trgm extension and indexes"
+)
+def search_indexes(tenant, check):
+    """Create and verify trigram indexes for search in ConfigDB."""
+    tenant = tenant or tenant_handler.tenant_name or 'default'
+    config_handler = TenantConfigHandler(
+        tenant, db_engine, config_models_registry, http_registry, app.logger
+    )
+    engine = db_engine.db_engine(config_handler.conn_str())
+
+    if not check:
+        SearchBackend.create_trigram_indexes(engine, app.logger)
+
+    problems = SearchBackend.verify_trigram_indexes(engine)
+    for problem in problems:
+        click.echo(problem, err=True)
+    if problems:
+        raise SystemExit(1)
+    click.echo("Trigram indexes for tenant '%s' are ok" % tenant)
+
+
+@app.cli.command('import-users')
+@click.argument('file', type=click.File('rb'))
+@click.option(
+    '--tenant', default=None,
+    help="Tenant ID (default: $QWC_TENANT or 'default')"
+)
+@click.option(
+    '--format', 'format', type=click.Choice(['csv', 'jsonl']), default=None,
+    help="Import format (default: from file extension)"
+)
+@click.option(
+    '--batch-size', type=int, default=None,
+    help="Number of rows per transaction"
+)
+def import_users(file, tenant, format, batch_size):
+    """Import users, groups and memberships from a CSV or JSONL FILE."""
+    format = format or UserImport.detect_format(file.name)
+    if format is None:
+        raise click.UsageError("Unknown import format, use --format")
+
+    tenant = tenant or tenant_handler.tenant_name or 'default'
+    config_handler = TenantConfigHandler(
+        tenant, db_engine, config_models_registry, http_registry, app.logger
+    )
+    config = config_handler.config()
+    user_import = UserImport(
+        config_handler.config_models(), config.get('user_info_fields', []),
+        app.logger, batch_size or config.get(
+            'user_import_batch_size', UserImport.DEFAULT_BATCH_SIZE
+        )
+    )
+    report = user_import.run(file, format)
+
+    for error in report['errors']:
+        click.echo(
+            "Line %s (%s): %s" % (
+                error['line'], error['name'] or '', '; '.join(error['errors'])
+            ), err=True
+        )
+    if report['errors_truncated']:
+        click.echo("More errors not shown", err=True)
+    click.echo(
+        "%d rows, %d failed, %d users created, %d users updated, "
+        "%d groups created, %d group memberships added, "
+        "%d role memberships added" % (
+            report['rows'], report['failed'], report['users_created'],
+            report['users_updated'], report['groups_created'],
+            report['group_memberships_added'],
+            report['role_memberships_added']
+        )
+    )
+    if report['failed']:
+        raise SystemExit(1)
+
+
+# template for benchmark of translation lookups in table rows
+BENCHMARK_I18N_TEMPLATE = """
+{%- for row in rows -%}
+  <tr><td>{{ row }}</td>
+  {%- for key in keys %}<td>{{ key | i18n }}</td>{% endfor -%}
+  </tr>
+{%- endfor -%}
+"""
+
+
+@app.cli.command('benchmark-render')
+@click.option(
+    '--rows', type=int, default=500, help="Number of rows per page"
+)
+@click.option(
+    '--iterations', type=int, default=20, help="Number of renders"
+)
+@click.option(
+    '--locale', default=None,
+    help="Accept-Language header (default: DEFAULT_LOCALE)"
+)
+def benchmark_render(rows, iterations, locale):
+    """Benchmark rendering of an index page and of translation lookups."""
+    resources = [
+        {'id': i, 'name': "user%05d" % i} for i in range(1, rows + 1)
+    ]
+    pagination = {
+        'mode': 'offset', 'page': 1, 'num_pages': 10, 'per_page': rows,
+        'per_page_options': [rows], 'per_page_default': rows,
+        'params': {'per_page': rows}
+    }
+    keys = list(translation_table.table(DEFAULT_LOCALE))
+
+    headers = {'Accept-Language': locale or DEFAULT_LOCALE}
+    with app.test_request_context('/users', headers=headers):
+        benchmarks = [
+            (
+                "users index page with %d rows" % rows,
+                lambda: render_template(
+                    'templates/users/index.html', resources=resources,
+                    endpoint_suffix='user', pkey='id', search_text=None,
+                    pagination=pagination, sort=None, sort_asc=True,
+                    base_route='users'
+                )
+            ),
+            (
+                "%d rows with %d translations each" % (rows, len(keys)),
+                lambda: render_template_string(
+                    BENCHMARK_I18N_TEMPLATE, rows=range(rows), keys=keys
+                )
+            )
+        ]
+        click.echo("Locale: %s" % request_locale())
+        for label, render in benchmarks:
+            # warm up template cache
+            render()
+            start = time.perf_counter()
+            for i in range(iterations):
+                render()
+            duration = (time.perf_counter() - start) / iterations
+            click.echo("%s: %.2f ms" % (label, duration * 1000))
+
+
 """ readyness probe endpoint """
 @app.route("/ready", methods=['GET'])
 def ready():
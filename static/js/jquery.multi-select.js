@@ -579,8 +579,47 @@ if (!String.prototype.includes) {
     });
   };
 
+  // load selectable items from lookup URL, which returns JSON as
+  //   {"results": [{"id": <value>, "name": <label>}], "more": <bool>}
+  var lookupItems = function($select, ms, state) {
+    if (state.request) {
+      state.request.abort();
+    }
+
+    state.request = $.ajax({
+      url: state.url,
+      data: {
+        q: ms.find('.ms-selectable .ms-search').val(),
+        page: state.page
+      },
+      dataType: 'json'
+    }).done(function(data) {
+      // add any new options, filtered locally by search field
+      $select.multiSelect('addOption', $.map(data.results, function(item) {
+        return {
+          value: item.id,
+          text: $('<div>').text(item.name).html()
+        };
+      }));
+      filterItems(ms.find('.ms-selectable'));
+      ms.find('.ms-lookup-more').toggle(data.more);
+    }).always(function() {
+      state.request = null;
+    });
+  };
+
   $.fn.multiSelectWithSearch = function(msOptions) {
     var options = $.extend({}, msOptions);
+    var $select = $(this);
+
+    // lookup state for loading selectable items on demand
+    var lookup = null;
+    if (options.lookupUrl) {
+      lookup = {url: options.lookupUrl, page: 1, request: null, timer: null};
+      options.selectableFooter = (options.selectableFooter || '') +
+        '<a href="#" class="ms-lookup-more btn btn-link btn-xs" style="display: none;">Load more...</a>';
+    }
+
     // add search fields to each header and filter lists on input
     $.extend(options, {
       selectableHeader: options.selectableHeader + '<input class="ms-search" type="text">',
@@ -589,6 +628,25 @@ if (!String.prototype.includes) {
         ms.find('.ms-search').on('change keyup', function() {
           filterItems($(this).parent('div'));
         });
+
+        if (lookup) {
+          // search selectable items on server
+          ms.find('.ms-selectable .ms-search').on('input', function() {
+            clearTimeout(lookup.timer);
+            lookup.timer = setTimeout(function() {
+              lookup.page = 1;
+              lookupItems($select, ms, lookup);
+            }, 250);
+          });
+          ms.find('.ms-lookup-more').click(function(e) {
+            e.preventDefault();
+            lookup.page += 1;
+            lookupItems($select, ms, lookup);
+          });
+
+          // load first page
+          lookupItems($select, ms, lookup);
+        }
       },
       afterSelect: function() {
         filterItems(this.$selectableContainer);
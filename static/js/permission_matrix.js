@@ -0,0 +1,252 @@
+/**
+ * Editable matrix of roles and resources for bulk editing permissions.
+ *
+ * Resource rows are loaded page by page while scrolling, and only the
+ * visible rows are rendered, with spacer rows for the rows above and below.
+ * Clicking a cell cycles its access between none, read and write. Changed
+ * cells are collected and submitted as a single batch.
+ *
+ * @param container Container element for the matrix
+ * @param options Options
+ *   roles: List of roles as {id: <role ID>, name: <role name>}
+ *   rowsUrl: URL of matrix rows
+ *   updateUrl: URL for submitting changes
+ *   csrfToken: CSRF token for submitting changes
+ *   onChange: Optional function called with number of pending changes
+ *
+ * Returns object with functions
+ *   save(): submit pending changes, returns jQuery promise
+ *   discard(): discard pending changes
+ *   pendingCount(): return number of pending changes
+ */
+function permissionMatrix(container, options) {
+  var ROW_HEIGHT = 28;
+  // number of additional rows rendered above and below visible rows
+  var OVERSCAN = 10;
+  // load next page if less than this number of rows is below visible rows
+  var LOAD_THRESHOLD = 100;
+  var ACCESS_CYCLE = {none: 'read', read: 'write', write: 'none'};
+  var ACCESS_LABELS = {none: '', read: 'R', write: 'W'};
+
+  var $container = $(container);
+  var roles = options.roles;
+
+  // loaded rows
+  var rows = [];
+  var rowsById = {};
+  // cursor of next page, null if all rows are loaded
+  var nextCursor = null;
+  var allLoaded = false;
+  var loading = null;
+  // pending changes as {'<resource ID>:<role ID>': <access>}
+  var pending = {};
+  var numPending = 0;
+
+  // header and table skeleton
+  var $viewport = $('<div class="matrix-viewport">');
+  var $table = $('<table class="table table-bordered table-condensed matrix-table">');
+  var $head = $('<tr>').append($('<th class="matrix-resource">').text('Resource'));
+  $.each(roles, function(i, role) {
+    $head.append($('<th class="matrix-role">').attr('title', role.name).append(
+      $('<span>').text(role.name)
+    ));
+  });
+  var $tbody = $('<tbody>');
+  $table.append($('<thead>').append($head)).append($tbody);
+  $viewport.append($table);
+  var $status = $('<p class="text-muted matrix-status">');
+  $container.empty().append($viewport).append($status);
+
+  // escape text for HTML content and quoted attribute values
+  var HTML_ESCAPES = {'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'};
+  var escapeHtml = function(text) {
+    return String(text === null || text === undefined ? '' : text).replace(/[&<>"']/g, function(char) {
+      return HTML_ESCAPES[char];
+    });
+  };
+
+  var cellAccess = function(row, roleId) {
+    var key = row.id + ':' + roleId;
+    if (pending.hasOwnProperty(key)) {
+      return pending[key];
+    }
+    return row.cells[roleId] || 'none';
+  };
+
+  var rowHtml = function(row, index) {
+    var label = escapeHtml(row.name);
+    if (row.parent) {
+      label += ' <i class="text-muted">(' + escapeHtml(row.parent) + ')</i>';
+    }
+    var html = '<tr data-index="' + index + '"><td class="matrix-resource" title="' +
+      escapeHtml(row.type + ': ' + row.name) + '">' + label + '</td>';
+    for (var i = 0; i < roles.length; i++) {
+      var roleId = roles[i].id;
+      var access = cellAccess(row, roleId);
+      var classes = 'matrix-cell matrix-' + access;
+      if (pending.hasOwnProperty(row.id + ':' + roleId)) {
+        classes += ' matrix-pending';
+      }
+      html += '<td class="' + classes + '" data-role="' + roleId + '">' +
+        ACCESS_LABELS[access] + '</td>';
+    }
+    return html + '</tr>';
+  };
+
+  var spacerHtml = function(count) {
+    if (count <= 0) {
+      return '';
+    }
+    return '<tr class="matrix-spacer"><td colspan="' + (roles.length + 1) +
+      '" style="height: ' + (count * ROW_HEIGHT) + 'px;"></td></tr>';
+  };
+
+  // render visible rows only
+  var render = function() {
+    var scrollTop = $viewport.scrollTop();
+    var visibleRows = Math.ceil($viewport.height() / ROW_HEIGHT);
+    var first = Math.max(0, Math.floor(scrollTop / ROW_HEIGHT) - OVERSCAN);
+    var last = Math.min(rows.length, first + visibleRows + 2 * OVERSCAN);
+
+    var html = spacerHtml(first);
+    for (var i = first; i < last; i++) {
+      html += rowHtml(rows[i], i);
+    }
+    html += spacerHtml(rows.length - last);
+    $tbody[0].innerHTML = html;
+
+    if (!allLoaded && rows.length - last < LOAD_THRESHOLD) {
+      loadMore();
+    }
+  };
+
+  var updateStatus = function() {
+    var text = rows.length + (allLoaded ? '' : '+') + ' resources';
+    if (numPending > 0) {
+      text += ', ' + numPending + ' pending changes';
+    }
+    $status.text(text);
+    if (options.onChange) {
+      options.onChange(numPending);
+    }
+  };
+
+  var loadMore = function() {
+    if (loading || allLoaded) {
+      return;
+    }
+    var params = {};
+    if (nextCursor) {
+      params.cursor = nextCursor;
+    }
+    loading = $.getJSON(options.rowsUrl, params)
+      .done(function(data) {
+        $.each(data.rows, function(i, row) {
+          rows.push(row);
+          rowsById[row.id] = row;
+        });
+        nextCursor = data.next_cursor;
+        allLoaded = !nextCursor;
+        loading = null;
+        updateStatus();
+        render();
+      })
+      .fail(function() {
+        loading = null;
+        $status.text('Could not load resources');
+      });
+  };
+
+  var renderTimer = null;
+  $viewport.on('scroll', function() {
+    if (renderTimer === null) {
+      renderTimer = window.requestAnimationFrame(function() {
+        renderTimer = null;
+        render();
+      });
+    }
+  });
+
+  // cycle access on click
+  $tbody.on('click', 'td.matrix-cell', function() {
+    var $cell = $(this);
+    var row = rows[$cell.parent().data('index')];
+    var roleId = $cell.data('role');
+    var key = row.id + ':' + roleId;
+    var access = ACCESS_CYCLE[cellAccess(row, roleId)];
+
+    if (access == (row.cells[roleId] || 'none')) {
+      // reverted to original access
+      if (pending.hasOwnProperty(key)) {
+        delete pending[key];
+        numPending--;
+      }
+    } else {
+      if (!pending.hasOwnProperty(key)) {
+        numPending++;
+      }
+      pending[key] = access;
+    }
+
+    $cell.attr('class', 'matrix-cell matrix-' + access +
+      (pending.hasOwnProperty(key) ? ' matrix-pending' : ''));
+    $cell.text(ACCESS_LABELS[access]);
+    updateStatus();
+  });
+
+  var save = function() {
+    var changes = $.map(pending, function(access, key) {
+      var ids = key.split(':');
+      return {
+        resource_id: parseInt(ids[0], 10),
+        role_id: parseInt(ids[1], 10),
+        access: access
+      };
+    });
+    var submitted = $.extend({}, pending);
+
+    return $.ajax({
+      url: options.updateUrl,
+      type: 'POST',
+      contentType: 'application/json',
+      dataType: 'json',
+      headers: {'X-CSRFToken': options.csrfToken},
+      data: JSON.stringify({changes: changes})
+    }).done(function() {
+      // apply submitted changes to loaded rows
+      $.each(submitted, function(key, access) {
+        var ids = key.split(':');
+        var row = rowsById[ids[0]];
+        if (access == 'none') {
+          delete row.cells[ids[1]];
+        } else {
+          row.cells[ids[1]] = access;
+        }
+        if (pending[key] === access) {
+          delete pending[key];
+          numPending--;
+        }
+      });
+      updateStatus();
+      render();
+    });
+  };
+
+  var discard = function() {
+    pending = {};
+    numPending = 0;
+    updateStatus();
+    render();
+  };
+
+  loadMore();
+  render();
+
+  return {
+    save: save,
+    discard: discard,
+    pendingCount: function() {
+      return numPending;
+    }
+  };
+}
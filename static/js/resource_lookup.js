@@ -0,0 +1,117 @@
+/**
+ * Typeahead for select fields of ConfigDB resources.
+ *
+ * Adds a search input before the select field, which loads resources with
+ * matching name prefix from the resources lookup on demand, and shows them
+ * as options grouped by resource type. The selected option is always kept.
+ *
+ * @param select Select field
+ * @param url URL of resources lookup
+ * @param getTypes Optional function returning list of resource types
+ *                 for filtering (empty list for all types)
+ *
+ * Returns object with functions
+ *   reload(): reload options, e.g. after changing the type filter
+ *   setDisabled(disabled): enable or disable search and select field
+ */
+function resourceLookup(select, url, getTypes) {
+  var $select = $(select);
+  var $input = $('<input type="text" class="form-control" autocomplete="off" placeholder="Search by name">');
+  var $more = $('<a href="#" class="btn btn-link btn-xs" style="display: none;">Load more...</a>');
+  $select.before($input);
+  $select.after($more);
+
+  var page = 1;
+  var request = null;
+  var timer = null;
+
+  var render = function(data, append) {
+    if (!append) {
+      // remove all options except empty and selected option
+      $select.find('optgroup').each(function() {
+        $(this).find('option').not(':selected').remove();
+        if ($(this).children().length == 0) {
+          $(this).remove();
+        }
+      });
+    }
+
+    $.each(data.results, function(i, resource) {
+      if ($select.find('option[value="' + resource.id + '"]').length > 0) {
+        // skip selected option
+        return;
+      }
+
+      // find or add group for resource type
+      var $group = $select.find('optgroup').filter(function() {
+        return $(this).data('type') == resource.type;
+      });
+      if ($group.length == 0) {
+        $group = $('<optgroup>')
+          .attr('label', resource.type_description)
+          .attr('data-type', resource.type);
+        $select.append($group);
+      }
+
+      var label = resource.name;
+      if (resource.parent) {
+        label += ' (' + resource.parent + ')';
+      }
+      $group.append($('<option>').val(resource.id).text(label));
+    });
+
+    $more.toggle(data.more);
+  };
+
+  var load = function(append) {
+    if (request) {
+      request.abort();
+    }
+
+    var params = {
+      q: $input.val(),
+      type: getTypes ? getTypes() : [],
+      page: page
+    };
+    request = $.ajax({
+      url: url,
+      data: $.param(params, true),
+      dataType: 'json'
+    }).done(function(data) {
+      render(data, append);
+    }).always(function() {
+      request = null;
+    });
+  };
+
+  var reload = function() {
+    page = 1;
+    load(false);
+  };
+
+  $input.on('input', function() {
+    // debounce requests while typing
+    clearTimeout(timer);
+    timer = setTimeout(reload, 250);
+  });
+
+  $more.click(function(e) {
+    e.preventDefault();
+    page += 1;
+    load(true);
+  });
+
+  // load first page
+  reload();
+
+  return {
+    reload: reload,
+    setDisabled: function(disabled) {
+      $input.prop('disabled', disabled);
+      $select.prop('disabled', disabled);
+      if (disabled) {
+        $more.hide();
+      }
+    }
+  };
+}
@@ -0,0 +1,124 @@
+import json
+import os
+from threading import Lock
+
+
+class TranslationTable:
+    """Flat lookup tables for translation strings
+
+    The nested translation JSON of each locale is flattened into a dict with
+    dot-separated keys when it is loaded, e.g.
+        {"a": {"b": "text"}} -> {"a.b": "text"}
+
+    The default locale is loaded at startup. Additional locales are loaded
+    on first use and kept in memory.
+    """
+
+    def __init__(self, translations_path, default_locale, logger):
+        """Constructor
+
+        :param str translations_path: Dir with '<locale>.json' files
+        :param str default_locale: Default locale
+        :param Logger logger: Application logger
+        """
+        self.translations_path = translations_path
+        self.default_locale = default_locale
+        self.logger = logger
+
+        # available locales from translation files
+        self.available_locales = []
+        try:
+            self.available_locales = sorted(
+                os.path.splitext(filename)[0]
+                for filename in os.listdir(translations_path)
+                if filename.endswith('.json')
+            )
+        except OSError as e:
+            self.logger.error(
+                "Could not list translations in %s\n%s" %
+                (translations_path, e)
+            )
+
+        # flat translation tables as {<locale>: {<key>: <string>}}
+        self.tables = {}
+        self.lock = Lock()
+
+        self.table(default_locale)
+
+    def table(self, locale):
+        """Return flat translation table of a locale, loading it on first
+        use.
+
+        :param str locale: Locale
+        """
+        table = self.tables.get(locale)
+        if table is not None:
+            return table
+
+        with self.lock:
+            table = self.tables.get(locale)
+            if table is None:
+                table = self.load(locale)
+                # NOTE: also cache empty tables of missing locales
+                self.tables[locale] = table
+
+        return table
+
+    def load(self, locale):
+        """Load translation file of a locale and return flat table.
+
+        :param str locale: Locale
+        """
+        if locale not in self.available_locales:
+            if locale == self.default_locale:
+                self.logger.error(
+                    "Missing translation strings for default locale '%s' "
+                    "in %s" % (locale, self.translations_path)
+                )
+            return {}
+
+        path = os.path.join(self.translations_path, '%s.json' % locale)
+        try:
+            with open(path, 'r') as f:
+                return self.flatten(json.load(f))
+        except Exception as e:
+            self.logger.error(
+                "Failed to load translation strings for locale '%s' from %s"
+                "\n%s" % (locale, path, e)
+            )
+            return {}
+
+    def flatten(self, data, prefix=''):
+        """Return nested translations as dict with dot-separated keys.
+
+        :param obj data: Nested translations
+        :param str prefix: Key prefix of nested translations
+        """
+        table = {}
+        for key, value in data.items():
+            path = "%s%s" % (prefix, key)
+            if isinstance(value, dict):
+                table.update(self.flatten(value, "%s." % path))
+            else:
+                table[path] = value
+
+        return table
+
+    def translate(self, key, locale):
+        """Return translation string for key in locale, falling back to
+        default locale and then to the key itself.
+
+        :param str key: Dot-separated path to translation string
+        :param str locale: Locale
+        """
+        table = self.tables.get(locale)
+        if table is None:
+            table = self.table(locale)
+
+        value = table.get(key)
+        if value is None and locale != self.default_locale:
+            value = self.tables[self.default_locale].get(key)
+        if value is None:
+            return key
+
+        return value
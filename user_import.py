@@ -0,0 +1,684 @@
+from concurrent.futures import ThreadPoolExecutor
+import csv
+from datetime import datetime
+import io
+import json
+import os
+
+from sqlalchemy import bindparam
+from werkzeug.datastructures import MultiDict
+from werkzeug.security import generate_password_hash
+
+from forms import UserForm
+
+
+class ImportUserForm(UserForm):
+    """UserForm for validating rows of a bulk import
+
+    Names and emails are checked per batch instead of per row,
+    as existing users are updated by name.
+    """
+
+    class Meta:
+        # rows are not submitted from a web form
+        csrf = False
+
+    def add_custom_fields(self, user_info_fields):
+        """Add custom user_info fields without CSRF token.
+
+        :param list(obj) user_info_fields: Custom user info fields
+        """
+        super(ImportUserForm, self).add_custom_fields(user_info_fields)
+
+        class ImportUserInfoForm(self.user_info.args[0]):
+            class Meta:
+                csrf = False
+
+        self.user_info.args = (ImportUserInfoForm, "User info")
+
+    def validate_name(self, field):
+        pass
+
+    def validate_email(self, email):
+        pass
+
+
+class UserImport:
+    """Bulk import of users, groups and memberships from CSV or JSONL
+
+    Rows are read incrementally and validated with the same rules as the
+    user form. Users are created or updated by name in batched transactions,
+    missing groups are created, and group and role memberships are added.
+    Existing memberships are kept.
+
+    Row fields:
+        name: User name (required)
+        description, email, password: Optional user fields
+        <user info field>: Optional custom user info fields
+        groups: Group names (';'-separated in CSV)
+        roles: Names of existing roles (';'-separated in CSV)
+
+    In JSONL, custom user info fields may also be nested in 'user_info'.
+    Only fields present in a row are updated for existing users
+    (empty CSV cells are ignored, use null in JSONL to clear a field).
+
+    Import report:
+        {
+            'rows': <number of rows>,
+            'failed': <number of failed rows>,
+            'users_created': <number>,
+            'users_updated': <number>,
+            'groups_created': <number>,
+            'group_memberships_added': <number>,
+            'role_memberships_added': <number>,
+            'errors': [
+                {'line': <line number>, 'name': <user name>,
+                 'errors': [<messages>]}
+            ],
+            'errors_truncated': <True if not all row errors are listed>
+        }
+    """
+
+    FORMAT_CSV = 'csv'
+    FORMAT_JSONL = 'jsonl'
+
+    # default number of rows per transaction
+    DEFAULT_BATCH_SIZE = 1000
+    # max number of row errors in report
+    MAX_ERRORS = 1000
+    # max number of concurrent password hashes (default: CPU count)
+    HASH_MAX_WORKERS = os.cpu_count() or 1
+    # separator for lists in CSV columns
+    LIST_SEPARATOR = ';'
+
+    # user fields which can be imported
+    USER_FIELDS = ['name', 'description', 'email', 'password']
+    # list fields for memberships
+    LIST_FIELDS = ['groups', 'roles']
+
+    def __init__(self, config_models, user_info_fields, logger,
+                 batch_size=DEFAULT_BATCH_SIZE):
+        """Constructor
+
+        :param ConfigModels config_models: Helper for ORM models
+        :param list(obj) user_info_fields: Custom user info fields
+        :param Logger logger: Application logger
+        :param int batch_size: Number of rows per transaction
+        """
+        self.config_models = config_models
+        self.user_info_fields = user_info_fields
+        self.user_info_names = [field['name'] for field in user_info_fields]
+        self.logger = logger
+        self.batch_size = max(1, batch_size)
+
+        self.User = config_models.model('users')
+        self.UserInfo = config_models.model('user_infos')
+        self.Group = config_models.model('groups')
+        self.Role = config_models.model('roles')
+
+        # form for validating rows, reused for all rows
+        self.form = ImportUserForm(
+            config_models, user_info_fields, formdata=None
+        )
+        # memberships are validated per batch
+        self.form.groups.choices = []
+        self.form.roles.choices = []
+
+    @classmethod
+    def detect_format(cls, filename=None, content_type=None):
+        """Return import format for a file name or content type,
+        or None if unknown.
+
+        :param str filename: Optional file name
+        :param str content_type: Optional MIME type
+        """
+        filename = (filename or '').lower()
+        content_type = (content_type or '').lower()
+        if filename.endswith('.csv') or 'csv' in content_type:
+            return cls.FORMAT_CSV
+        elif filename.endswith(('.jsonl', '.ndjson')) or \
+                'ndjson' in content_type or 'jsonl' in content_type:
+            return cls.FORMAT_JSONL
+        return None
+
+    def run(self, stream, format, progress=None):
+        """Import rows from a binary stream and return import report.
+
+        :param file stream: Binary input stream
+        :param str format: Import format ('csv' or 'jsonl')
+        :param callable progress: Optional function called with import
+                                  report after each batch
+        """
+        report = {
+            'rows': 0,
+            'failed': 0,
+            'users_created': 0,
+            'users_updated': 0,
+            'groups_created': 0,
+            'group_memberships_added': 0,
+            'role_memberships_added': 0,
+            'errors': [],
+            'errors_truncated': False
+        }
+
+        batch = []
+        for line, row, error in self.read_rows(stream, format):
+            report['rows'] += 1
+            batch.append((line, row, error))
+            if len(batch) >= self.batch_size:
+                self.import_batch(batch, report)
+                batch = []
+                if progress is not None:
+                    progress(report)
+        if batch:
+            self.import_batch(batch, report)
+            if progress is not None:
+                progress(report)
+
+        if report['users_created'] or report['users_updated'] or \
+                report['groups_created']:
+            self.update_config_timestamp()
+
+        return report
+
+    def read_rows(self, stream, format):
+        """Read rows incrementally and yield (line, row, error).
+
+        :param file stream: Binary input stream
+        :param str format: Import format ('csv' or 'jsonl')
+        """
+        if isinstance(stream, io.RawIOBase):
+            # e.g. streamed request body
+            stream = io.BufferedReader(stream)
+        text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+        if format == self.FORMAT_CSV:
+            reader = csv.DictReader(text)
+            for row in reader:
+                line = reader.line_num
+                if None in row:
+                    yield line, None, "Too many columns"
+                    continue
+                # skip empty cells
+                row = {
+                    key.strip(): value for key, value in row.items()
+                    if value is not None and value.strip()
+                }
+                for key in self.LIST_FIELDS:
+                    if key in row:
+                        row[key] = [
+                            name.strip()
+                            for name in row[key].split(self.LIST_SEPARATOR)
+                            if name.strip()
+                        ]
+                yield line, row, None
+        elif format == self.FORMAT_JSONL:
+            for line, data in enumerate(text, start=1):
+                if not data.strip():
+                    continue
+                try:
+                    row = json.loads(data)
+                except ValueError as e:
+                    yield line, None, "Invalid JSON: %s" % e
+                    continue
+                if not isinstance(row, dict):
+                    yield line, None, "Row is not a JSON object"
+                    continue
+                user_info = row.pop('user_info', None)
+                if isinstance(user_info, dict):
+                    row.update(user_info)
+                yield line, row, None
+        else:
+            raise ValueError("Unsupported import format '%s'" % format)
+
+    def validate_row(self, row):
+        """Validate row with user form rules and return (values, errors).
+
+        Only the fields present in the row are validated, except for the
+        required name.
+
+        values contains only the fields present in the row as
+            {
+                'user': {<user field>: <value>},
+                'user_info': {<user info field>: <value>},
+                'groups': [<group name>],
+                'roles': [<role name>]
+            }
+
+        :param obj row: Row data
+        """
+        errors = []
+        formdata = MultiDict()
+        for key in self.USER_FIELDS:
+            if row.get(key) is not None:
+                formdata[key] = str(row[key])
+        if 'password' in formdata:
+            formdata['password2'] = formdata['password']
+        for key in self.user_info_names:
+            if row.get(key) is not None:
+                formdata['user_info-%s' % key] = str(row[key])
+
+        form = self.form
+        form.process(formdata)
+        if not form.validate():
+            # NOTE: skip errors of missing fields, as they are not updated
+            for field, messages in form.errors.items():
+                if isinstance(messages, dict):
+                    # user info subform
+                    for subfield, submessages in messages.items():
+                        if subfield not in row:
+                            continue
+                        errors += [
+                            "%s: %s" % (subfield, msg) for msg in submessages
+                        ]
+                elif field in ['name', 'password2'] or field in row:
+                    errors += ["%s: %s" % (field, msg) for msg in messages]
+
+        lists = {}
+        for key in self.LIST_FIELDS:
+            names = row.get(key)
+            if names is None:
+                continue
+            if isinstance(names, str):
+                names = [names]
+            if not isinstance(names, list) or \
+                    not all(isinstance(name, str) for name in names):
+                errors.append("%s: Must be a list of names" % key)
+                continue
+            lists[key] = [name.strip() for name in names if name.strip()]
+
+        if errors:
+            return None, errors
+
+        user = {
+            key: getattr(form, key).data or None
+            for key in ['name', 'description', 'email', 'password']
+            if key in row
+        }
+        user['name'] = form.name.data.strip()
+        user_info = {}
+        for key in self.user_info_names:
+            if key in row:
+                value = form.user_info.form[key].data
+                user_info[key] = None if value == '' else value
+
+        return {
+            'user': user,
+            'user_info': user_info,
+            'groups': lists.get('groups', []),
+            'roles': lists.get('roles', [])
+        }, []
+
+    def import_batch(self, batch, report):
+        """Validate and import a batch of rows in one transaction.
+
+        :param list batch: Rows as [(line, row, error)]
+        :param obj report: Import report
+        """
+        # validate rows and merge rows for same user
+        users = {}
+        for line, row, error in batch:
+            if error is not None:
+                self.add_error(report, line, None, [error])
+                continue
+            values, errors = self.validate_row(row)
+            if errors:
+                self.add_error(report, line, row.get('name'), errors)
+                continue
+
+            name = values['user']['name']
+            if name in users:
+                entry = users[name]
+                entry['lines'].append(line)
+                entry['user'].update(values['user'])
+                entry['user_info'].update(values['user_info'])
+                entry['groups'] += values['groups']
+                entry['roles'] += values['roles']
+            else:
+                values['lines'] = [line]
+                users[name] = values
+
+        if not users:
+            return
+
+        session = self.config_models.session()
+        try:
+            self.check_batch(users, report, session)
+            if users:
+                counts = self.write_batch(users, session)
+                session.commit()
+                for key, count in counts.items():
+                    report[key] += count
+        except Exception as e:
+            session.rollback()
+            self.logger.error("Could not import batch: %s" % e)
+            for name, entry in users.items():
+                for line in entry['lines']:
+                    self.add_error(
+                        report, line, name, ["Could not import batch: %s" % e]
+                    )
+        finally:
+            session.close()
+
+    def check_batch(self, users, report, session):
+        """Check unknown roles and email conflicts of a batch,
+        and remove failed users.
+
+        :param dict users: Validated users by name
+        :param obj report: Import report
+        :param Session session: DB session
+        """
+        # lookup for existing roles
+        role_names = set(
+            role for entry in users.values() for role in entry['roles']
+        )
+        existing_roles = set()
+        if role_names:
+            query = session.query(self.Role.name) \
+                .filter(self.Role.name.in_(role_names))
+            existing_roles = set(name for name, in query.all())
+
+        # lookup for emails of other users
+        emails = {}
+        for name, entry in users.items():
+            email = entry['user'].get('email')
+            if email:
+                emails.setdefault(email, set()).add(name)
+        email_users = {}
+        if emails:
+            query = session.query(self.User.email, self.User.name) \
+                .filter(self.User.email.in_(list(emails.keys())))
+            for email, name in query.all():
+                email_users.setdefault(email, set()).add(name)
+
+        for name in list(users.keys()):
+            entry = users[name]
+            errors = [
+                "roles: Unknown role '%s'" % role
+                for role in entry['roles'] if role not in existing_roles
+            ]
+            email = entry['user'].get('email')
+            if email and (
+                len(emails[email]) > 1 or
+                email_users.get(email, set()) - {name}
+            ):
+                errors.append(
+                    "email: Please use a different email address."
+                )
+
+            if errors:
+                for line in entry['lines']:
+                    self.add_error(report, line, name, errors)
+                del users[name]
+
+    def write_batch(self, users, session):
+        """Create or update users, groups and memberships of a batch,
+        and return counts for report.
+
+        :param dict users: Checked users by name
+        :param Session session: DB session
+        """
+        counts = {
+            'users_created': 0,
+            'users_updated': 0,
+            'groups_created': 0,
+            'group_memberships_added': 0,
+            'role_memberships_added': 0
+        }
+        users_table = self.User.__table__
+
+        hashes = self.password_hashes(users)
+
+        # lookup for existing users
+        user_ids = self.ids_by_name(self.User, users.keys(), session)
+
+        # create new users
+        new_rows = []
+        for name, entry in users.items():
+            if name not in user_ids:
+                user = entry['user']
+                new_rows.append({
+                    'name': name,
+                    'description': user.get('description'),
+                    'email': user.get('email'),
+                    'password_hash': hashes.get(name),
+                    'failed_sign_in_count': 0
+                })
+        if new_rows:
+            self.insert_rows(users_table, new_rows, session)
+            user_ids.update(self.ids_by_name(
+                self.User, [row['name'] for row in new_rows], session
+            ))
+        counts['users_created'] = len(new_rows)
+
+        # update existing users, grouped by updated fields
+        updates = {}
+        new_names = set(row['name'] for row in new_rows)
+        for name, entry in users.items():
+            if name in new_names:
+                continue
+            user = entry['user']
+            values = {
+                key: user[key] for key in ['description', 'email']
+                if key in user
+            }
+            if name in hashes:
+                values['password_hash'] = hashes[name]
+            if values or entry['user_info']:
+                # count only users with changed user or user info fields
+                counts['users_updated'] += 1
+            if not values:
+                continue
+            values['b_id'] = user_ids[name]
+            updates.setdefault(tuple(sorted(values.keys())), []) \
+                .append(values)
+        for keys, rows in updates.items():
+            columns = [key for key in keys if key != 'b_id']
+            stmt = users_table.update() \
+                .where(users_table.c.id == bindparam('b_id')) \
+                .values({key: bindparam('b_%s' % key) for key in columns})
+            session.execute(stmt, [
+                dict(
+                    [('b_id', row['b_id'])] +
+                    [('b_%s' % key, row[key]) for key in columns]
+                )
+                for row in rows
+            ])
+
+        self.upsert_user_infos(users, user_ids, session)
+
+        # create missing groups
+        group_names = set(
+            group for entry in users.values() for group in entry['groups']
+        )
+        group_ids = {}
+        if group_names:
+            group_ids = self.ids_by_name(self.Group, group_names, session)
+            new_groups = [
+                {'name': name, 'description': None}
+                for name in sorted(group_names - set(group_ids.keys()))
+            ]
+            if new_groups:
+                self.insert_rows(self.Group.__table__, new_groups, session)
+                group_ids.update(self.ids_by_name(
+                    self.Group, [row['name'] for row in new_groups], session
+                ))
+            counts['groups_created'] = len(new_groups)
+
+        # lookup for role IDs
+        role_names = set(
+            role for entry in users.values() for role in entry['roles']
+        )
+        role_ids = {}
+        if role_names:
+            role_ids = self.ids_by_name(self.Role, role_names, session)
+
+        # add memberships
+        counts['group_memberships_added'] = self.add_memberships(
+            self.User.groups_collection, users, user_ids, 'groups',
+            group_ids, session
+        )
+        counts['role_memberships_added'] = self.add_memberships(
+            self.User.roles_collection, users, user_ids, 'roles', role_ids,
+            session
+        )
+
+        return counts
+
+    def upsert_user_infos(self, users, user_ids, session):
+        """Create or update user infos of a batch.
+
+        :param dict users: Checked users by name
+        :param dict user_ids: User IDs by name
+        :param Session session: DB session
+        """
+        infos = {
+            user_ids[name]: entry['user_info']
+            for name, entry in users.items() if entry['user_info']
+        }
+        if not infos:
+            return
+
+        table = self.UserInfo.__table__
+        query = session.query(self.UserInfo.user_id) \
+            .filter(self.UserInfo.user_id.in_(list(infos.keys())))
+        existing = set(user_id for user_id, in query.all())
+
+        # group rows by fields
+        inserts = {}
+        updates = {}
+        for user_id, info in infos.items():
+            keys = tuple(sorted(info.keys()))
+            if user_id in existing:
+                updates.setdefault(keys, []).append(
+                    dict(
+                        [('b_user_id', user_id)] +
+                        [('b_%s' % key, info[key]) for key in keys]
+                    )
+                )
+            else:
+                row = dict(info)
+                row['user_id'] = user_id
+                inserts.setdefault(keys, []).append(row)
+
+        for rows in inserts.values():
+            self.insert_rows(table, rows, session)
+        for keys, rows in updates.items():
+            stmt = table.update() \
+                .where(table.c.user_id == bindparam('b_user_id')) \
+                .values({key: bindparam('b_%s' % key) for key in keys})
+            session.execute(stmt, rows)
+
+    def add_memberships(self, relationship, users, user_ids, key,
+                        relation_ids, session):
+        """Add missing memberships of a batch and return number of added
+        memberships.
+
+        :param InstrumentedAttribute relationship: User relationship with
+                                                   association table
+        :param dict users: Checked users by name
+        :param dict user_ids: User IDs by name
+        :param str key: Membership key in users ('groups' or 'roles')
+        :param dict relation_ids: Group or role IDs by name
+        :param Session session: DB session
+        """
+        prop = relationship.property
+        secondary = prop.secondary
+        (_, user_fk), = prop.synchronize_pairs
+        (_, relation_fk), = prop.secondary_synchronize_pairs
+
+        pairs = set()
+        for name, entry in users.items():
+            for relation_name in entry[key]:
+                pairs.add((user_ids[name], relation_ids[relation_name]))
+        if not pairs:
+            return 0
+
+        # skip existing memberships
+        query = session.query(user_fk, relation_fk) \
+            .filter(user_fk.in_(set(user_id for user_id, _ in pairs)))
+        pairs -= set(query.all())
+
+        rows = [
+            {user_fk.key: user_id, relation_fk.key: relation_id}
+            for user_id, relation_id in sorted(pairs)
+        ]
+        self.insert_rows(secondary, rows, session)
+
+        return len(rows)
+
+    def insert_rows(self, table, rows, session):
+        """Insert rows with a single executemany INSERT.
+
+        NOTE: psycopg2 batches executemany into multi-row INSERTs
+
+        :param Table table: Table
+        :param list rows: Rows as list of dicts with same keys
+        :param Session session: DB session
+        """
+        if rows:
+            session.execute(table.insert(), rows)
+
+    def ids_by_name(self, model, names, session):
+        """Return IDs of records with matching names as {<name>: <ID>}.
+
+        :param object model: Model with id and name columns
+        :param list(str) names: Names
+        :param Session session: DB session
+        """
+        query = session.query(model.id, model.name) \
+            .filter(model.name.in_(list(names)))
+        return {name: id for id, name in query.all()}
+
+    def password_hashes(self, users):
+        """Return password hashes by user name for users with passwords.
+
+        Passwords are hashed concurrently, as hashing is slow on purpose.
+
+        :param dict users: Checked users by name
+        """
+        passwords = [
+            (name, entry['user']['password'])
+            for name, entry in users.items() if entry['user'].get('password')
+        ]
+        if not passwords:
+            return {}
+
+        with ThreadPoolExecutor(
+            max_workers=min(self.HASH_MAX_WORKERS, len(passwords))
+        ) as executor:
+            hashes = executor.map(
+                generate_password_hash, [password for _, password in passwords]
+            )
+            return dict(zip([name for name, _ in passwords], hashes))
+
+    def add_error(self, report, line, name, errors):
+        """Add row error to import report.
+
+        :param obj report: Import report
+        :param int line: Line number
+        :param str name: User name
+        :param list(str) errors: Error messages
+        """
+        report['failed'] += 1
+        if len(report['errors']) < self.MAX_ERRORS:
+            report['errors'].append({
+                'line': line,
+                'name': name,
+                'errors': errors
+            })
+        else:
+            report['errors_truncated'] = True
+
+    def update_config_timestamp(self):
+        """Update timestamp of last config change to current UTC time."""
+        LastUpdate = self.config_models.model('last_update')
+        session = self.config_models.session()
+        try:
+            last_update = session.query(LastUpdate).first()
+            if last_update is None:
+                last_update = LastUpdate()
+                session.add(last_update)
+            last_update.updated_at = datetime.utcnow()
+            session.commit()
+        finally:
+            session.close()